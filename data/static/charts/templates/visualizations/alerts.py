@@ -0,0 +1,167 @@
+import os
+import uuid
+import argparse
+import datetime
+
+import storage
+import timestamps
+
+# Rule thresholds, as shares of the monthly budget
+BUDGET_WARNING_SHARE = 0.8
+LOW_BALANCE_SHARE = 0.2
+
+# Alerts kept per user; older ones are dropped once the queue is full
+MAX_ALERTS = 20
+
+ALERT_RULES = ["budget_exceeded", "budget_warning", "low_balance"]
+
+
+def evaluate(spent, budgets, balances):
+    """Checks every rule for many users at once.
+
+    Takes equal-length sequences of this month's spending, monthly budgets
+    and balances, and returns {rule: boolean array} marking the users each
+    rule fires for.
+    """
+    import numpy as np
+
+    spent = np.asarray(spent, dtype=np.float64)
+    budgets = np.asarray(budgets, dtype=np.float64)
+    balances = np.asarray(balances, dtype=np.float64)
+
+    has_budget = budgets > 0
+    exceeded = has_budget & (spent > budgets)
+    return {
+        "budget_exceeded": exceeded,
+        # budget_exceeded supersedes the warning
+        "budget_warning": has_budget & (spent > BUDGET_WARNING_SHARE * budgets) & ~exceeded,
+        "low_balance": balances < LOW_BALANCE_SHARE * budgets
+    }
+
+
+def alert_message(rule, spent, budget, balance):
+    if rule == "budget_exceeded":
+        return f"You've spent ₹{spent:.2f} this month, more than your monthly budget of ₹{budget:.2f}."
+    if rule == "budget_warning":
+        return f"You've used {spent / budget * 100:.0f}% of your monthly budget (₹{spent:.2f} of ₹{budget:.2f})."
+    return f"Your balance (₹{balance:.2f}) is less than {LOW_BALANCE_SHARE:.0%} of your monthly budget!"
+
+
+class AlertQueue:
+    """Triggered alerts for each user, in data/alerts/<username>.json.
+
+    A rule fires at most once per user per month, so re-checking after every
+    insert or rerunning the batch job never repeats an alert. The dashboard
+    reads one small file instead of looking at the user's history.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.root = os.path.join(store.data_dir, "alerts")
+
+    def get_alert_file(self, username):
+        return os.path.join(self.root, f"{username}.json")
+
+    def read(self, username):
+        return storage.read_json(self.get_alert_file(username), {"fired": [], "alerts": []})
+
+    def push(self, username, month, fired):
+        # fired: [(rule, message)]; returns the alerts that weren't already queued
+        added = []
+        with self.store.lock(username):
+            queue = self.read(username)
+            seen = set(queue["fired"])
+            for rule, message in fired:
+                key = f"{rule}:{month}"
+                if key in seen:
+                    continue
+                seen.add(key)
+                queue["fired"].append(key)
+                added.append({
+                    "id": uuid.uuid4().hex,
+                    "rule": rule,
+                    "month": month,
+                    "message": message,
+                    "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "read": False
+                })
+            if added:
+                queue["alerts"] = (queue["alerts"] + added)[-MAX_ALERTS:]
+                os.makedirs(self.root, exist_ok=True)
+                storage.write_json(self.get_alert_file(username), queue)
+        return added
+
+    def unread(self, username):
+        return [alert for alert in self.read(username)["alerts"] if not alert["read"]]
+
+    def dismiss(self, username, alert_id=None):
+        # Marks one alert, or all of them, as read
+        with self.store.lock(username):
+            queue = self.read(username)
+            for alert in queue["alerts"]:
+                if alert_id is None or alert["id"] == alert_id:
+                    alert["read"] = True
+            if queue["alerts"]:
+                storage.write_json(self.get_alert_file(username), queue)
+
+
+def check_rows(queue, rows, month):
+    # rows: (username, spent, budget, balance). Evaluates them in one pass and
+    # queues whatever fired; returns {username: [new alerts]}
+    if not rows:
+        return {}
+    usernames, spent, budgets, balances = zip(*rows)
+    results = evaluate(spent, budgets, balances)
+
+    fired = {}
+    for rule in ALERT_RULES:
+        for i in results[rule].nonzero()[0]:
+            fired.setdefault(i, []).append((rule, alert_message(rule, spent[i], budgets[i], balances[i])))
+
+    added = {}
+    for i, alerts in fired.items():
+        new = queue.push(usernames[i], month, alerts)
+        if new:
+            added[usernames[i]] = new
+    return added
+
+
+def check_user(store, queue, username, data=None, month=None):
+    # Incremental check after an insert or profile change; uses the loaded
+    # document if there is one, otherwise the backend's running totals
+    month = month or timestamps.this_month()
+    if data is not None:
+        spent = store.spending_summary(username, data)["by_month"].get(month, 0)
+        profile = data["profile"]
+        rows = [(username, spent, profile["monthly_budget"] or 0, profile["account_balance"] or 0)]
+    else:
+        rows = store.month_totals(month, [username])
+    return check_rows(queue, rows, month).get(username, [])
+
+
+def check_all(data_dir, month=None, mode=None):
+    # Batch pass over every user (web users and the CLI's), e.g. after budgets change
+    month = month or timestamps.this_month()
+    added = {}
+    for cli_layout in (False, True):
+        store = storage.get_storage(data_dir, cli_layout=cli_layout, mode=mode)
+        added.update(check_rows(AlertQueue(store), store.month_totals(month), month))
+        if store.indexed:
+            # The CLI shares the same database
+            break
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate budget and balance alerts for every user")
+    parser.add_argument("data_dir", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    parser.add_argument("--month", help="Month to check, YYYY-MM (default this month)")
+    parser.add_argument("--backend", choices=sorted(storage.STORAGE_BACKENDS), help="Defaults to UPI_STORAGE")
+    args = parser.parse_args()
+
+    added = check_all(args.data_dir, args.month, args.backend)
+    for username, alerts in sorted(added.items()):
+        for alert in alerts:
+            print(f"{username}: {alert['message']}")
+    print(f"{sum(len(alerts) for alerts in added.values())} new alert(s) for {len(added)} user(s)")
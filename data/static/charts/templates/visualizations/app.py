@@ -1,24 +1,39 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 import os
+import time
+import hashlib
+import functools
 import json
 import datetime
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
+import base64
 import uuid
-from werkzeug.security import generate_password_hash, check_password_hash
+import tempfile
+import alerts
+import chart_cache
+import categorizer
+import export
+import metrics
+import parent_reports
+import password_hasher
+import storage
+import timestamps
+import user_registry
+from transaction import Transaction, from_dicts
+from user_cache import UserDataCache
+from group_commit import GroupCommitter
 
 app = Flask(__name__)
 app.secret_key = "upitrackersecretkey"  # For session and flash messages
+metrics.init_app(app)
+
+# Template rendering is one of the timed phases (no-op unless UPI_METRICS=1)
+render_template = metrics.timed("render")(render_template)
 
 # App configuration
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-USERS_FILE = os.path.join(DATA_DIR, "users.json")
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 if not os.path.exists(STATIC_DIR):
     os.makedirs(STATIC_DIR)
@@ -27,6 +42,9 @@ CHARTS_DIR = os.path.join(STATIC_DIR, "charts")
 if not os.path.exists(CHARTS_DIR):
     os.makedirs(CHARTS_DIR)
 
+# Parent reports wait here for the mail relay (see parent_reports.py)
+OUTBOX_DIR = os.path.join(DATA_DIR, "outbox")
+
 # Categories and UPI apps
 CATEGORIES = [
     "Food", "Transportation", "Shopping", "Entertainment", 
@@ -38,112 +56,280 @@ UPI_APPS = [
     "BHIM", "WhatsApp Pay", "Other"
 ]
 
+# Transaction history pagination
+PAGE_SIZE = int(os.environ.get("UPI_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = 500
+
 # Helper functions
-def load_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+# User data goes through the configured storage backend (see storage.py)
+user_storage = storage.get_storage(DATA_DIR)
+
+# Accounts live in an indexed registry; an old users.json is moved into it once
+user_accounts = user_registry.get_user_registry(DATA_DIR)
+user_registry.migrate_users_json(DATA_DIR, user_accounts)
+
+# Password hashes run on a small bounded pool so login bursts can't starve
+# other routes; when it is full, login and register answer 503 right away
+hasher = password_hasher.PasswordHasher()
+HASH_RETRY_AFTER = 5
 
-def save_users(users):
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=4)
+# Inserts arriving within a short window are written together
+GROUP_COMMIT_WINDOW = float(os.environ.get("UPI_GROUP_COMMIT_WINDOW_MS", 2)) / 1000
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("UPI_GROUP_COMMIT_MAX_BATCH", 64))
+group_committer = GroupCommitter(user_storage, GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH)
 
-def get_user_file(username):
-    return os.path.join(DATA_DIR, f"{username}_data.json")
+# Parsed user documents, reused while the stored version is unchanged
+USER_CACHE_SIZE = int(os.environ.get("UPI_USER_CACHE_SIZE", 256))
+user_cache = UserDataCache(USER_CACHE_SIZE)
+# Budget and balance alerts shown on the dashboard
+alert_queue = alerts.AlertQueue(user_storage)
 
+# Addresses allowed to read /cache_stats and /metrics, comma separated
+STATS_ALLOWED = {address.strip() for address in os.environ.get("UPI_STATS_ALLOW", "127.0.0.1,::1").split(",") if address.strip()}
+
+# Bump when the data-driven page templates change, so browsers holding an
+# old copy of a page (see conditional_on_data) are sent the new one
+PAGE_VERSION = "1"
+
+@metrics.timed("load")
 def load_user_data(username):
-    user_file = get_user_file(username)
-    if os.path.exists(user_file):
-        with open(user_file, 'r') as f:
-            return json.load(f)
-    return {
-        "profile": {
-            "name": "",
-            "account_balance": 0,
-            "monthly_budget": 0,
-            "parent_email": "",
-            "share_with_parents": False
-        },
-        "transactions": []
-    }
+    # Read the version before loading, so a concurrent write can only make
+    # the cached copy look older than it is, never newer
+    version = user_storage.version(username)
+    data = user_cache.get(username, version)
+    if data is None:
+        data = user_storage.load(username)
+        user_cache.put(username, version, data)
+    return data
+
+def query_source(username):
+    # Indexed backends answer transaction queries themselves, and so do the
+    # JSON backends for users with archived months, reading only the months
+    # a query covers. The others work from the (cached) parsed document.
+    if user_storage.indexed or user_storage.has_archive(username):
+        return None
+    return load_user_data(username)
+
+def load_profile(username):
+    # For pages that only show the profile; skips the archived months
+    if user_storage.has_archive(username):
+        return user_storage.load_profile(username)
+    return load_user_data(username)["profile"]
 
+@metrics.timed("save")
 def save_user_data(username, data):
-    user_file = get_user_file(username)
-    with open(user_file, 'w') as f:
-        json.dump(data, f, indent=4)
+    user_storage.save(username, data)
+    user_cache.invalidate(username)
 
-def generate_charts(username):
-    user_data = load_user_data(username)
-    transactions = user_data["transactions"]
-    
-    if not transactions:
-        return None
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(transactions)
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Category spending chart
-    plt.figure(figsize=(10, 6))
-    category_spending = df.groupby('category')['amount'].sum().sort_values(ascending=False)
-    
-    # Create a colorful bar chart
-    sns.barplot(x=category_spending.index, y=category_spending.values)
-    plt.title('Spending by Category')
-    plt.xlabel('Category')
-    plt.ylabel('Amount (₹)')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
-    category_chart = f"{username}_category.png"
-    plt.savefig(os.path.join(CHARTS_DIR, category_chart))
-    plt.close()
-    
-    # UPI app spending chart
-    plt.figure(figsize=(10, 6))
-    app_spending = df.groupby('upi_app')['amount'].sum().sort_values(ascending=False)
-    
-    # Create a pie chart for UPI apps
-    plt.pie(app_spending, labels=app_spending.index, autopct='%1.1f%%', startangle=90)
-    plt.axis('equal')
-    plt.title('Spending by UPI App')
-    plt.tight_layout()
-    
-    app_chart = f"{username}_upiapp.png"
-    plt.savefig(os.path.join(CHARTS_DIR, app_chart))
-    plt.close()
-    
-    # Time series chart if enough data
-    if len(df) > 1:
+@metrics.timed("save")
+def save_user_transaction(username, transaction):
+    # Concurrent inserts for a user are combined into one locked write, which
+    # also deducts the amount from the balance
+    group_committer.submit(username, transaction)
+    user_cache.invalidate(username)
+
+@metrics.timed("save")
+def save_user_profile(username, profile):
+    # Re-read under the user's lock so a concurrent insert isn't overwritten;
+    # every backend's update_profile() only writes the profile
+    with user_storage.lock(username):
+        stored = user_storage.load_profile(username)
+        stored.update(profile)
+        user_storage.update_profile(username, {"profile": stored})
+    user_cache.invalidate(username)
+
+def check_alerts(username):
+    # Re-evaluates the alert rules for one user from the backend's running
+    # totals and stored profile, so a write never reloads the history
+    alerts.check_user(user_storage, alert_queue, username)
+
+def chart_epoch():
+    # Changes twice per chart eviction age. Pages with charts put it in their
+    # ETag, so they are rendered (which touches their images) often enough
+    # that a page a browser keeps revalidating never points at evicted charts.
+    return int(time.time() // max(chart_cache.CHART_CACHE_MAX_AGE // 2, 1))
+
+def local_only(view):
+    # Serves the view only to addresses in UPI_STATS_ALLOW (the machine
+    # itself by default); anyone else gets a 404. A request that came
+    # through a proxy is refused too, because the proxy's own address
+    # says nothing about who sent it.
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.remote_addr not in STATS_ALLOWED or 'X-Forwarded-For' in request.headers:
+            return Response(status=404)
+        return view(*args, **kwargs)
+    return wrapper
+
+def conditional_on_data(extra=None):
+    # Lets a page drawn from the user's data answer conditional GETs. The
+    # ETag is the stored data version plus the URL and whatever else
+    # extra(username) says the page depends on, so it is known before
+    # anything is loaded; a matching If-None-Match gets a 304 right away.
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            username = session.get('username')
+            # Flash messages are shown only once, so those pages can't be reused
+            if username is None or session.get('_flashes'):
+                return view(*args, **kwargs)
+            
+            # Read before rendering, like load_user_data(), so a concurrent
+            # write can only make the tag look older than the page
+            version = user_storage.version(username)
+            modified = user_storage.last_modified(username)
+            parts = (PAGE_VERSION, username, version, request.full_path, extra(username) if extra else None)
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+            
+            # Only If-None-Match is honoured: Last-Modified has one second
+            # resolution and doesn't cover what extra() adds
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if modified is not None:
+                response.last_modified = modified
+            # Private to the user, and checked with the server on every visit
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+def dashboard_extra(username):
+    # The dashboard also shows this month's spending and the alert queue
+    return (timestamps.this_month(), storage.file_stamp(alert_queue.get_alert_file(username)), chart_epoch())
+
+def render_chart(summary, kind, path):
+    # matplotlib and seaborn take most of the app's startup time, so
+    # they are imported by the requests that draw charts rather than at boot
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
+    if kind == "category":
+        # Category spending chart
+        plt.figure(figsize=(10, 6))
+        category_spending = sorted(summary["by_category"].items(), key=lambda x: x[1], reverse=True)
+        
+        # Create a colorful bar chart
+        sns.barplot(x=[c for c, _ in category_spending], y=[a for _, a in category_spending])
+        plt.title('Spending by Category')
+        plt.xlabel('Category')
+        plt.ylabel('Amount (₹)')
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+    elif kind == "app":
+        # UPI app spending chart
+        plt.figure(figsize=(10, 6))
+        app_spending = sorted(summary["by_upi_app"].items(), key=lambda x: x[1], reverse=True)
+        
+        # Create a pie chart for UPI apps
+        plt.pie([a for _, a in app_spending], labels=[app for app, _ in app_spending], autopct='%1.1f%%', startangle=90)
+        plt.axis('equal')
+        plt.title('Spending by UPI App')
+        plt.tight_layout()
+    elif kind == "time":
         plt.figure(figsize=(12, 6))
-        # Ensure chronological order
-        df = df.sort_values('date')
-        # Group by date and sum amounts
-        daily_spending = df.groupby(df['date'].dt.date)['amount'].sum()
+        # Daily totals, in chronological order, from the daily rollup
+        daily = sorted(summary["by_day"].items())
+        days = [datetime.date.fromisoformat(day) for day, _ in daily]
+        daily_spending = [amount for _, amount in daily]
         
-        plt.plot(daily_spending.index, daily_spending.values, marker='o', linestyle='-')
+        plt.plot(days, daily_spending, marker='o', linestyle='-')
         plt.title('Daily Spending Over Time')
         plt.xlabel('Date')
         plt.ylabel('Amount (₹)')
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.xticks(rotation=45)
         plt.tight_layout()
-        
-        time_chart = f"{username}_timeseries.png"
-        plt.savefig(os.path.join(CHARTS_DIR, time_chart))
-        plt.close()
-        
-        return {
-            "category": category_chart,
-            "app": app_chart,
-            "time": time_chart
-        }
     
-    return {
-        "category": category_chart,
-        "app": app_chart
-    }
+    plt.savefig(path, format='png')
+    plt.close()
+
+@metrics.timed("charts")
+def generate_charts(username, summary):
+    # Charts are drawn from the user's running totals and daily rollup
+    # (see spending_summary()), never from the raw transactions
+    if not summary["count"]:
+        return None
+    
+    # Time series chart only if enough data
+    kinds = ["category", "app"]
+    if summary["count"] > 1:
+        kinds.append("time")
+    
+    # Charts are keyed by the data they plot, so unchanged charts are reused as-is
+    charts = {}
+    missing = []
+    for kind in kinds:
+        key = chart_cache.chart_key(summary, kind)
+        charts[kind] = chart_cache.chart_filename(username, kind, key)
+        if not chart_cache.lookup(CHARTS_DIR, charts[kind]):
+            missing.append(kind)
+    
+    if not missing:
+        return charts
+    
+    for kind in missing:
+        temp_path = chart_cache.store_path(CHARTS_DIR, charts[kind])
+        with metrics.phase("chart_render"):
+            render_chart(summary, kind, temp_path)
+        chart_cache.commit(CHARTS_DIR, charts[kind], temp_path)
+        chart_cache.evict_superseded(CHARTS_DIR, username, kind, charts[kind])
+    
+    chart_cache.evict(CHARTS_DIR)
+    
+    return charts
+
+def encode_cursor(cursor):
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        local, transaction_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except (ValueError, TypeError):
+        return None
+    # Cursors are (local seconds, id as text), see date_index.sort_key();
+    # anything else is a stale or hand-made link
+    if type(local) is not int or not isinstance(transaction_id, str):
+        return None
+    return (local, transaction_id)
+
+def parse_transaction_filters(args):
+    filters = {}
+    errors = []
+    
+    if args.get('category'):
+        filters["category"] = args['category']
+    if args.get('upi_app'):
+        filters["upi_app"] = args['upi_app']
+    
+    # End date is inclusive in the form, exclusive in the query
+    for field, key, offset in (('start_date', 'date_from', 0), ('end_date', 'date_to', 1)):
+        if args.get(field):
+            try:
+                day = datetime.datetime.strptime(args[field], "%Y-%m-%d").date()
+                filters[key] = timestamps.day_start(day + datetime.timedelta(days=offset))
+            except ValueError:
+                errors.append(field)
+    
+    for field in ('min_amount', 'max_amount'):
+        if args.get(field):
+            try:
+                filters[field] = float(args[field])
+            except ValueError:
+                errors.append(field)
+    
+    return filters, errors
 
 def get_saving_tip():
     tips = [
@@ -166,12 +352,31 @@ def get_saving_tip():
     return random.choice(tips)
 
 # Routes
+@app.after_request
+def cache_chart_images(response):
+    # Chart file names change with the totals they plot, so browsers can
+    # keep an image as long as the chart cache does without asking again
+    if (request.endpoint == 'static' and response.status_code in (200, 304)
+            and request.view_args.get('filename', '').startswith('charts/')):
+        response.cache_control.no_cache = None
+        response.cache_control.public = None
+        response.cache_control.private = True
+        response.cache_control.max_age = chart_cache.CHART_CACHE_MAX_AGE
+    return response
+
 @app.route('/')
 def index():
     if 'username' in session:
         return redirect(url_for('dashboard'))
     return render_template('index.html')
 
+def hashing_busy(template):
+    # Load shedding: the form again with a 503, without waiting for a hash
+    flash('Too many sign-ins right now, please try again in a few seconds', 'warning')
+    response = app.make_response((render_template(template), 503))
+    response.headers['Retry-After'] = str(HASH_RETRY_AFTER)
+    return response
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -183,19 +388,29 @@ def register():
             flash('Passwords do not match', 'danger')
             return redirect(url_for('register'))
         
-        users = load_users()
+        # The CLI's data is stored under this name, in the same namespace
+        if username == storage.CLI_USERNAME:
+            flash('That username is reserved, please choose another', 'danger')
+            return redirect(url_for('register'))
         
-        if username in users:
+        if user_accounts.exists(username):
             flash('Username already exists', 'danger')
             return redirect(url_for('register'))
         
-        # Create new user
-        users[username] = {
-            "password_hash": generate_password_hash(password),
-            "created_at": datetime.datetime.now().isoformat()
-        }
+        try:
+            with metrics.phase("hash"):
+                password_hash = hasher.generate(password)
+        except password_hasher.HasherBusy:
+            return hashing_busy('register.html')
         
-        save_users(users)
+        # Create new user; only one of two concurrent signups for a name succeeds
+        created = user_accounts.create(username, {
+            "password_hash": password_hash,
+            "created_at": datetime.datetime.now().isoformat()
+        })
+        if not created:
+            flash('Username already exists', 'danger')
+            return redirect(url_for('register'))
         
         # Create initial user data
         user_data = load_user_data(username)
@@ -212,9 +427,17 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        users = load_users()
+        # An account registered under the CLI's name before it was reserved
+        # would see the CLI's transactions
+        user = user_accounts.get(username) if username != storage.CLI_USERNAME else None
+        
+        try:
+            with metrics.phase("hash"):
+                valid = user is not None and hasher.check(user["password_hash"], password)
+        except password_hasher.HasherBusy:
+            return hashing_busy('login.html')
         
-        if username not in users or not check_password_hash(users[username]["password_hash"], password):
+        if not valid:
             flash('Invalid username or password', 'danger')
             return redirect(url_for('login'))
         
@@ -230,37 +453,32 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/dashboard')
+@conditional_on_data(dashboard_extra)
 def dashboard():
     if 'username' not in session:
         return redirect(url_for('login'))
     
     username = session['username']
-    user_data = load_user_data(username)
+    profile = load_profile(username)
+    user_data = query_source(username)
     
-    # Generate charts for the dashboard
-    charts = generate_charts(username) or {}
+    # The 10 most recent transactions, newest first
+    transactions, _ = user_storage.page_transactions(username, limit=10, data=user_data)
     
-    # Get transactions, sorted by date (newest first)
-    transactions = sorted(
-        user_data["transactions"], 
-        key=lambda x: x.get("date", ""), 
-        reverse=True
-    )
+    # Spending statistics from the running totals kept by the storage backend
+    summary = user_storage.spending_summary(username, user_data)
+    total_spent = summary["total"]
     
-    # Calculate spending statistics
-    total_spent = sum(t["amount"] for t in user_data["transactions"])
+    # Generate charts for the dashboard
+    charts = generate_charts(username, summary) or {}
     
     # Monthly spending
-    current_month = datetime.datetime.now().strftime("%Y-%m")
-    monthly_transactions = [
-        t for t in user_data["transactions"] 
-        if t["date"].startswith(current_month)
-    ]
-    monthly_spent = sum(t["amount"] for t in monthly_transactions)
+    current_month = timestamps.this_month()
+    monthly_spent = summary["by_month"].get(current_month, 0)
     
     # Budget calculations
-    budget = user_data["profile"]["monthly_budget"]
-    balance = user_data["profile"]["account_balance"]
+    budget = profile["monthly_budget"]
+    balance = profile["account_balance"]
     budget_percent = (monthly_spent / budget * 100) if budget > 0 else 0
     
     # Get a saving tip
@@ -268,37 +486,47 @@ def dashboard():
     
     return render_template(
         'dashboard.html',
-        profile=user_data["profile"],
-        transactions=transactions[:10],  # Show only the 10 most recent
+        profile=profile,
+        transactions=transactions,
         charts=charts,
         total_spent=total_spent,
         monthly_spent=monthly_spent,
         budget_percent=budget_percent,
         balance=balance,
-        saving_tip=saving_tip
+        saving_tip=saving_tip,
+        alerts=alert_queue.unread(username)
     )
 
+@app.route('/dismiss_alert', methods=['POST'])
+def dismiss_alert():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    
+    # Without an alert_id every alert is dismissed
+    alert_queue.dismiss(session['username'], request.form.get('alert_id') or None)
+    return redirect(url_for('dashboard'))
+
 @app.route('/profile', methods=['GET', 'POST'])
 def profile():
     if 'username' not in session:
         return redirect(url_for('login'))
     
     username = session['username']
-    user_data = load_user_data(username)
     
     if request.method == 'POST':
         # Update profile
-        user_data["profile"]["name"] = request.form['name']
-        user_data["profile"]["account_balance"] = float(request.form['account_balance'])
-        user_data["profile"]["monthly_budget"] = float(request.form['monthly_budget'])
-        user_data["profile"]["parent_email"] = request.form['parent_email']
-        user_data["profile"]["share_with_parents"] = 'share_with_parents' in request.form
-        
-        save_user_data(username, user_data)
+        save_user_profile(username, {
+            "name": request.form['name'],
+            "account_balance": float(request.form['account_balance']),
+            "monthly_budget": float(request.form['monthly_budget']),
+            "parent_email": request.form['parent_email'],
+            "share_with_parents": 'share_with_parents' in request.form
+        })
+        check_alerts(username)
         flash('Profile updated successfully', 'success')
         return redirect(url_for('dashboard'))
     
-    return render_template('profile.html', profile=user_data["profile"])
+    return render_template('profile.html', profile=load_profile(username))
 
 @app.route('/add_transaction', methods=['GET', 'POST'])
 def add_transaction():
@@ -306,35 +534,41 @@ def add_transaction():
         return redirect(url_for('login'))
     
     username = session['username']
-    user_data = load_user_data(username)
     
     if request.method == 'POST':
         try:
             amount = float(request.form['amount'])
             description = request.form['description']
             upi_app = request.form['upi_app']
-            category = request.form['category']
+            category = request.form.get('category', '')
+            
+            # Left on "Auto-detect", the category comes from the description
+            if category not in CATEGORIES:
+                category = categorizer.get_categorizer().categorize(description)
             
             if amount <= 0:
                 flash('Amount must be greater than 0', 'danger')
                 return redirect(url_for('add_transaction'))
             
-            # Create transaction
-            transaction = {
-                "id": str(uuid.uuid4()),  # Generate unique ID
-                "date": datetime.datetime.now().isoformat(),
-                "amount": amount,
-                "description": description,
-                "upi_app": upi_app,
-                "category": category
-            }
+            if upi_app not in UPI_APPS:
+                flash('Please choose a UPI app from the list', 'danger')
+                return redirect(url_for('add_transaction'))
             
-            # Update balance
-            user_data["profile"]["account_balance"] -= amount
+            # Create transaction
+            ts, tz = timestamps.now()
+            transaction = Transaction(
+                id=str(uuid.uuid4()),  # Generate unique ID
+                ts=ts,
+                tz=tz,
+                amount=amount,
+                description=description,
+                upi_app=upi_app,
+                category=category
+            )
             
-            # Add transaction
-            user_data["transactions"].append(transaction)
-            save_user_data(username, user_data)
+            # Add transaction and update balance
+            save_user_transaction(username, transaction)
+            check_alerts(username)
             
             flash('Transaction added successfully', 'success')
             return redirect(url_for('dashboard'))
@@ -348,78 +582,169 @@ def add_transaction():
         upi_apps=UPI_APPS
     )
 
+@app.route('/import_statement', methods=['GET', 'POST'])
+def import_statement():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    
+    username = session['username']
+    
+    if request.method == 'POST':
+        upload = request.files.get('statement')
+        if not upload or not upload.filename:
+            flash('Please choose a statement file', 'danger')
+            return redirect(url_for('import_statement'))
+        
+        default_app = request.form.get('upi_app', 'Other')
+        if default_app not in UPI_APPS:
+            default_app = 'Other'
+        
+        # Parsed from disk in chunks rather than held in memory
+        extension = os.path.splitext(upload.filename)[1].lower()
+        fd, temp_path = tempfile.mkstemp(suffix=extension, dir=DATA_DIR)
+        os.close(fd)
+        try:
+            # Pulls in pandas, so it is only imported when a statement arrives
+            import importer
+            upload.save(temp_path)
+            stats = importer.import_statement(
+                user_storage, username, temp_path, CATEGORIES,
+                default_app=default_app,
+                dayfirst='dayfirst' in request.form,
+                categorizer=categorizer.get_categorizer()
+            )
+        except ValueError as e:
+            flash(f'Could not import statement: {e}', 'danger')
+            return redirect(url_for('import_statement'))
+        finally:
+            os.remove(temp_path)
+            user_cache.invalidate(username)
+        
+        check_alerts(username)
+        flash(f'Imported {stats["imported"]} transactions (₹{stats["amount"]:.2f}), '
+              f'skipped {stats["skipped"]} rows', 'success')
+        unreadable = importer.unreadable_dates_message(stats)
+        if unreadable:
+            flash(unreadable, 'warning')
+        return redirect(url_for('all_transactions'))
+    
+    return render_template('import_statement.html', upi_apps=UPI_APPS)
+
 @app.route('/all_transactions')
+@conditional_on_data()
 def all_transactions():
     if 'username' not in session:
         return redirect(url_for('login'))
     
     username = session['username']
-    user_data = load_user_data(username)
     
-    # Sort transactions by date (newest first)
-    transactions = sorted(
-        user_data["transactions"], 
-        key=lambda x: x.get("date", ""), 
-        reverse=True
+    filters, errors = parse_transaction_filters(request.args)
+    if errors:
+        flash(f'Ignored invalid filter values: {", ".join(errors)}', 'warning')
+    
+    try:
+        page_size = min(max(int(request.args.get('page_size', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = PAGE_SIZE
+    
+    # One page at a time, newest first, continuing after the cursor
+    cursor = decode_cursor(request.args.get('cursor'))
+    transactions, next_cursor = user_storage.page_transactions(
+        username, filters, cursor, page_size, query_source(username)
     )
     
-    return render_template('all_transactions.html', transactions=transactions)
+    # Query parameters to carry over to the next page
+    filter_args = {
+        key: value for key, value in request.args.items()
+        if key != 'cursor' and value
+    }
+    
+    return render_template(
+        'all_transactions.html',
+        transactions=transactions,
+        next_cursor=encode_cursor(next_cursor),
+        is_first_page=cursor is None,
+        filter_args=filter_args,
+        categories=CATEGORIES,
+        upi_apps=UPI_APPS
+    )
+
+@app.route('/search')
+@conditional_on_data()
+def search():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    
+    username = session['username']
+    query = request.args.get('q', '').strip()
+    
+    filters, errors = parse_transaction_filters(request.args)
+    if errors:
+        flash(f'Ignored invalid filter values: {", ".join(errors)}', 'warning')
+    
+    result = None
+    if query:
+        # The index covers the whole history, archived months included
+        data = None if user_storage.indexed else load_user_data(username)
+        result = user_storage.search(username, query, filters, data=data)
+    
+    filter_args = {key: value for key, value in request.args.items() if value}
+    
+    return render_template(
+        'search.html',
+        query=query,
+        result=result,
+        filter_args=filter_args,
+        categories=CATEGORIES,
+        upi_apps=UPI_APPS
+    )
 
 @app.route('/analytics')
+@conditional_on_data(lambda username: chart_epoch())
 def analytics():
     if 'username' not in session:
         return redirect(url_for('login'))
     
     username = session['username']
-    user_data = load_user_data(username)
     
-    # Generate fresh charts
-    charts = generate_charts(username) or {}
+    # Aggregates come from the running totals kept by the storage backend
+    summary = user_storage.spending_summary(username, query_source(username))
     
     # If no transactions, redirect to add transaction
-    if not user_data["transactions"]:
+    if not summary["count"]:
         flash('Add some transactions to see analytics', 'info')
         return redirect(url_for('add_transaction'))
     
-    # Convert to DataFrame for analysis
-    df = pd.DataFrame(user_data["transactions"])
+    # Generate charts (reused from the chart cache when the data is unchanged)
+    charts = generate_charts(username, summary)
     
     # Calculate basic stats
-    total_spent = sum(t["amount"] for t in user_data["transactions"])
-    transaction_count = len(user_data["transactions"])
+    total_spent = summary["total"]
+    transaction_count = summary["count"]
     avg_transaction = total_spent / transaction_count if transaction_count > 0 else 0
     
     # Category breakdown
     category_data = {}
-    if not df.empty:
-        df['date'] = pd.to_datetime(df['date'])
-        category_spending = df.groupby('category')['amount'].sum().sort_values(ascending=False)
-        
-        for category, amount in category_spending.items():
-            percentage = (amount / total_spent) * 100
-            category_data[category] = {
-                "amount": amount,
-                "percentage": percentage
-            }
+    category_spending = sorted(summary["by_category"].items(), key=lambda x: x[1], reverse=True)
+    for category, amount in category_spending:
+        percentage = (amount / total_spent) * 100 if total_spent else 0
+        category_data[category] = {
+            "amount": amount,
+            "percentage": percentage
+        }
     
     # UPI app breakdown
     app_data = {}
-    if not df.empty:
-        app_spending = df.groupby('upi_app')['amount'].sum().sort_values(ascending=False)
-        
-        for app, amount in app_spending.items():
-            percentage = (amount / total_spent) * 100
-            app_data[app] = {
-                "amount": amount,
-                "percentage": percentage
-            }
+    app_spending = sorted(summary["by_upi_app"].items(), key=lambda x: x[1], reverse=True)
+    for app, amount in app_spending:
+        percentage = (amount / total_spent) * 100 if total_spent else 0
+        app_data[app] = {
+            "amount": amount,
+            "percentage": percentage
+        }
     
-    # Monthly spending trend
-    monthly_trend = {}
-    if not df.empty:
-        df['month'] = df['date'].dt.strftime('%Y-%m')
-        monthly_spending = df.groupby('month')['amount'].sum().to_dict()
-        monthly_trend = dict(sorted(monthly_spending.items()))
+    # Monthly spending trend, straight from the monthly rollup
+    monthly_trend = dict(sorted(summary["by_month"].items()))
     
     return render_template(
         'analytics.html',
@@ -430,7 +755,7 @@ def analytics():
         category_data=category_data,
         app_data=app_data,
         monthly_trend=monthly_trend,
-        profile=user_data["profile"]
+        profile=load_profile(username)
     )
 
 @app.route('/share_with_parent')
@@ -439,31 +764,61 @@ def share_with_parent():
         return redirect(url_for('login'))
     
     username = session['username']
-    user_data = load_user_data(username)
+    profile = load_profile(username)
     
-    parent_email = user_data["profile"]["parent_email"]
-    share_enabled = user_data["profile"]["share_with_parents"]
+    parent_email = profile["parent_email"]
+    share_enabled = profile["share_with_parents"]
     
     if not parent_email or not share_enabled:
         flash('Please enable sharing with parents in your profile', 'warning')
         return redirect(url_for('profile'))
     
-    # In a real app, this would send an email to the parent
-    # For the prototype, we'll just show a success message
+    # This month's report so far goes into the outbox, next to the
+    # scheduled weekly and monthly ones
+    report, _ = parent_reports.queue_report(
+        user_storage, username, parent_reports.month_to_date(), OUTBOX_DIR, data=query_source(username)
+    )
     
-    flash(f'Spending report has been shared with {parent_email}', 'success')
+    flash(f'Spending report for {report["period"].label} has been sent to {parent_email}', 'success')
     return redirect(url_for('dashboard'))
 
 @app.route('/export_data')
+@conditional_on_data()
 def export_data():
     if 'username' not in session:
         return redirect(url_for('login'))
     
     username = session['username']
-    user_data = load_user_data(username)
     
-    # For the prototype, we'll just return the raw JSON data
-    return jsonify(user_data["transactions"])
+    fmt = request.args.get('format', 'json')
+    if fmt not in export.EXPORT_FORMATS:
+        flash(f'Unknown export format: {fmt}', 'danger')
+        return redirect(url_for('dashboard'))
+    compress = request.args.get('gzip') in ('1', 'true', 'yes')
+    
+    filters, errors = parse_transaction_filters(request.args)
+    if errors:
+        flash(f'Invalid export filters: {", ".join(errors)}', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    # A date range only reads the archived months it covers; a full export
+    # needs every row anyway and uses the cached document
+    if filters.get("date_from") is not None or filters.get("date_to") is not None:
+        data = query_source(username)
+    else:
+        data = None if user_storage.indexed else load_user_data(username)
+    
+    # Rows are serialized as they are read, so memory stays flat however large the export
+    rows = user_storage.iter_transactions(username, filters, data)
+    response = Response(
+        stream_with_context(export.stream_export(rows, fmt, compress)),
+        mimetype=export.EXPORT_FORMATS[fmt]
+    )
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    if fmt != 'json' or compress:
+        response.headers['Content-Disposition'] = f'attachment; filename={export.export_filename(fmt)}'
+    return response
 
 # Sample data for testing
 def add_sample_data(username):
@@ -558,7 +913,7 @@ def add_sample_data(username):
             }
         ]
         
-        user_data["transactions"] = sample_transactions
+        user_data["transactions"] = from_dicts(sample_transactions)
         save_user_data(username, user_data)
         return True
     
@@ -579,5 +934,40 @@ def route_add_sample_data():
     
     return redirect(url_for('dashboard'))
 
+@app.route('/cache_stats')
+@local_only
+def cache_stats():
+    return jsonify(user_cache.stats())
+
+def process_stats():
+    cache = user_cache.stats()
+    commits = group_committer.stats()
+    labels = categorizer.get_categorizer().stats()
+    hashing = hasher.stats()
+    return [
+        ("upi_user_cache_entries", "gauge", "User documents in this worker's cache.", cache["size"]),
+        ("upi_user_cache_hits_total", "counter", "User cache hits.", cache["hits"]),
+        ("upi_user_cache_misses_total", "counter", "User cache misses.", cache["misses"]),
+        ("upi_user_cache_evictions_total", "counter", "User cache evictions.", cache["evictions"]),
+        ("upi_group_commits_total", "counter", "Batched transaction writes.", commits["commits"]),
+        ("upi_group_commit_transactions_total", "counter", "Transactions written by batched writes.", commits["transactions"]),
+        ("upi_categorizer_matched_total", "counter", "Descriptions matched by a category rule.", labels["matched"]),
+        ("upi_categorizer_unmatched_total", "counter", "Descriptions no category rule matched.", labels["unmatched"]),
+        ("upi_password_hashes_in_flight", "gauge", "Password hashes running or queued.", hashing["in_flight"]),
+        ("upi_password_hashes_total", "counter", "Password hashes completed.", hashing["completed"]),
+        ("upi_password_hashes_rejected_total", "counter", "Password hashes refused because the queue was full.", hashing["rejected"]),
+        ("upi_password_hash_timeouts_total", "counter", "Password hashes that took longer than the timeout.", hashing["timeouts"]),
+        ("upi_password_hash_seconds_total", "counter", "Time spent computing password hashes.", hashing["hash_seconds"]),
+        ("upi_password_hash_wait_seconds_total", "counter", "Time password hashes spent queued for a worker.", hashing["wait_seconds"])
+    ]
+
+metrics.register_collector(process_stats)
+
+@app.route('/metrics')
+@local_only
+def metrics_endpoint():
+    # Prometheus text format; figures are per worker process
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
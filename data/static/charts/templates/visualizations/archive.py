@@ -0,0 +1,284 @@
+"""Closed months of a user's transactions, one columnar partition per month.
+
+A partition file holds a JSON header followed by packed NumPy columns:
+seq (the row's position in the user's history), ts, tz and amount, plus
+category, UPI app and description as codes into label lists kept in the
+header. Transaction ids are a JSON list at the end of the file. Readers
+memory-map the file, so summing or filtering a month only touches the
+columns it needs, and the ids are parsed only when rows are built.
+
+Files are replaced atomically; a reader holding an older mapping keeps
+reading the old file.
+"""
+
+import os
+import json
+import struct
+import threading
+
+import numpy as np
+
+import timestamps
+from transaction import Transaction
+
+MAGIC = b"UPIPART1"
+SUFFIX = ".part"
+MANIFEST = "manifest.json"
+
+# Column name -> dtype, in file order
+COLUMNS = {
+    "seq": "<i8",
+    "ts": "<i8",
+    "tz": "<i2",
+    "amount": "<f8",
+    "category": "<u4",
+    "upi_app": "<u4",
+    "description": "<u4"
+}
+LABELED = ("category", "upi_app", "description")
+
+
+def _aligned(size, alignment=8):
+    return (size + alignment - 1) // alignment * alignment
+
+
+def write_partition(path, month, rows, seqs):
+    labels = {field: {} for field in LABELED}
+    arrays = {
+        "seq": np.asarray(seqs, dtype=COLUMNS["seq"]),
+        "ts": np.array([t["ts"] for t in rows], dtype=COLUMNS["ts"]),
+        "tz": np.array([t["tz"] for t in rows], dtype=COLUMNS["tz"]),
+        "amount": np.array([t["amount"] for t in rows], dtype=COLUMNS["amount"])
+    }
+    for field in LABELED:
+        codes = labels[field]
+        arrays[field] = np.array(
+            [codes.setdefault(t.get(field) or "", len(codes)) for t in rows], dtype=COLUMNS[field]
+        )
+    ids = json.dumps([t.get("id") for t in rows]).encode("utf-8")
+
+    # The header is written last but sized first, so offsets are known up front
+    header = {"month": month, "count": len(rows), "labels": {f: list(labels[f]) for f in LABELED}}
+    layout = {}
+    offset = 0
+    for name in COLUMNS:
+        layout[name] = offset
+        offset += _aligned(arrays[name].nbytes)
+    header["columns"] = layout
+    header["ids"] = [offset, len(ids)]
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name in COLUMNS:
+            data = arrays[name].tobytes()
+            f.write(data + b"\0" * (_aligned(len(data)) - len(data)))
+        f.write(ids)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class Partition:
+    """One month of archived transactions, memory-mapped."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a transaction partition: {path}")
+            size, = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(size))
+        self.path = path
+        self.month = header["month"]
+        self.count = header["count"]
+        self.labels = header["labels"]
+        self._ids_at = header["ids"]
+        self._ids = None
+        start = _aligned(len(MAGIC) + 8 + size)
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.frombuffer(
+                self._buffer, dtype=dtype, count=self.count, offset=start + header["columns"][name]
+            ))
+        self._start = start
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def local(self):
+        # Local seconds, see timestamps.py
+        return self.ts + self.tz.astype(np.int64) * 60
+
+    def ids(self):
+        if self._ids is None:
+            offset, length = self._ids_at
+            start = self._start + offset
+            self._ids = json.loads(bytes(self._buffer[start:start + length]))
+        return self._ids
+
+    def transactions(self, positions=None):
+        # Rows in stored order, or only those at `positions`
+        ids = self.ids()
+        columns = [self.ts, self.tz, self.amount, self.description, self.upi_app, self.category]
+        if positions is not None:
+            ids = [ids[i] for i in positions]
+            columns = [column[positions] for column in columns]
+        ts, tz, amount, description, upi_app, category = (column.tolist() for column in columns)
+        descriptions = self.labels["description"]
+        apps = self.labels["upi_app"]
+        categories = self.labels["category"]
+        return [
+            Transaction.from_record(ids[i], ts[i], tz[i], amount[i], descriptions[description[i]],
+                                    apps[upi_app[i]], categories[category[i]])
+            for i in range(len(ids))
+        ]
+
+    def select(self, date_from=None, date_to=None):
+        # Positions of the rows in [date_from, date_to), local seconds
+        keep = np.ones(self.count, dtype=bool)
+        if date_from is not None:
+            keep &= self.local >= date_from
+        if date_to is not None:
+            keep &= self.local < date_to
+        return np.flatnonzero(keep)
+
+    def holds(self, rows, seqs):
+        # Cheap check that the partition already has exactly these rows
+        return (
+            self.count == len(rows)
+            and np.array_equal(self.seq, seqs)
+            and np.array_equal(self.ts, [t["ts"] for t in rows])
+            and np.array_equal(self.amount, [t["amount"] for t in rows])
+        )
+
+
+def split(transactions, open_month):
+    """Splits a history into the rows of months before `open_month`, as
+    {month: (rows, positions in the history)}, and the other rows."""
+    closed = {}
+    rest = []
+    for seq, t in enumerate(transactions):
+        month = timestamps.month_key(t["ts"], t["tz"])
+        if month < open_month:
+            rows, seqs = closed.setdefault(month, ([], []))
+            rows.append(t)
+            seqs.append(seq)
+        else:
+            rest.append(t)
+    return closed, rest
+
+
+class Archive:
+    """The archived months of one user, as a directory of partition files
+    plus a manifest recording the open month when it was last written."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._partitions = {}
+        self.lock = threading.Lock()
+
+    def path(self, month):
+        return os.path.join(self.directory, f"{month}{SUFFIX}")
+
+    def months(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(SUFFIX)] for name in os.listdir(self.directory) if name.endswith(SUFFIX))
+
+    def partition(self, month):
+        # Mappings are reused until the file is replaced
+        path = self.path(month)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self.lock:
+            cached = self._partitions.get(month)
+            if cached is None or cached[0] != stamp:
+                cached = self._partitions[month] = (stamp, Partition(path))
+            return cached[1]
+
+    def partitions(self, months=None):
+        return [self.partition(month) for month in (self.months() if months is None else months)]
+
+    def months_between(self, date_from=None, date_to=None):
+        # Months that can hold rows in [date_from, date_to), local seconds
+        first = None if date_from is None else timestamps.month_key(date_from, 0)
+        last = None if date_to is None else timestamps.month_key(date_to - 1, 0)
+        return [
+            month for month in self.months()
+            if (first is None or month >= first) and (last is None or month <= last)
+        ]
+
+    def open_month(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST), 'r') as f:
+                return json.load(f).get("open_month")
+        except (OSError, ValueError):
+            return None
+
+    def write(self, closed, open_month):
+        """Writes the partitions for `closed` ({month: (rows, positions)}, see
+        split()), skipping those that already hold the same rows."""
+        os.makedirs(self.directory, exist_ok=True)
+        months = self.months()
+        for month, (rows, seqs) in closed.items():
+            if month in months and self.partition(month).holds(rows, seqs):
+                continue
+            write_partition(self.path(month), month, rows, seqs)
+        temp_path = os.path.join(self.directory, f"{MANIFEST}.{os.getpid()}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump({"open_month": open_month}, f)
+        os.replace(temp_path, os.path.join(self.directory, MANIFEST))
+
+    def keep(self, months):
+        # Drops the partitions of any other month
+        for month in self.months():
+            if month not in months:
+                os.remove(self.path(month))
+
+    def clear(self):
+        for month in self.months():
+            os.remove(self.path(month))
+        manifest = os.path.join(self.directory, MANIFEST)
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        if os.path.isdir(self.directory) and not os.listdir(self.directory):
+            os.rmdir(self.directory)
+
+    def positions(self, rest_count, partitions=None):
+        """Positions in the full history of the `rest_count` rows that were
+        not archived, or None if the stored positions don't add up (files
+        left by different writes)."""
+        if partitions is None:
+            partitions = self.partitions()
+        total = sum(p.count for p in partitions) + rest_count
+        gaps = np.ones(total, dtype=bool)
+        for p in partitions:
+            if p.count and (p.seq.min() < 0 or p.seq.max() >= total):
+                return None
+            gaps[p.seq] = False
+        gap_seqs = np.flatnonzero(gaps)
+        return gap_seqs if len(gap_seqs) == rest_count else None
+
+    def merge(self, rest):
+        """The full history: archived rows back at their positions and the
+        other rows, in order, in the gaps."""
+        partitions = self.partitions()
+        if not partitions:
+            return rest
+        archived = [t for p in partitions for t in p.transactions()]
+        gaps = self.positions(len(rest), partitions)
+        if gaps is None:
+            # A write was cut off between the archive and the JSON file, so
+            # rows may be in both; keep the archived copy
+            ids = {t["id"] for t in archived}
+            return archived + [t for t in rest if t["id"] not in ids]
+        history = [None] * (len(archived) + len(rest))
+        for seq, t in zip(np.concatenate([p.seq for p in partitions]).tolist(), archived):
+            history[seq] = t
+        for seq, t in zip(gaps.tolist(), rest):
+            history[seq] = t
+        return history
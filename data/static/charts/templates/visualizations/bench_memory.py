@@ -0,0 +1,91 @@
+"""Memory benchmark: Transaction objects against plain dicts.
+
+Builds the same synthetic history as JSON text, parses it, and measures with
+tracemalloc how much memory the parsed list holds as dicts and as
+Transaction objects. Web histories use uuid4 string ids, CLI histories use
+integer ids.
+
+    python bench_memory.py
+    python bench_memory.py --count 500000 --json memory.json
+"""
+import gc
+import sys
+import json
+import uuid
+import random
+import argparse
+import datetime
+import tracemalloc
+
+from transaction import from_dicts
+
+CATEGORIES = ["Food", "Transportation", "Shopping", "Entertainment", "Education", "Utilities", "Health", "Other"]
+UPI_APPS = ["Google Pay", "PhonePe", "Paytm", "Amazon Pay", "BHIM", "WhatsApp Pay", "Other"]
+
+
+def synthetic_json(count, cli_ids, seed=0):
+    rng = random.Random(seed)
+    start = int(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+    transactions = []
+    for i in range(count):
+        # Stored form: epoch seconds plus the UTC offset in minutes
+        transactions.append({
+            "id": i + 1 if cli_ids else str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "ts": start + rng.randrange(365 * 86400),
+            "tz": 330,
+            "amount": round(rng.uniform(10, 2000), 2),
+            "description": f"Paid to merchant {rng.randrange(500)}",
+            "upi_app": rng.choice(UPI_APPS),
+            "category": rng.choice(CATEGORIES)
+        })
+    return json.dumps(transactions)
+
+
+def measure(text, convert):
+    # Bytes still allocated once the parsed history is built
+    gc.collect()
+    tracemalloc.start()
+    transactions = json.loads(text)
+    if convert:
+        transactions = from_dicts(transactions)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del transactions
+    return current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Transaction and dict memory use")
+    parser.add_argument("--count", type=int, default=200000, help="Transactions per history")
+    parser.add_argument("--json", dest="json_file", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = {"python": sys.version.split()[0], "count": args.count}
+    for layout, cli_ids in (("web", False), ("cli", True)):
+        text = synthetic_json(args.count, cli_ids)
+        dict_bytes, dict_peak = measure(text, convert=False)
+        slot_bytes, slot_peak = measure(text, convert=True)
+        results[layout] = {
+            "dict_bytes": dict_bytes,
+            "transaction_bytes": slot_bytes,
+            "dict_bytes_per_row": dict_bytes / args.count,
+            "transaction_bytes_per_row": slot_bytes / args.count,
+            "saved": 1 - slot_bytes / dict_bytes,
+            "conversion_peak_bytes": slot_peak
+        }
+
+    print(f"{args.count} transactions per history")
+    for layout in ("web", "cli"):
+        r = results[layout]
+        print(f"{layout}: dict {r['dict_bytes'] / 2**20:7.1f} MB ({r['dict_bytes_per_row']:.0f} B/row)   "
+              f"Transaction {r['transaction_bytes'] / 2**20:7.1f} MB ({r['transaction_bytes_per_row']:.0f} B/row)   "
+              f"saved {r['saved']:.0%}")
+
+    if args.json_file:
+        with open(args.json_file, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Benchmark the web routes and CLI operations on synthetic data.
+
+Copies the application into a temporary directory, fills its data directory
+with synthetic.py, then times each route through the Flask test client and
+the CLI's statistics and visualization in a fresh process. Every timing is
+reported for the first (cold) call and as the median of the repeats.
+
+    python bench_routes.py --users 10 --transactions 10000
+    python bench_routes.py --backend sqlite --transactions 1000000 --json results.json
+
+Results are written as JSON so runs can be compared across releases.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+import subprocess
+import contextlib
+
+from bench_startup import copy_app
+
+ROUTES = [
+    ("dashboard", "GET", "/dashboard", None),
+    ("analytics", "GET", "/analytics", None),
+    ("all_transactions", "GET", "/all_transactions", None),
+    ("all_transactions_filtered", "GET", "/all_transactions?category=Food&min_amount=100", None),
+    ("export_json", "GET", "/export_data", None),
+    ("export_csv_gzip", "GET", "/export_data?format=csv&gzip=1", None),
+    ("add_transaction", "POST", "/add_transaction", {
+        "amount": "42.50", "description": "Benchmark", "upi_app": "PhonePe", "category": "Food"
+    })
+]
+
+
+def summarize_timings(samples):
+    return {
+        "first_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+        "runs": len(samples)
+    }
+
+
+def time_call(call, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, result
+
+
+def bench_web(username, password, repeat):
+    import app
+
+    client = app.app.test_client()
+    client.post('/login', data={'username': username, 'password': password})
+
+    results = {}
+    for name, method, url, form in ROUTES:
+        def call():
+            if method == "POST":
+                response = client.post(url, data=form)
+            else:
+                response = client.get(url)
+            # Streamed responses are only produced when read
+            size = len(response.get_data())
+            return response.status_code, size
+        samples, (status, size) = time_call(call, repeat)
+        results[name] = dict(summarize_timings(samples), status=status, bytes=size)
+    return results
+
+
+def check_group_commit(usernames, threads=8, inserts=10):
+    # Concurrent /add_transaction POSTs, spread over `usernames`, go through
+    # the group committer in batches. Neither a batch nor anything else the
+    # route does afterwards (e.g. the alert check) may re-read the user's
+    # history, so load() calls are counted while they run.
+    import threading
+    import app
+
+    store = app.user_storage
+    # Log compaction reloads on purpose; keep it out of the count
+    store.compact_bytes = float("inf")
+    loads = []
+    failed = []
+    load = store.load
+
+    def counted_load(name):
+        loads.append(name)
+        return load(name)
+
+    def insert(username):
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['username'] = username
+        for _ in range(inserts):
+            response = client.post('/add_transaction', data={
+                "amount": "10", "description": "Benchmark batch", "upi_app": "PhonePe", "category": "Food"
+            })
+            if response.status_code != 302:
+                failed.append(response.status_code)
+
+    for username in usernames:
+        if not store.exists(username):
+            # Created the way /register does
+            app.save_user_data(username, app.load_user_data(username))
+
+    store.load = counted_load
+    before = app.group_committer.stats()
+    workers = [threading.Thread(target=insert, args=(usernames[i % len(usernames)],)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = (time.perf_counter() - start) * 1000
+    del store.load
+    after = app.group_committer.stats()
+    commits = after["commits"] - before["commits"]
+    return {
+        "inserts": threads * inserts,
+        "failed": len(failed),
+        "ms_per_insert": elapsed / (threads * inserts),
+        "average_batch": (after["transactions"] - before["transactions"]) / commits if commits else 0,
+        "history_loads": len(loads)
+    }
+
+
+def bench_cli(repeat):
+    import matplotlib
+    matplotlib.use('Agg')
+    import cli_tracker
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        samples, tracker = time_call(cli_tracker.UPITracker, 1)
+        results["load"] = summarize_timings(samples)
+        for name in ("view_transactions", "view_statistics", "visualize_spending"):
+            samples, _ = time_call(getattr(tracker, name), repeat)
+            results[name] = summarize_timings(samples)
+    results["transactions"] = len(tracker.transactions)
+    return results
+
+
+def run_worker(args):
+    # Runs inside the copied application directory
+    results = {
+        "web": bench_web(args.username, "password", args.repeat),
+        # Synthetic users have their closed months archived, which takes
+        # some reads off the document; a new user has no archive
+        "group_commit": check_group_commit([args.username, "bench_new_user"]),
+        "cli": bench_cli(args.repeat)
+    }
+    with open(args.worker_output, "w") as f:
+        json.dump(results, f)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark routes and CLI operations on synthetic data")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=10000, help="Transactions per web user")
+    parser.add_argument("--cli-transactions", type=int, help="CLI transactions (default --transactions)")
+    parser.add_argument("--backend", default=os.environ.get("UPI_STORAGE", "json"), choices=["json", "log", "sqlite"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", default=datetime.date.today().isoformat(),
+                        help="Last day of the synthetic history, YYYY-MM-DD")
+    parser.add_argument("--repeat", type=int, default=5, help="Calls per route")
+    parser.add_argument("--json", dest="json_file", help="Write the results to this file")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    parser.add_argument("--username", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        run_worker(args)
+        return
+
+    import synthetic
+
+    cli_transactions = args.transactions if args.cli_transactions is None else args.cli_transactions
+    end = datetime.datetime.strptime(args.end, "%Y-%m-%d")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = os.path.join(tmp, "app")
+        copy_app(work_dir)
+
+        start = time.perf_counter()
+        usernames = synthetic.populate(
+            os.path.join(work_dir, "data"), args.users, args.transactions, args.seed, end,
+            mode=args.backend, cli_transactions=cli_transactions
+        )
+        generate_seconds = time.perf_counter() - start
+
+        worker_output = os.path.join(tmp, "results.json")
+        env = dict(os.environ, UPI_STORAGE=args.backend, MPLBACKEND="Agg")
+        subprocess.run(
+            [sys.executable, os.path.basename(__file__), "--worker-output", worker_output,
+             "--username", usernames[0], "--repeat", str(args.repeat)],
+            cwd=work_dir, env=env, check=True
+        )
+        with open(worker_output) as f:
+            timings = json.load(f)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "users": args.users,
+            "transactions_per_user": args.transactions,
+            "cli_transactions": cli_transactions,
+            "seed": args.seed,
+            "end": args.end,
+            "repeat": args.repeat,
+            "generate_seconds": generate_seconds
+        },
+        **timings
+    }
+
+    print(f"{args.backend}: {args.users} users x {args.transactions} transactions "
+          f"(generated in {generate_seconds:.1f}s)")
+    for section in ("web", "cli"):
+        for name, timing in timings[section].items():
+            if isinstance(timing, dict):
+                status = f"  [{timing['status']}]" if "status" in timing else ""
+                print(f"  {section:<4} {name:<26} first {timing['first_ms']:9.1f} ms   "
+                      f"median {timing['median_ms']:9.1f} ms{status}")
+
+    batches = timings["group_commit"]
+    print(f"  group commit: {batches['inserts']} concurrent inserts, {batches['ms_per_insert']:.1f} ms each, "
+          f"average batch {batches['average_batch']:.1f}, {batches['history_loads']} history loads")
+
+    if args.json_file:
+        with open(args.json_file, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if batches["failed"]:
+        sys.exit(f"{batches['failed']} concurrent inserts failed")
+    if batches["history_loads"]:
+        sys.exit("Batched inserts re-read the user's history")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Startup benchmark for the web app and the CLI.
+
+Copies the application into a temporary directory, then starts fresh Python
+processes that time the import of app.py / cli_tracker.py and the first
+requests a user makes. Run it from this directory:
+
+    python bench_startup.py
+    python bench_startup.py --runs 10 --json startup.json
+    python bench_startup.py --max-import-ms 500
+
+With --max-import-ms the script exits with status 1 when the median import
+time of either entry point is over the limit, or when a code path that never
+plots loads pandas or matplotlib.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ["pandas", "matplotlib", "seaborn", "tabulate"]
+
+# Each snippet prints one JSON object of timings in milliseconds
+WEB_SNIPPET = """
+import sys, json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/login')
+login = time.perf_counter()
+client.post('/login', data={'username': 'bench', 'password': 'bench'})
+heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+t = time.perf_counter()
+client.get('/dashboard')
+dashboard = time.perf_counter()
+client.get('/analytics')
+analytics = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (login - imported) * 1000,
+    "first_dashboard_ms": (dashboard - t) * 1000,
+    "first_analytics_ms": (analytics - dashboard) * 1000,
+    "heavy_before_charts": heavy
+}))
+"""
+
+CLI_SNIPPET = """
+import sys, io, json, time, contextlib
+start = time.perf_counter()
+import cli_tracker
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    tracker = cli_tracker.UPITracker()
+    tracker.view_transactions()
+viewed = time.perf_counter()
+heavy = [m for m in HEAVY_MODULES if m in sys.modules and m != "tabulate"]
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "view_transactions_ms": (viewed - imported) * 1000,
+    "heavy_before_charts": heavy
+}))
+"""
+
+SEED_SNIPPET = """
+import datetime
+from werkzeug.security import generate_password_hash
+import storage
+from transaction import from_dicts
+
+now = datetime.datetime.now()
+transactions = [
+    {
+        "id": i + 1,
+        "date": (now - datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "amount": float(10 + i % 90),
+        "description": f"Transaction {i}",
+        "upi_app": ["Google Pay", "PhonePe", "Paytm"][i % 3],
+        "category": ["Food", "Shopping", "Transportation"][i % 3]
+    }
+    for i in range(200)
+]
+
+web = storage.get_storage("data")
+web.save("bench", {"profile": dict(storage.default_profile(), name="Bench"), "transactions": from_dicts(transactions)})
+with open("data/users.json", "w") as f:
+    json.dump({"bench": {"password_hash": generate_password_hash("bench"), "created_at": now.isoformat()}}, f)
+
+cli = storage.get_storage("data", cli_layout=True)
+cli_transactions = from_dicts(transactions)
+cli.save(storage.CLI_USERNAME, {"profile": dict(storage.default_profile(), name="Bench"), "transactions": cli_transactions})
+"""
+
+
+def copy_app(target):
+    ignore = shutil.ignore_patterns("__pycache__", "data", "static", "*.pyc")
+    shutil.copytree(APP_DIR, target, ignore=ignore)
+
+
+def run_snippet(snippet, cwd):
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + snippet
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=cwd,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_process(snippet, cwd, runs):
+    samples = []
+    for _ in range(runs):
+        # Start every run with an empty chart cache
+        shutil.rmtree(os.path.join(cwd, "static"), ignore_errors=True)
+        samples.append(run_snippet(snippet, cwd))
+
+    results = {}
+    for key in samples[0]:
+        if key == "heavy_before_charts":
+            results[key] = sorted({m for s in samples for m in s[key]})
+        else:
+            values = [s[key] for s in samples]
+            results[key] = {
+                "median": statistics.median(values),
+                "min": min(values),
+                "max": max(values)
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure web app and CLI startup time")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per entry point")
+    parser.add_argument("--json", dest="json_file", help="Also write the results to this file")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if a median import time is over this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = os.path.join(tmp, "app")
+        copy_app(work_dir)
+        os.makedirs(os.path.join(work_dir, "data"))
+        subprocess.run([sys.executable, "-c", "import json\n" + SEED_SNIPPET], cwd=work_dir, check=True)
+
+        results = {
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "web": run_process(WEB_SNIPPET, work_dir, args.runs),
+            "cli": run_process(CLI_SNIPPET, work_dir, args.runs)
+        }
+
+    for name in ("web", "cli"):
+        print(f"{name}:")
+        for key, value in results[name].items():
+            if key == "heavy_before_charts":
+                print(f"  {key:<22} {', '.join(value) or '-'}")
+            else:
+                print(f"  {key:<22} {value['median']:8.1f} ms  (min {value['min']:.1f}, max {value['max']:.1f})")
+
+    if args.json_file:
+        with open(args.json_file, "w") as f:
+            json.dump(results, f, indent=4)
+
+    failed = False
+    for name in ("web", "cli"):
+        if results[name]["heavy_before_charts"]:
+            print(f"FAIL: {name} loaded {', '.join(results[name]['heavy_before_charts'])} before plotting")
+            failed = True
+        if args.max_import_ms is not None and results[name]["import_ms"]["median"] > args.max_import_ms:
+            print(f"FAIL: {name} import took {results[name]['import_ms']['median']:.1f} ms")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
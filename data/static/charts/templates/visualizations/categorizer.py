@@ -0,0 +1,245 @@
+import os
+import json
+import threading
+from collections import Counter
+
+# Optional JSON file of {"Category": ["keyword", ...]} rules used instead of
+# DEFAULT_RULES, e.g. to add local merchants
+RULES_FILE = os.environ.get("UPI_CATEGORY_RULES", "")
+
+# Descriptions remembered per categorizer; statements repeat the same
+# merchants over and over, so most lookups are cache hits
+MEMO_SIZE = 100000
+
+DEFAULT_RULES = {
+    "Food": [
+        "swiggy", "zomato", "canteen", "mess", "restaurant", "cafe", "café", "coffee", "tea", "chai",
+        "pizza", "burger", "dominos", "domino's", "mcdonald", "kfc", "subway", "starbucks", "bakery",
+        "snacks", "lunch", "dinner", "breakfast", "food", "grocery", "groceries", "bigbasket",
+        "blinkit", "zepto", "dunzo", "juice", "dhaba", "biryani", "sweets"
+    ],
+    "Transportation": [
+        "uber", "ola", "rapido", "metro", "bus", "auto", "rickshaw", "cab", "taxi", "petrol",
+        "diesel", "fuel", "irctc", "railway", "train", "flight", "indigo", "redbus", "fastag",
+        "parking", "toll", "bike rental", "yulu"
+    ],
+    "Shopping": [
+        "amazon", "flipkart", "myntra", "ajio", "meesho", "nykaa", "clothes", "shoes", "mall",
+        "store", "shopping", "stationery", "decathlon", "croma", "reliance digital", "headphones"
+    ],
+    "Entertainment": [
+        "movie", "movies", "cinema", "pvr", "inox", "bookmyshow", "netflix", "spotify", "hotstar",
+        "prime video", "youtube premium", "concert", "gaming", "game", "steam", "playstation"
+    ],
+    "Education": [
+        "tuition", "course", "textbook", "book", "books", "exam", "fee", "fees", "college",
+        "university", "coaching", "udemy", "coursera", "byju", "unacademy", "printing", "xerox",
+        "library", "project supplies"
+    ],
+    "Utilities": [
+        "recharge", "electricity", "water bill", "gas", "wifi", "broadband", "internet", "jio",
+        "airtel", "vodafone", "vi prepaid", "bsnl", "dth", "tata play", "rent", "laundry", "bill"
+    ],
+    "Health": [
+        "pharmacy", "medical", "medicine", "medicines", "chemist", "apollo", "pharmeasy", "1mg",
+        "netmeds", "doctor", "clinic", "hospital", "lab test", "gym", "fitness", "cult.fit"
+    ]
+}
+
+
+def _is_word_char(char):
+    return char.isalnum()
+
+
+class Categorizer:
+    """Labels transaction descriptions using keyword rules.
+
+    All keywords are compiled into a single Aho-Corasick automaton, so a
+    description is scanned once no matter how many rules there are.
+    Keywords only match whole words. When several rules match, the longest
+    keyword wins, then the earliest rule.
+    """
+
+    def __init__(self, rules=None, default=None):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.default = default
+        self._build()
+        self.memo = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.matched = 0
+        self.memo_hits = 0
+        self.by_category = Counter()
+
+    def _build(self):
+        # Trie of keyword characters; goto[node][char] -> node
+        self.goto = [{}]
+        self.fail = [0]
+        # Per node: (keyword length, rule order, category) of the best
+        # keyword ending here, following fail links
+        self.output = [None]
+
+        order = 0
+        for category, keywords in self.rules.items():
+            for keyword in keywords:
+                keyword = keyword.strip().lower()
+                if not keyword:
+                    continue
+                node = 0
+                for char in keyword:
+                    nxt = self.goto[node].get(char)
+                    if nxt is None:
+                        nxt = len(self.goto)
+                        self.goto[node][char] = nxt
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.output.append(None)
+                    node = nxt
+                if self.output[node] is None:
+                    self.output[node] = (len(keyword), order, category)
+                order += 1
+
+        # Breadth-first pass filling in fail links
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+        self.suffix_outputs = self._suffix_outputs(queue)
+
+    def _suffix_outputs(self, order):
+        # Every keyword ending at a node, including those reached through
+        # fail links, as a tuple of (length, rule order, category)
+        outputs = [()] * len(self.goto)
+        for node in order:
+            own = (self.output[node],) if self.output[node] is not None else ()
+            outputs[node] = own + outputs[self.fail[node]]
+        return outputs
+
+    def _scan(self, text):
+        goto = self.goto
+        fail = self.fail
+        outputs = self.suffix_outputs
+        best = None
+        node = 0
+        length = len(text)
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not outputs[node]:
+                continue
+            after_ok = i + 1 == length or not _is_word_char(text[i + 1])
+            if not after_ok:
+                continue
+            for match in outputs[node]:
+                start = i + 1 - match[0]
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if best is None or (match[0], -match[1]) > (best[0], -best[1]):
+                    best = match
+        return best[2] if best is not None else None
+
+    def categorize(self, description):
+        # One description; returns the category, or `default` if nothing matches
+        text = (description or "").lower()
+        category = self.memo.get(text)
+        hit = category is not None or text in self.memo
+        if not hit:
+            category = self._scan(text)
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            self.memo[text] = category
+
+        with self.lock:
+            self.calls += 1
+            self.memo_hits += hit
+            if category is not None:
+                self.matched += 1
+                self.by_category[category] += 1
+        return category if category is not None else self.default
+
+    def categorize_many(self, descriptions):
+        # Batch version of categorize(); statistics are updated once per batch
+        memo = self.memo
+        scan = self._scan
+        results = []
+        counts = Counter()
+        hits = 0
+        for description in descriptions:
+            text = (description or "").lower()
+            if text in memo:
+                category = memo[text]
+                hits += 1
+            else:
+                category = scan(text)
+                if len(memo) >= MEMO_SIZE:
+                    memo.clear()
+                memo[text] = category
+            counts[category] += 1
+            results.append(category if category is not None else self.default)
+
+        with self.lock:
+            self.calls += len(results)
+            self.memo_hits += hits
+            self.matched += len(results) - counts.pop(None, 0)
+            self.by_category.update(counts)
+        return results
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "matched": self.matched,
+                "unmatched": self.calls - self.matched,
+                "match_rate": self.matched / self.calls if self.calls else 0,
+                "memo_hits": self.memo_hits,
+                "by_category": dict(self.by_category),
+                "rules": sum(len(keywords) for keywords in self.rules.values())
+            }
+
+
+def load_rules(path=None):
+    path = path or RULES_FILE
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return DEFAULT_RULES
+
+
+_default_categorizer = None
+
+
+def get_categorizer():
+    # Shared categorizer built from the configured rules on first use
+    global _default_categorizer
+    if _default_categorizer is None:
+        _default_categorizer = Categorizer(load_rules(), default="Other")
+    return _default_categorizer
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    categorizer = get_categorizer()
+    if len(sys.argv) > 1:
+        for description in sys.argv[1:]:
+            print(f"{description}: {categorizer.categorize(description)}")
+    else:
+        # Throughput check on a synthetic batch of mixed descriptions
+        import synthetic
+        descriptions = [t.description for t in synthetic.generate_transactions(200000)]
+        descriptions = [f"{d} #{i % 5000}" for i, d in enumerate(descriptions)]
+        start = time.perf_counter()
+        categorizer.categorize_many(descriptions)
+        elapsed = time.perf_counter() - start
+        print(f"{len(descriptions) / elapsed * 60:,.0f} descriptions/minute")
+        print(json.dumps(categorizer.stats(), indent=4))
@@ -0,0 +1,103 @@
+import os
+import time
+import hashlib
+
+# Chart cache configuration
+CHART_CACHE_MAX_BYTES = int(os.environ.get("UPI_CHART_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+CHART_CACHE_MAX_AGE = int(os.environ.get("UPI_CHART_CACHE_MAX_AGE", 7 * 24 * 60 * 60))
+
+# Bump when the chart rendering code changes so old images are not reused
+CHART_VERSION = "2"
+
+# Charts are drawn from the user's rollups; only the one a chart plots goes into its key
+CHART_BUCKETS = {
+    "category": "by_category",
+    "app": "by_upi_app",
+    "time": "by_day"
+}
+
+KEY_LENGTH = 16
+
+
+def chart_key(summary, kind):
+    # Hashes the plotted totals rather than the transactions, so the cost
+    # depends on the number of days or categories, not the number of rows
+    digest = hashlib.sha1(f"{CHART_VERSION}:{kind}".encode())
+    for key, amount in sorted(summary[CHART_BUCKETS[kind]].items()):
+        digest.update(f"{key}={amount:.2f};".encode())
+    return digest.hexdigest()[:KEY_LENGTH]
+
+
+def chart_filename(username, kind, key):
+    return f"{username}_{kind}_{key}.png"
+
+
+def lookup(charts_dir, filename):
+    path = os.path.join(charts_dir, filename)
+    if not os.path.exists(path):
+        return False
+    # Touch the file so age-based eviction keeps charts that are still viewed
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return True
+
+
+def store_path(charts_dir, filename):
+    # Render into a temp file first so other workers never serve a half-written image
+    return os.path.join(charts_dir, f".{filename}.{os.getpid()}.tmp")
+
+
+def commit(charts_dir, filename, temp_path):
+    os.replace(temp_path, os.path.join(charts_dir, filename))
+
+
+def _is_entry_for(filename, username, kind):
+    prefix = f"{username}_{kind}_"
+    if not filename.startswith(prefix) or not filename.endswith(".png"):
+        return False
+    key = filename[len(prefix):-len(".png")]
+    return len(key) == KEY_LENGTH and all(c in "0123456789abcdef" for c in key)
+
+
+def evict_superseded(charts_dir, username, kind, current):
+    # A user only ever needs the latest image of each chart kind
+    for filename in os.listdir(charts_dir):
+        if filename != current and _is_entry_for(filename, username, kind):
+            try:
+                os.remove(os.path.join(charts_dir, filename))
+            except OSError:
+                pass
+
+
+def evict(charts_dir, max_bytes=None, max_age=None):
+    max_bytes = CHART_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = CHART_CACHE_MAX_AGE if max_age is None else max_age
+    now = time.time()
+
+    entries = []
+    for filename in os.listdir(charts_dir):
+        if not filename.endswith(".png"):
+            continue
+        path = os.path.join(charts_dir, filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    # Oldest first, drop anything past max age, then trim down to max size
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
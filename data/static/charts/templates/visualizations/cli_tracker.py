@@ -1,11 +1,15 @@
 import os
+import sys
+import argparse
 import datetime
-import json
-import csv
-import matplotlib.pyplot as plt
-from tabulate import tabulate
-import pandas as pd
 from colorama import Fore, Style, init
+import storage
+import alerts
+import export
+import categorizer
+import timestamps
+from storage import CLI_USERNAME
+from transaction import Transaction, from_dicts
 
 # Initialize colorama for colored terminal output
 init(autoreset=True)
@@ -13,8 +17,6 @@ init(autoreset=True)
 class UPITracker:
     def __init__(self):
         self.data_dir = "data"
-        self.transactions_file = os.path.join(self.data_dir, "transactions.json")
-        self.user_file = os.path.join(self.data_dir, "user_info.json")
         self.categories = [
             "Food", "Transportation", "Shopping", "Entertainment", 
             "Education", "Utilities", "Health", "Other"
@@ -28,35 +30,40 @@ class UPITracker:
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
             
-        # Initialize or load user data
-        if os.path.exists(self.user_file):
-            with open(self.user_file, 'r') as f:
-                self.user_info = json.load(f)
-        else:
-            self.user_info = {
-                "name": "",
-                "account_balance": 0,
-                "monthly_budget": 0,
-                "parent_email": "",
-                "share_with_parents": False
-            }
-            self.save_user_info()
-            
-        # Initialize or load transaction data
-        if os.path.exists(self.transactions_file):
-            with open(self.transactions_file, 'r') as f:
-                self.transactions = json.load(f)
-        else:
-            self.transactions = []
+        # Profile and transactions go through the configured storage backend
+        self.storage = storage.get_storage(self.data_dir, cli_layout=True)
+        first_run = not self.storage.exists(CLI_USERNAME)
+        
+        data = self.storage.load(CLI_USERNAME)
+        self.user_info = data["profile"]
+        self.transactions = data["transactions"]
+        # Array-backed copy of the transactions for charts, built on first use
+        self.columns = None
+        
+        if first_run:
             self.save_transactions()
 
+    def get_columns(self):
+        import columnar
+        if self.columns is not None and self.columns.follows(self.transactions):
+            self.columns.extend(self.transactions[self.columns.count:])
+        else:
+            self.columns = columnar.TransactionColumns.from_transactions(
+                self.transactions, self.categories, self.upi_apps
+            )
+        return self.columns
+
+    def get_document(self):
+        return {
+            "profile": self.user_info,
+            "transactions": self.transactions
+        }
+
     def save_transactions(self):
-        with open(self.transactions_file, 'w') as f:
-            json.dump(self.transactions, f, indent=4)
+        self.storage.save(CLI_USERNAME, self.get_document())
 
     def save_user_info(self):
-        with open(self.user_file, 'w') as f:
-            json.dump(self.user_info, f, indent=4)
+        self.storage.update_profile(CLI_USERNAME, self.get_document())
 
     def setup_user(self):
         print(Fore.CYAN + "\n===== User Setup =====" + Style.RESET_ALL)
@@ -107,44 +114,91 @@ class UPITracker:
             print(Fore.RED + "Invalid input. Please enter a number." + Style.RESET_ALL)
             return
             
-        # Select category
+        # Select category, suggesting one from the description
+        suggested = categorizer.get_categorizer().categorize(description)
+        if suggested not in self.categories:
+            suggested = "Other"
         print("\nSelect category:")
+        print(f"0. Auto-detect ({suggested})")
         for i, category in enumerate(self.categories):
             print(f"{i+1}. {category}")
             
         try:
-            category_choice = int(input("Enter your choice (number): "))
-            if not 1 <= category_choice <= len(self.categories):
+            category_choice = int(input("Enter your choice (number): ") or 0)
+            if not 0 <= category_choice <= len(self.categories):
                 print(Fore.RED + "Invalid choice." + Style.RESET_ALL)
                 return
-            category = self.categories[category_choice-1]
+            category = self.categories[category_choice-1] if category_choice else suggested
         except ValueError:
             print(Fore.RED + "Invalid input. Please enter a number." + Style.RESET_ALL)
             return
             
         # Create transaction record
-        transaction = {
-            "id": len(self.transactions) + 1,
-            "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "amount": amount,
-            "description": description,
-            "upi_app": upi_app,
-            "category": category
-        }
+        ts, tz = timestamps.now()
+        transaction = Transaction(
+            id=len(self.transactions) + 1,
+            ts=ts,
+            tz=tz,
+            amount=amount,
+            description=description,
+            upi_app=upi_app,
+            category=category
+        )
         
         # Update account balance
         self.user_info["account_balance"] -= amount
         
-        # Save transaction and user info
+        # Save transaction together with the new balance
         self.transactions.append(transaction)
-        self.save_transactions()
-        self.save_user_info()
+        self.storage.add_transaction(CLI_USERNAME, self.get_document(), transaction)
         
         print(Fore.GREEN + "Transaction added successfully!" + Style.RESET_ALL)
         
-        # Check if balance is low
-        if self.user_info["account_balance"] < 0.2 * self.user_info["monthly_budget"]:
-            print(Fore.RED + f"\nWARNING: Your balance (₹{self.user_info['account_balance']:.2f}) is less than 20% of your monthly budget!" + Style.RESET_ALL)
+        # Check the budget and low-balance rules; each alert is shown once a month
+        new_alerts = alerts.check_user(
+            self.storage, alerts.AlertQueue(self.storage), CLI_USERNAME, self.get_document()
+        )
+        for alert in new_alerts:
+            print(Fore.RED + f"\nWARNING: {alert['message']}" + Style.RESET_ALL)
+
+    def import_statement(self, path, default_app="Other", dayfirst=True):
+        if default_app not in self.upi_apps:
+            print(Fore.RED + f"Unknown UPI app: {default_app}" + Style.RESET_ALL)
+            return
+            
+        # CLI transaction ids are sequential integers
+        next_id = max((t["id"] for t in self.transactions if isinstance(t["id"], int)), default=0) + 1
+        
+        def sequential_ids(count):
+            nonlocal next_id
+            ids = list(range(next_id, next_id + count))
+            next_id += count
+            return ids
+            
+        try:
+            # pandas is only loaded by the menu options that need it
+            import importer
+            stats = importer.import_statement(
+                self.storage, CLI_USERNAME, path, self.categories,
+                id_factory=sequential_ids,
+                default_app=default_app,
+                dayfirst=dayfirst,
+                categorizer=categorizer.get_categorizer()
+            )
+        except (ValueError, OSError) as e:
+            print(Fore.RED + f"Could not import statement: {e}" + Style.RESET_ALL)
+            return
+            
+        # Pick up the imported rows and the new balance
+        data = self.storage.load(CLI_USERNAME)
+        self.user_info = data["profile"]
+        self.transactions = data["transactions"]
+        
+        print(Fore.GREEN + f"Imported {stats['imported']} transactions (₹{stats['amount']:.2f}), "
+              f"skipped {stats['skipped']} rows." + Style.RESET_ALL)
+        unreadable = importer.unreadable_dates_message(stats)
+        if unreadable:
+            print(Fore.YELLOW + unreadable + Style.RESET_ALL)
 
     def view_transactions(self, limit=10):
         if not self.transactions:
@@ -153,22 +207,76 @@ class UPITracker:
             
         print(Fore.CYAN + f"\n===== Recent Transactions (Last {min(limit, len(self.transactions))}) =====" + Style.RESET_ALL)
         
-        transactions = sorted(self.transactions, key=lambda x: x["date"], reverse=True)[:limit]
+        transactions, _ = self.storage.page_transactions(CLI_USERNAME, limit=limit, data=self.get_document())
         
         table_data = []
         for t in transactions:
             table_data.append([
                 t["id"],
-                t["date"],
+                timestamps.to_iso(t["ts"], t["tz"], offset=False, sep=" "),
                 f"₹{t['amount']:.2f}",
                 t["description"],
                 t["upi_app"],
                 t["category"]
             ])
             
+        from tabulate import tabulate
         headers = ["ID", "Date", "Amount", "Description", "UPI App", "Category"]
         print(tabulate(table_data, headers=headers, tablefmt="grid"))
 
+    def search_transactions(self, limit=20):
+        if not self.transactions:
+            print(Fore.YELLOW + "No transactions found." + Style.RESET_ALL)
+            return
+            
+        print(Fore.CYAN + "\n===== Search Transactions =====" + Style.RESET_ALL)
+        query = input("Search descriptions (e.g. 'uber' or 'zom ord'): ").strip()
+        if not query:
+            return
+            
+        filters = {}
+        print("\nCategory (leave empty for all):")
+        for i, category in enumerate(self.categories):
+            print(f"{i+1}. {category}")
+        category_choice = input("Enter your choice (number): ").strip()
+        if category_choice:
+            try:
+                filters["category"] = self.categories[int(category_choice) - 1]
+            except (ValueError, IndexError):
+                print(Fore.RED + "Invalid choice." + Style.RESET_ALL)
+                return
+                
+        start_date = input("Start date (YYYY-MM-DD, leave empty for all): ").strip()
+        end_date = input("End date (YYYY-MM-DD, leave empty for all): ").strip()
+        try:
+            filters.update(export.date_range_filters(start_date, end_date))
+        except ValueError:
+            print(Fore.RED + "Invalid date. Please use YYYY-MM-DD." + Style.RESET_ALL)
+            return
+            
+        result = self.storage.search(CLI_USERNAME, query, filters, limit, self.get_document())
+        if not result["count"]:
+            print(Fore.YELLOW + "No matching transactions." + Style.RESET_ALL)
+            return
+            
+        print(f"{result['count']} matching transaction(s), total {Fore.RED}₹{result['total']:.2f}{Style.RESET_ALL}")
+        table_data = []
+        for t in result["rows"]:
+            table_data.append([
+                t["id"],
+                timestamps.to_iso(t["ts"], t["tz"], offset=False, sep=" "),
+                f"₹{t['amount']:.2f}",
+                t["description"],
+                t["upi_app"],
+                t["category"]
+            ])
+            
+        from tabulate import tabulate
+        headers = ["ID", "Date", "Amount", "Description", "UPI App", "Category"]
+        print(tabulate(table_data, headers=headers, tablefmt="grid"))
+        if result["count"] > len(result["rows"]):
+            print(f"(Showing the newest {len(result['rows'])})")
+
     def view_statistics(self):
         if not self.transactions:
             print(Fore.YELLOW + "No transactions found. Add some transactions first." + Style.RESET_ALL)
@@ -176,18 +284,13 @@ class UPITracker:
             
         print(Fore.CYAN + "\n===== Spending Statistics =====" + Style.RESET_ALL)
         
-        # Convert to DataFrame for easier analysis
-        df = pd.DataFrame(self.transactions)
-        
-        # Current month transactions
-        current_month = datetime.datetime.now().strftime("%Y-%m")
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.strftime('%Y-%m')
-        monthly_df = df[df['month'] == current_month]
+        # Aggregates come from the running totals kept by the storage backend
+        summary = self.storage.spending_summary(CLI_USERNAME, self.get_document())
         
         # Total spending
-        total_spent = df['amount'].sum()
-        monthly_spent = monthly_df['amount'].sum() if not monthly_df.empty else 0
+        current_month = timestamps.this_month()
+        total_spent = summary["total"]
+        monthly_spent = summary["by_month"].get(current_month, 0)
         
         print(f"Total spending: {Fore.RED}₹{total_spent:.2f}{Style.RESET_ALL}")
         print(f"This month's spending: {Fore.RED}₹{monthly_spent:.2f}{Style.RESET_ALL}")
@@ -195,17 +298,17 @@ class UPITracker:
         
         # Category-wise spending
         print(Fore.CYAN + "\nCategory-wise Spending:" + Style.RESET_ALL)
-        category_spending = df.groupby('category')['amount'].sum().sort_values(ascending=False)
+        category_spending = sorted(summary["by_category"].items(), key=lambda x: x[1], reverse=True)
         
-        for category, amount in category_spending.items():
+        for category, amount in category_spending:
             percentage = (amount / total_spent) * 100
             print(f"{category}: ₹{amount:.2f} ({percentage:.1f}%)")
             
         # UPI app-wise spending
         print(Fore.CYAN + "\nUPI App-wise Spending:" + Style.RESET_ALL)
-        app_spending = df.groupby('upi_app')['amount'].sum().sort_values(ascending=False)
+        app_spending = sorted(summary["by_upi_app"].items(), key=lambda x: x[1], reverse=True)
         
-        for app, amount in app_spending.items():
+        for app, amount in app_spending:
             percentage = (amount / total_spent) * 100
             print(f"{app}: ₹{amount:.2f} ({percentage:.1f}%)")
             
@@ -227,30 +330,32 @@ class UPITracker:
             print(Fore.YELLOW + "No transactions found. Add some transactions first." + Style.RESET_ALL)
             return
             
-        df = pd.DataFrame(self.transactions)
-        df['date'] = pd.to_datetime(df['date'])
+        # Plotting libraries are slow to import, so only this option loads them
+        import matplotlib.pyplot as plt
+        
+        columns = self.get_columns()
         
         # Create a figure with subplots
         plt.figure(figsize=(15, 10))
         
         # Plot 1: Category-wise spending (Pie chart)
         plt.subplot(2, 2, 1)
-        category_spending = df.groupby('category')['amount'].sum()
-        plt.pie(category_spending, labels=category_spending.index, autopct='%1.1f%%', startangle=90)
+        category_spending = dict(sorted(columns.totals_by_category().items()))
+        plt.pie(list(category_spending.values()), labels=list(category_spending.keys()), autopct='%1.1f%%', startangle=90)
         plt.axis('equal')
         plt.title('Spending by Category')
         
         # Plot 2: UPI app-wise spending (Pie chart)
         plt.subplot(2, 2, 2)
-        app_spending = df.groupby('upi_app')['amount'].sum()
-        plt.pie(app_spending, labels=app_spending.index, autopct='%1.1f%%', startangle=90)
+        app_spending = dict(sorted(columns.totals_by_app().items()))
+        plt.pie(list(app_spending.values()), labels=list(app_spending.keys()), autopct='%1.1f%%', startangle=90)
         plt.axis('equal')
         plt.title('Spending by UPI App')
         
         # Plot 3: Daily spending over time (Line chart)
         plt.subplot(2, 1, 2)
-        daily_spending = df.groupby(df['date'].dt.date)['amount'].sum()
-        plt.plot(daily_spending.index, daily_spending.values, marker='o')
+        days, daily_spending = columns.daily_totals()
+        plt.plot(days, daily_spending, marker='o')
         plt.xlabel('Date')
         plt.ylabel('Amount (₹)')
         plt.title('Daily Spending')
@@ -275,33 +380,38 @@ class UPITracker:
         print(Fore.CYAN + "\n===== Export Data =====" + Style.RESET_ALL)
         print("1. Export as CSV")
         print("2. Export as JSON")
-        print("3. Back to main menu")
+        print("3. Export as NDJSON")
+        print("4. Back to main menu")
         
         try:
             choice = int(input("Enter your choice: "))
             
-            if choice == 1:
-                export_file = os.path.join(self.data_dir, "transactions_export.csv")
-                with open(export_file, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=self.transactions[0].keys())
-                    writer.writeheader()
-                    writer.writerows(self.transactions)
-                print(Fore.GREEN + f"Data exported to {export_file}" + Style.RESET_ALL)
-                
-            elif choice == 2:
-                export_file = os.path.join(self.data_dir, "transactions_export.json")
-                with open(export_file, 'w') as f:
-                    json.dump(self.transactions, f, indent=4)
-                print(Fore.GREEN + f"Data exported to {export_file}" + Style.RESET_ALL)
-                
-            elif choice == 3:
+            if choice == 4:
                 return
-                
-            else:
+            if choice not in (1, 2, 3):
                 print(Fore.RED + "Invalid choice." + Style.RESET_ALL)
-                
+                return
+            fmt = ["csv", "json", "ndjson"][choice-1]
+            
         except ValueError:
             print(Fore.RED + "Invalid input. Please enter a number." + Style.RESET_ALL)
+            return
+            
+        start_date = input("Start date (YYYY-MM-DD, leave empty for all): ").strip()
+        end_date = input("End date (YYYY-MM-DD, leave empty for all): ").strip()
+        try:
+            filters = export.date_range_filters(start_date, end_date)
+        except ValueError:
+            print(Fore.RED + "Invalid date. Please use YYYY-MM-DD." + Style.RESET_ALL)
+            return
+            
+        compress = input("Compress with gzip? (yes/no): ").lower() == "yes"
+        
+        # Same streaming writer the web export uses
+        export_file = os.path.join(self.data_dir, export.export_filename(fmt, compress))
+        rows = self.storage.iter_transactions(CLI_USERNAME, filters, self.get_document())
+        count = export.write_export(export_file, rows, fmt, compress)
+        print(Fore.GREEN + f"{count} transaction(s) exported to {export_file}" + Style.RESET_ALL)
 
     def show_saving_tips(self):
         tips = [
@@ -329,33 +439,24 @@ class UPITracker:
             return
             
         print(Fore.CYAN + "\n===== Share With Parents =====" + Style.RESET_ALL)
-        print(f"This would send an email to {self.user_info['parent_email']} with your spending details.")
-        print("(Email functionality will be implemented in the full version)")
+        print(f"This will send an email to {self.user_info['parent_email']} with this month's spending so far.")
         
-        # In a real implementation, this would create and send an email with a spending report
         confirm = input("Do you want to continue? (yes/no): ").lower()
         
         if confirm == "yes":
+            import parent_reports
+            report, path = parent_reports.queue_report(
+                self.storage, CLI_USERNAME, parent_reports.month_to_date(),
+                os.path.join(self.data_dir, "outbox"), data=self.get_document()
+            )
             print(Fore.GREEN + "Spending report has been shared with your parents." + Style.RESET_ALL)
+            print(f"(Queued in {path})")
             
-            # Simulate email content
             print("\nEmail preview:")
-            print(f"To: {self.user_info['parent_email']}")
-            print(f"Subject: {self.user_info['name']}'s Spending Report")
-            print("\nDear Parent,")
-            print(f"\nHere is the spending report for {self.user_info['name']}:")
-            print(f"Current balance: ₹{self.user_info['account_balance']:.2f}")
-            print(f"Monthly budget: ₹{self.user_info['monthly_budget']:.2f}")
-            
-            if self.transactions:
-                total_spent = sum(t["amount"] for t in self.transactions)
-                print(f"Total spent: ₹{total_spent:.2f}")
-                
-                # Get recent transactions
-                recent = sorted(self.transactions, key=lambda x: x["date"], reverse=True)[:5]
-                print("\nRecent transactions:")
-                for t in recent:
-                    print(f"- {t['date']}: ₹{t['amount']:.2f} on {t['category']} via {t['upi_app']}")
+            print(f"To: {report['parent_email']}")
+            print(f"Subject: {report['name']}'s spending report for {report['period'].label}")
+            print()
+            print(parent_reports.render_body(report))
 
     def run(self):
         # Check if user needs to set up
@@ -369,12 +470,13 @@ class UPITracker:
             
             print("\n1. Add transaction")
             print("2. View recent transactions")
-            print("3. View spending statistics")
-            print("4. Visualize spending")
-            print("5. Export data")
-            print("6. Share with parent")
-            print("7. Update profile")
-            print("8. Exit")
+            print("3. Search transactions")
+            print("4. View spending statistics")
+            print("5. Visualize spending")
+            print("6. Export data")
+            print("7. Share with parent")
+            print("8. Update profile")
+            print("9. Exit")
             
             try:
                 choice = int(input("\nEnter your choice: "))
@@ -384,16 +486,18 @@ class UPITracker:
                 elif choice == 2:
                     self.view_transactions()
                 elif choice == 3:
-                    self.view_statistics()
+                    self.search_transactions()
                 elif choice == 4:
-                    self.visualize_spending()
+                    self.view_statistics()
                 elif choice == 5:
-                    self.export_data()
+                    self.visualize_spending()
                 elif choice == 6:
-                    self.share_with_parent()
+                    self.export_data()
                 elif choice == 7:
-                    self.setup_user()
+                    self.share_with_parent()
                 elif choice == 8:
+                    self.setup_user()
+                elif choice == 9:
                     print(Fore.GREEN + "Thank you for using UPI Tracker. Goodbye!" + Style.RESET_ALL)
                     break
                 else:
@@ -450,7 +554,7 @@ def add_sample_data(tracker):
     
     # Check if transactions already exist
     if not tracker.transactions:
-        tracker.transactions = sample_transactions
+        tracker.transactions = from_dicts(sample_transactions)
         tracker.save_transactions()
         print(Fore.GREEN + "Sample data added successfully!" + Style.RESET_ALL)
     else:
@@ -458,6 +562,18 @@ def add_sample_data(tracker):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UPI Expense Tracker")
+    subparsers = parser.add_subparsers(dest="command")
+    import_parser = subparsers.add_parser("import", help="Import a CSV or Excel statement")
+    import_parser.add_argument("statement", help="Path to the statement file")
+    import_parser.add_argument("--app", default="Other", help="UPI app for rows that don't name one")
+    import_parser.add_argument("--monthfirst", action="store_true", help="Dates are MM/DD/YYYY rather than DD/MM/YYYY")
+    args = parser.parse_args()
+    
+    if args.command == "import":
+        UPITracker().import_statement(args.statement, args.app, dayfirst=not args.monthfirst)
+        sys.exit(0)
+    
     print(Fore.CYAN + """
     ╔════════════════════════════════════════╗
     ║          UPI EXPENSE TRACKER           ║
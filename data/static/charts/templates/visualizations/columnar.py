@@ -0,0 +1,107 @@
+import datetime
+
+import numpy as np
+
+from user_cache import HistoryIndex
+
+SECONDS_PER_DAY = 86400
+
+
+class TransactionColumns(HistoryIndex):
+    """A user's transaction history as NumPy arrays.
+
+    Timestamps are local seconds (ts + tz * 60, see timestamps.py), amounts
+    are floats, and category and UPI app are small integer codes into
+    `categories` / `upi_apps`. Labels that aren't in the configured lists
+    are added on first sight; the codes are uint8 until there are more
+    labels than that holds, then widened. The arrays grow
+    by doubling, so appending keeps the history current without rebuilding.
+    """
+
+    def __init__(self, categories, upi_apps, capacity=64):
+        self.categories = list(categories)
+        self.upi_apps = list(upi_apps)
+        self.category_codes = {label: code for code, label in enumerate(self.categories)}
+        self.app_codes = {label: code for code, label in enumerate(self.upi_apps)}
+        self.count = 0
+        self.last_id = None
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.amounts = np.empty(capacity, dtype=np.float64)
+        self.category = np.empty(capacity, dtype=np.uint8)
+        self.upi_app = np.empty(capacity, dtype=np.uint8)
+
+    @classmethod
+    def from_transactions(cls, transactions, categories, upi_apps):
+        columns = cls(categories, upi_apps, capacity=max(64, len(transactions)))
+        columns.extend(transactions)
+        return columns
+
+    def _code(self, codes, labels, label):
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(labels)
+            labels.append(label)
+        return code
+
+    def _reserve(self, size):
+        if size <= len(self.amounts):
+            return
+        capacity = max(size, 2 * len(self.amounts))
+        for name in ("timestamps", "amounts", "category", "upi_app"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def _widen(self, name, labels):
+        # Assigning a code the dtype can't hold raises on NumPy 2 and wraps
+        # around (matching the wrong rows) on NumPy 1
+        codes = getattr(self, name)
+        if len(labels) - 1 > np.iinfo(codes.dtype).max:
+            setattr(self, name, codes.astype(np.min_scalar_type(len(labels) - 1)))
+
+    def extend(self, transactions):
+        if not transactions:
+            return
+        start = self.count
+        end = start + len(transactions)
+        self._reserve(end)
+
+        self.timestamps[start:end] = [t["ts"] + t["tz"] * 60 for t in transactions]
+        self.amounts[start:end] = [t["amount"] for t in transactions]
+        category = [self._code(self.category_codes, self.categories, t["category"]) for t in transactions]
+        upi_app = [self._code(self.app_codes, self.upi_apps, t["upi_app"]) for t in transactions]
+        self._widen("category", self.categories)
+        self._widen("upi_app", self.upi_apps)
+        self.category[start:end] = category
+        self.upi_app[start:end] = upi_app
+        self.count = end
+        self.last_id = transactions[-1]["id"]
+
+    def append(self, transaction):
+        self.extend([transaction])
+
+    def _totals(self, codes, labels):
+        sums = np.bincount(codes[:self.count], weights=self.amounts[:self.count], minlength=len(labels))
+        counts = np.bincount(codes[:self.count], minlength=len(labels))
+        return {labels[i]: float(sums[i]) for i in np.flatnonzero(counts)}
+
+    def totals_by_category(self):
+        return self._totals(self.category, self.categories)
+
+    def totals_by_app(self):
+        return self._totals(self.upi_app, self.upi_apps)
+
+    def daily_totals(self):
+        # Returns (dates, amounts) in date order
+        days, index = np.unique(self.timestamps[:self.count] // SECONDS_PER_DAY, return_inverse=True)
+        sums = np.bincount(index, weights=self.amounts[:self.count], minlength=len(days))
+        epoch = datetime.date(1970, 1, 1)
+        dates = [epoch + datetime.timedelta(days=int(day)) for day in days]
+        return dates, sums
+
+    def total(self):
+        return float(self.amounts[:self.count].sum())
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ("timestamps", "amounts", "category", "upi_app"))
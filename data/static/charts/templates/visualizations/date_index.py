@@ -0,0 +1,95 @@
+import os
+import bisect
+import threading
+
+import timestamps
+from user_cache import HistoryIndex
+
+# Users whose date index is kept in memory per storage instance (LRU)
+DATE_INDEX_SIZE = int(os.environ.get("UPI_DATE_INDEX_SIZE", 64))
+
+
+def sort_key(transaction):
+    # Local time, the clock days and months are read from (see
+    # timestamps.day_key), then the id as text. Every newest-first list and
+    # search uses this order, on every backend.
+    return (timestamps.local_seconds(transaction["ts"], transaction["tz"]), str(transaction.get("id")))
+
+
+class DateIndex(HistoryIndex):
+    """A user's transactions in sort_key() order, the order pages are shown in.
+
+    Built once from the history (a near-linear sort, since transactions are
+    mostly appended in time order) and kept current as transactions are
+    added: an insert is a binary search plus, for a backdated row, a list
+    insert. newest() and between() find their start with a binary search
+    and then only touch the rows they return.
+    """
+
+    def __init__(self):
+        self.times = []
+        self.rows = []
+        self.count = 0
+        self.last_id = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        index = cls()
+        index.rows = sorted(transactions, key=sort_key)
+        index.times = [timestamps.local_seconds(t["ts"], t["tz"]) for t in index.rows]
+        index.count = len(transactions)
+        index.last_id = transactions[-1]["id"] if transactions else None
+        return index
+
+    def extend(self, transactions):
+        with self.lock:
+            for t in transactions:
+                local = timestamps.local_seconds(t["ts"], t["tz"])
+                if not self.times or local > self.times[-1]:
+                    position = len(self.rows)
+                else:
+                    position = self._position(local, str(t.get("id")))
+                self.times.insert(position, local)
+                self.rows.insert(position, t)
+            if transactions:
+                self.count += len(transactions)
+                self.last_id = transactions[-1]["id"]
+
+    def _position(self, local, id_key):
+        # First row that sorts at or after (local, id_key); rows with the
+        # same second are few, so they are compared one by one
+        position = bisect.bisect_left(self.times, local)
+        end = bisect.bisect_right(self.times, local, position)
+        while position < end and str(self.rows[position].get("id")) < id_key:
+            position += 1
+        return position
+
+    def _bounds(self, date_from=None, date_to=None):
+        # Date bounds are local seconds, like the index
+        start = 0 if date_from is None else bisect.bisect_left(self.times, date_from)
+        end = len(self.rows) if date_to is None else bisect.bisect_left(self.times, date_to)
+        return start, end
+
+    def newest(self, limit, cursor=None, date_from=None, date_to=None, match=None):
+        """Up to `limit` transactions, newest first, older than `cursor`
+        (a sort_key() pair) and accepted by `match`, if given."""
+        with self.lock:
+            start, end = self._bounds(date_from, date_to)
+            if cursor is not None:
+                end = min(end, self._position(cursor[0], str(cursor[1])))
+            page = []
+            for i in range(end - 1, start - 1, -1):
+                t = self.rows[i]
+                if match is None or match(t):
+                    page.append(t)
+                    if len(page) == limit:
+                        break
+            return page
+
+    def between(self, date_from=None, date_to=None, match=None):
+        # Oldest first; date_from inclusive, date_to exclusive
+        with self.lock:
+            start, end = self._bounds(date_from, date_to)
+            rows = self.rows[start:end]
+        return [t for t in rows if match is None or match(t)]
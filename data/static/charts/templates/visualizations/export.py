@@ -0,0 +1,132 @@
+import io
+import csv
+import json
+import zlib
+import datetime
+
+import timestamps
+from transaction import Transaction, TRANSACTION_FIELDS, record_to_dict
+
+# Export formats and their content types
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json"
+}
+
+# Rows are buffered into chunks of roughly this many bytes before being yielded
+CHUNK_BYTES = 64 * 1024
+
+
+def date_range_filters(start_date=None, end_date=None):
+    # Both dates are "YYYY-MM-DD" and inclusive; raises ValueError on bad input.
+    # The filters are local seconds, see storage.matches_filters
+    filters = {}
+    if start_date:
+        filters["date_from"] = timestamps.day_start(datetime.datetime.strptime(start_date, "%Y-%m-%d").date())
+    if end_date:
+        day = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+        filters["date_to"] = timestamps.day_start(day + datetime.timedelta(days=1))
+    return filters
+
+
+def export_filename(fmt, compress=False):
+    return f"transactions_export.{fmt}" + (".gz" if compress else "")
+
+
+def _buffered(pieces):
+    parts = []
+    size = 0
+    for piece in pieces:
+        parts.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    yield "".join(parts)
+
+
+def _plain(row):
+    # Rows become plain dicts with a date, so json.dumps can use its shared
+    # encoder. Backends stream Transactions or stored {"ts", "tz"} records.
+    if type(row) is Transaction:
+        return row.to_dict()
+    if "ts" in row:
+        return record_to_dict(row)
+    return row
+
+
+def _csv_pieces(rows):
+    # A fixed header so records with missing or extra keys still line up
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=TRANSACTION_FIELDS, extrasaction='ignore', restval="")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(_plain(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_pieces(rows):
+    for row in rows:
+        yield json.dumps(_plain(row)) + "\n"
+
+
+def _json_pieces(rows):
+    # Same document as json.dumps(list) would produce, written one row at a time
+    yield "["
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps(_plain(row))
+        separator = ", "
+    yield "]"
+
+
+EXPORT_WRITERS = {
+    "csv": _csv_pieces,
+    "ndjson": _ndjson_pieces,
+    "json": _json_pieces
+}
+
+
+def export_chunks(rows, fmt="json"):
+    if fmt not in EXPORT_WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    for chunk in _buffered(EXPORT_WRITERS[fmt](rows)):
+        if chunk:
+            yield chunk.encode("utf-8")
+
+
+def gzip_chunks(chunks, level=6):
+    # wbits=31 makes zlib write a gzip header and trailer
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(rows, fmt="json", compress=False):
+    chunks = export_chunks(rows, fmt)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return chunks
+
+
+def write_export(path, rows, fmt="json", compress=False):
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, 'wb') as f:
+        for chunk in stream_export(counted(rows), fmt, compress):
+            f.write(chunk)
+    return count
@@ -0,0 +1,89 @@
+import threading
+
+
+class _Pending:
+    def __init__(self, transaction):
+        self.transaction = transaction
+        self.done = threading.Event()
+        self.error = None
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+
+
+class GroupCommitter:
+    """Combines concurrent inserts for the same user into one durable write.
+
+    The first request for a user becomes the leader of a batch. It waits up
+    to `window` seconds for others to join, takes the user's storage lock
+    and hands every queued transaction to storage.insert_transactions(),
+    which writes them all at once without re-reading the user's history.
+    Requests that arrive while a write is in progress queue up
+    behind the lock and go out together in the next batch.
+    """
+
+    def __init__(self, storage, window=0.002, max_batch=64):
+        self.storage = storage
+        self.window = window
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.batches = {}
+        self.commits = 0
+        self.committed = 0
+
+    def submit(self, username, transaction):
+        # Blocks until the transaction is durable
+        item = _Pending(transaction)
+        with self.lock:
+            batch = self.batches.get(username)
+            leader = batch is None
+            if leader:
+                batch = self.batches[username] = _Batch()
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch:
+                batch.full.set()
+
+        if leader:
+            self._lead(username, batch)
+        else:
+            item.done.wait()
+
+        if item.error is not None:
+            raise item.error
+
+    def _lead(self, username, batch):
+        if self.window > 0:
+            batch.full.wait(self.window)
+
+        with self.storage.lock(username):
+            # Close the batch only once the lock is ours, so everything that
+            # queued up behind the previous write joins this one
+            with self.lock:
+                if self.batches.get(username) is batch:
+                    del self.batches[username]
+                items = list(batch.items)
+            self._commit(username, items)
+
+    def _commit(self, username, items):
+        try:
+            self.storage.insert_transactions(username, [item.transaction for item in items])
+            with self.lock:
+                self.commits += 1
+                self.committed += len(items)
+        except Exception as e:
+            for item in items:
+                item.error = e
+        finally:
+            for item in items:
+                item.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "commits": self.commits,
+                "transactions": self.committed,
+                "average_batch": self.committed / self.commits if self.commits else 0
+            }
@@ -0,0 +1,247 @@
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import timestamps
+
+# Rows parsed and written per batch
+IMPORT_CHUNK_ROWS = int(os.environ.get("UPI_IMPORT_CHUNK_ROWS", 50000))
+
+# Statement column names seen in UPI app and bank exports, lower-cased
+COLUMN_ALIASES = {
+    "date": ["date", "transaction date", "txn date", "value date", "date & time", "datetime", "time"],
+    "amount": ["amount", "amount (inr)", "amount (rs)", "transaction amount", "txn amount"],
+    "debit": ["debit", "debit amount", "withdrawal", "withdrawal amount", "withdrawal amt.", "dr"],
+    "description": ["description", "narration", "remarks", "details", "transaction details", "particulars", "note"],
+    "upi_app": ["upi app", "app", "source", "paid via", "payment app"],
+    "category": ["category", "tag"],
+    "type": ["type", "transaction type", "txn type", "dr/cr", "debit/credit"]
+}
+
+# Spellings of UPI app names mapped to the names the tracker uses
+APP_ALIASES = {
+    "google pay": "Google Pay", "googlepay": "Google Pay", "gpay": "Google Pay", "g pay": "Google Pay", "tez": "Google Pay",
+    "phonepe": "PhonePe", "phone pe": "PhonePe",
+    "paytm": "Paytm", "pay tm": "Paytm",
+    "amazon pay": "Amazon Pay", "amazonpay": "Amazon Pay", "amazon": "Amazon Pay",
+    "bhim": "BHIM", "bhim upi": "BHIM",
+    "whatsapp pay": "WhatsApp Pay", "whatsapp": "WhatsApp Pay"
+}
+
+# Date layouts tried before falling back to pandas' per-row guessing, which
+# is several times slower on large files
+DAYFIRST_FORMATS = ["%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y %H:%M:%S", "%d-%m-%Y"]
+MONTHFIRST_FORMATS = ["%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y", "%m-%d-%Y %H:%M:%S", "%m-%d-%Y"]
+ISO_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d", "%d %b %Y", "%d-%b-%Y", "%d %b %Y %H:%M"]
+DATE_SAMPLE_ROWS = 200
+
+# pandas 2 guesses one layout from the first value and applies it to every
+# row unless told the layouts are mixed; pandas 1 guessed each row anyway
+PANDAS_MIXED_FORMAT = int(pd.__version__.split(".")[0]) >= 2
+
+
+def _find_column(columns, field):
+    for alias in COLUMN_ALIASES[field]:
+        if alias in columns:
+            return columns[alias]
+    return None
+
+
+def parse_dates(values, dayfirst=True):
+    # Each known layout parses the rows it fits, the ones fitting most of a
+    # sample first, so a statement mixing dates and date-times or with a few
+    # junk rows keeps every readable date. Rows no layout fits are guessed
+    # one by one; what is still unreadable comes back as NaT.
+    values = values.fillna("").astype(str).str.strip()
+    present = values != ""
+    if not present.any():
+        return pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+
+    sample = values[present].head(DATE_SAMPLE_ROWS)
+    formats = (DAYFIRST_FORMATS if dayfirst else MONTHFIRST_FORMATS) + ISO_FORMATS
+    fits = {}
+    for fmt in formats:
+        fits[fmt] = pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum()
+        if fits[fmt] == len(sample):
+            break
+    # sorted() is stable, so ties keep the order of the lists above
+    formats = sorted(formats, key=lambda fmt: -fits.get(fmt, 0))
+    dates = pd.to_datetime(values, format=formats[0], errors="coerce")
+    remaining = dates.isna() & present
+    if not remaining.any():
+        return dates
+    for fmt in formats[1:]:
+        parsed = pd.to_datetime(values[remaining], format=fmt, errors="coerce")
+        parsed = parsed[parsed.notna()]
+        dates[parsed.index] = parsed
+        remaining[parsed.index] = False
+        if not remaining.any():
+            return dates
+
+    guessed = _guess_dates(values[remaining], dayfirst)
+    dates[guessed.index] = guessed
+    return dates
+
+
+def _guess_dates(values, dayfirst):
+    # pandas' own guessing, for rows no known layout fits. A UTC offset in
+    # the text is dropped, the time is taken as written (see epoch_seconds).
+    options = {"format": "mixed"} if PANDAS_MIXED_FORMAT else {}
+    try:
+        guessed = pd.to_datetime(values, errors="coerce", dayfirst=dayfirst, **options)
+    except ValueError:
+        # Rows with different UTC offsets
+        guessed = None
+    if guessed is None or guessed.dtype == object:
+        return pd.Series([_wall_clock(value, dayfirst) for value in values], index=values.index,
+                         dtype="datetime64[ns]")
+    if guessed.dt.tz is not None:
+        guessed = guessed.dt.tz_localize(None)
+    return guessed
+
+
+def _wall_clock(value, dayfirst):
+    stamp = pd.to_datetime(value, errors="coerce", dayfirst=dayfirst)
+    if pd.isna(stamp) or stamp.tzinfo is None:
+        return stamp
+    return stamp.tz_localize(None)
+
+
+def epoch_seconds(dates, tz):
+    # Statement times are wall-clock times at UTC offset tz. NaT becomes a
+    # meaningless number, those rows are dropped anyway.
+    local = dates.values.astype("datetime64[s]").astype(np.int64)
+    return pd.Series(local - tz * 60, index=dates.index)
+
+
+def read_chunks(path, chunk_rows=None):
+    # Yields DataFrames of at most chunk_rows rows, never the whole file
+    chunk_rows = chunk_rows or IMPORT_CHUNK_ROWS
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in (".xlsx", ".xlsm"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("Excel import needs the openpyxl package (pip install openpyxl)")
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h) if h is not None else "" for h in next(rows, [])]
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunk_rows:
+                    yield pd.DataFrame(batch, columns=header)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=header)
+        finally:
+            workbook.close()
+    elif extension in (".csv", ".txt", ""):
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=str, skipinitialspace=True)
+    else:
+        raise ValueError(f"Unsupported statement format: {extension}")
+
+
+def normalize_chunk(df, categories, default_app="Other", dayfirst=True, tz=None, categorizer=None):
+    # Returns a DataFrame with the tracker's transaction columns, where rows
+    # without a usable date or a positive spent amount are dropped, and the
+    # positions in `df` of the rows whose date was there but unreadable
+    columns = {str(c).strip().lower(): c for c in df.columns}
+    date_col = _find_column(columns, "date")
+    amount_col = _find_column(columns, "debit") or _find_column(columns, "amount")
+    if date_col is None or amount_col is None:
+        raise ValueError("Statement needs a date column and an amount or debit column")
+
+    out = pd.DataFrame(index=df.index)
+
+    tz = timestamps.DEFAULT_TZ if tz is None else tz
+    dates = parse_dates(df[date_col], dayfirst)
+    out["ts"] = epoch_seconds(dates, tz)
+    out["tz"] = tz
+
+    raw_amounts = df[amount_col].fillna("").astype(str).str.strip()
+    # Keep only digits, the decimal point and a sign
+    amounts = raw_amounts.str.replace(r"(?i)rs\.|[^0-9.\-]", "", regex=True)
+    # Some statements show spending as negative amounts
+    out["amount"] = pd.to_numeric(amounts, errors="coerce").abs().round(2)
+
+    # Money received isn't spending
+    credit = raw_amounts.str.contains(r"(?i)cr\.?\)?$", regex=True)
+    type_col = _find_column(columns, "type")
+    if type_col is not None:
+        credit |= df[type_col].fillna("").astype(str).str.strip().str.lower().str.startswith("cr")
+
+    description_col = _find_column(columns, "description")
+    if description_col is not None:
+        out["description"] = df[description_col].fillna("").astype(str).str.strip()
+    else:
+        out["description"] = ""
+
+    app_col = _find_column(columns, "upi_app")
+    if app_col is not None:
+        apps = df[app_col].fillna("").astype(str).str.strip().str.lower().map(APP_ALIASES)
+        out["upi_app"] = apps.fillna(default_app)
+    else:
+        out["upi_app"] = default_app
+
+    category_col = _find_column(columns, "category")
+    category_lookup = {c.lower(): c for c in categories}
+    if category_col is not None:
+        labels = df[category_col].fillna("").astype(str).str.strip().str.lower().map(category_lookup)
+    else:
+        labels = pd.Series(None, index=df.index, dtype=object)
+    if categorizer is not None:
+        # Rows the statement doesn't categorize are labelled from their description
+        missing = labels.isna()
+        if missing.any():
+            guessed = categorizer.categorize_many(out["description"][missing].tolist())
+            labels[missing] = pd.Series(guessed, index=labels.index[missing]).str.lower().map(category_lookup)
+    out["category"] = labels.fillna("Other")
+
+    valid = dates.notna() & out["amount"].notna() & (out["amount"] > 0) & ~credit
+    unreadable = dates.isna() & (df[date_col].fillna("").astype(str).str.strip() != "")
+    return out[valid], np.flatnonzero(unreadable.to_numpy())
+
+
+def unreadable_dates_message(stats, shown=10):
+    # e.g. "2 rows were skipped because their date couldn't be read: 4, 17"
+    rows = stats["unreadable_dates"]
+    if not rows:
+        return None
+    listed = ", ".join(str(row) for row in rows[:shown]) + (", ..." if len(rows) > shown else "")
+    return f"{len(rows)} row(s) were skipped because their date couldn't be read: {listed}"
+
+
+def uuid_ids(count):
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+
+def import_statement(storage, username, path, categories, id_factory=uuid_ids,
+                     default_app="Other", dayfirst=True, tz=None, chunk_rows=None, categorizer=None):
+    # Each chunk becomes one locked bulk write with a single balance update.
+    # unreadable_dates lists the rows skipped for a date that couldn't be
+    # read, numbered as in a spreadsheet (the header is row 1).
+    stats = {"imported": 0, "skipped": 0, "chunks": 0, "amount": 0, "unreadable_dates": []}
+    first_row = 2
+    for chunk in read_chunks(path, chunk_rows):
+        rows, unreadable = normalize_chunk(chunk, categories, default_app, dayfirst, tz, categorizer)
+        stats["unreadable_dates"].extend(first_row + int(position) for position in unreadable)
+        first_row += len(chunk)
+        stats["skipped"] += len(chunk) - len(rows)
+        if rows.empty:
+            continue
+
+        # Building the dicts from plain column lists is much faster than to_dict
+        columns = [id_factory(len(rows))] + [rows[field].tolist() for field in rows.columns]
+        fields = ["id"] + list(rows.columns)
+        transactions = [dict(zip(fields, values)) for values in zip(*columns)]
+        storage.insert_transactions(username, transactions)
+
+        stats["imported"] += len(transactions)
+        stats["amount"] += float(rows["amount"].sum())
+        stats["chunks"] += 1
+    return stats
@@ -0,0 +1,149 @@
+import os
+import time
+import bisect
+import threading
+import contextlib
+import functools
+
+# Phase timing is off unless UPI_METRICS=1; with it off, timed() returns the
+# function unchanged and phase() is a shared no-op context
+METRICS_ENABLED = os.environ.get("UPI_METRICS", "0") == "1"
+# Adds a Server-Timing header with the phases of each request (needs UPI_METRICS=1)
+SERVER_TIMING = os.environ.get("UPI_SERVER_TIMING", "0") == "1"
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_noop = contextlib.nullcontext()
+_local = threading.local()
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one series per label set."""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts (made cumulative on output), sum, count
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted(self.series.items())
+            series = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in series]
+        for labels, (counts, total, count) in series:
+            label_text = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "upi_request_duration_seconds", "Time spent handling a request.", ("endpoint", "method", "status")
+)
+PHASE_SECONDS = Histogram(
+    "upi_phase_duration_seconds", "Time spent in each phase of request handling.", ("phase",)
+)
+
+# Functions returning (name, type, help, value) tuples, read on every scrape
+_collectors = []
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+@contextlib.contextmanager
+def _timed_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_SECONDS.observe((name,), elapsed)
+        phases = getattr(_local, "phases", None)
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + elapsed
+
+
+def phase(name):
+    # Context manager timing a block as phase `name`
+    if not METRICS_ENABLED:
+        return _noop
+    return _timed_phase(name)
+
+
+def timed(name):
+    # Decorator timing every call as phase `name`
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timed_phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    # Request timing middleware; does nothing unless metrics are enabled
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_timer():
+        _local.start = time.perf_counter()
+        _local.phases = {}
+
+    @app.after_request
+    def record_request(response):
+        start = getattr(_local, "start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        from flask import request
+        REQUEST_SECONDS.observe((request.endpoint or "unknown", request.method, str(response.status_code)), elapsed)
+        if SERVER_TIMING:
+            entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in _local.phases.items()]
+            entries.append(f"total;dur={elapsed * 1000:.1f}")
+            response.headers["Server-Timing"] = ", ".join(entries)
+        _local.start = None
+        _local.phases = None
+        return response
+
+
+def render_metrics():
+    lines = []
+    for collector in _collectors:
+        for name, metric_type, help_text, value in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+    lines.extend(REQUEST_SECONDS.render())
+    lines.extend(PHASE_SECONDS.render())
+    return "\n".join(lines) + "\n"
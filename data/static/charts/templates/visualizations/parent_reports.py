@@ -0,0 +1,396 @@
+"""Weekly and monthly spending reports for parents.
+
+The batch job goes through every user who has sharing with parents turned
+on, works out their totals for the period, and renders the email and its
+charts in a pool of worker processes. Finished messages are written to a
+Maildir-style outbox (data/outbox/new), from where `drain` hands them to a
+local SMTP server and moves them to data/outbox/cur.
+
+A message's file name depends only on the period and the username, so a
+job that was stopped, or ran past --max-minutes, carries on where it left
+off when started again, and a report already in the outbox is never sent
+twice.
+
+    python parent_reports.py weekly
+    python parent_reports.py monthly --date 2025-07-01 --workers 8
+    python parent_reports.py drain --port 1025
+"""
+import io
+import os
+import sys
+import time
+import heapq
+import smtplib
+import argparse
+import datetime
+import collections
+import multiprocessing
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+
+import storage
+import timestamps
+
+REPORT_SENDER = os.environ.get("UPI_REPORT_FROM", "UPI Tracker <reports@upi-tracker.local>")
+LARGEST_TRANSACTIONS = 5
+# Leftover temp files older than this are from a job that was killed
+STALE_TEMP_SECONDS = 3600
+
+Period = collections.namedtuple("Period", ["kind", "key", "label", "start", "end"])
+
+
+def report_period(kind, day=None):
+    # The last complete week (Monday to Sunday) or calendar month before `day`.
+    # start is inclusive and end exclusive.
+    day = day or datetime.date.today()
+    if kind == "weekly":
+        end = day - datetime.timedelta(days=day.weekday())
+        start = end - datetime.timedelta(days=7)
+        year, week, _ = start.isocalendar()
+        return Period(kind, f"{year}-W{week:02d}", f"the week of {start:%d %b %Y}", start, end)
+    if kind == "monthly":
+        end = day.replace(day=1)
+        start = (end - datetime.timedelta(days=1)).replace(day=1)
+        return Period(kind, start.strftime("%Y-%m"), start.strftime("%B %Y"), start, end)
+    raise ValueError(f"Unknown report period: {kind}")
+
+
+def month_to_date(now=None):
+    # Period for a report shared on demand; keyed by time so every request
+    # gets its own message
+    now = now or datetime.datetime.now()
+    today = now.date()
+    return Period(
+        "shared", now.strftime("%Y%m%dT%H%M%S"), f"{today:%B %Y} so far",
+        today.replace(day=1), today + datetime.timedelta(days=1)
+    )
+
+
+def build_report(store, username, period, data=None):
+    # Returns the report's figures, or None if the user doesn't share with parents
+    if data is None and not store.indexed and not store.ranged:
+        data = store.load(username)
+    profile = data["profile"] if data is not None else store.load_profile(username)
+    if not profile.get("share_with_parents") or not profile.get("parent_email"):
+        return None
+
+    count = 0
+    total = 0.0
+    by_category = collections.Counter()
+    by_upi_app = collections.Counter()
+    by_day = collections.Counter()
+    largest = []
+    for t in store.transactions_between(
+        username, timestamps.day_start(period.start), timestamps.day_start(period.end), data
+    ):
+        amount = t["amount"]
+        count += 1
+        total += amount
+        by_category[t["category"]] += amount
+        by_upi_app[t["upi_app"]] += amount
+        day = timestamps.day_key(t["ts"], t["tz"])
+        by_day[day] += amount
+        item = (amount, day, t["description"], t["category"])
+        if len(largest) < LARGEST_TRANSACTIONS:
+            heapq.heappush(largest, item)
+        else:
+            heapq.heappushpop(largest, item)
+
+    budget = profile.get("monthly_budget") or 0
+    if period.kind == "weekly":
+        budget = budget * 7 / 30
+
+    return {
+        "username": username,
+        "name": profile.get("name") or username,
+        "parent_email": profile["parent_email"],
+        "period": period,
+        "count": count,
+        "total": total,
+        "budget": budget,
+        "balance": profile.get("account_balance", 0),
+        "by_category": by_category.most_common(),
+        "by_upi_app": by_upi_app.most_common(),
+        "by_day": sorted(by_day.items()),
+        "largest": sorted(largest, reverse=True)
+    }
+
+
+def render_body(report):
+    period = report["period"]
+    lines = [
+        "Dear Parent,",
+        "",
+        f"Here is {report['name']}'s UPI spending for {period.label}.",
+        "",
+        f"Total spent: ₹{report['total']:.2f} across {report['count']} transaction(s)",
+    ]
+    if report["budget"]:
+        share = report["total"] / report["budget"] * 100
+        lines.append(f"Budget for the period: ₹{report['budget']:.2f} ({share:.0f}% used)")
+    lines.append(f"Current balance: ₹{report['balance']:.2f}")
+
+    if report["by_category"]:
+        lines += ["", "By category:"]
+        lines += [f"  {category:<16} ₹{amount:10.2f}" for category, amount in report["by_category"]]
+        lines += ["", "By UPI app:"]
+        lines += [f"  {app:<16} ₹{amount:10.2f}" for app, amount in report["by_upi_app"]]
+        lines += ["", "Largest payments:"]
+        lines += [
+            f"  {day}  ₹{amount:10.2f}  {description} ({category})"
+            for amount, day, description, category in report["largest"]
+        ]
+    else:
+        lines += ["", "No UPI payments were recorded in this period."]
+
+    lines += ["", "This report was sent because sharing with parents is turned on in UPI Tracker."]
+    return "\n".join(lines) + "\n"
+
+
+def render_charts(report):
+    # PNG attachments as (filename, bytes). Figures are drawn without pyplot,
+    # so nothing is kept between reports in a worker, and with fixed margins
+    # rather than tight_layout(), which would draw each figure twice.
+    if not report["count"]:
+        return []
+    from matplotlib.figure import Figure
+
+    charts = []
+
+    figure = Figure(figsize=(6, 3.5), dpi=80)
+    figure.subplots_adjust(left=0.25, right=0.95, top=0.9, bottom=0.15)
+    axes = figure.add_subplot()
+    categories = report["by_category"][::-1]
+    axes.barh(range(len(categories)), [a for _, a in categories], color="#4c72b0")
+    # Ticks and labels are set separately; matplotlib 3.4 doesn't take both at once
+    axes.set_yticks(range(len(categories)))
+    axes.set_yticklabels([c for c, _ in categories])
+    axes.set_title("Spending by category")
+    axes.set_xlabel("Amount (₹)")
+    charts.append(("category.png", _png(figure)))
+
+    figure = Figure(figsize=(6, 3), dpi=80)
+    figure.subplots_adjust(left=0.12, right=0.97, top=0.88, bottom=0.15)
+    axes = figure.add_subplot()
+    days = report["by_day"]
+    axes.bar(range(len(days)), [a for _, a in days], color="#55a868")
+    # A label a week is plenty, and each tick label is costly to draw
+    axes.set_xticks(range(0, len(days), 7))
+    axes.set_xticklabels([d[5:] for d, _ in days[::7]])
+    axes.set_title("Daily spending")
+    axes.set_ylabel("Amount (₹)")
+    charts.append(("daily.png", _png(figure)))
+    return charts
+
+
+def _png(figure):
+    buffer = io.BytesIO()
+    # Light compression: the images are small and encoding time adds up over every user
+    figure.savefig(buffer, format="png", pil_kwargs={"compress_level": 1})
+    return buffer.getvalue()
+
+
+def build_message(report, charts):
+    message = EmailMessage()
+    message["From"] = REPORT_SENDER
+    message["To"] = report["parent_email"]
+    message["Subject"] = f"{report['name']}'s spending report for {report['period'].label}"
+    message["X-UPI-Report"] = f"{report['period'].kind}/{report['period'].key}/{report['username']}"
+    message.set_content(render_body(report))
+    for filename, png in charts:
+        message.add_attachment(png, maintype="image", subtype="png", filename=filename)
+    return message
+
+
+def outbox_dirs(outbox_dir):
+    dirs = {name: os.path.join(outbox_dir, name) for name in ("tmp", "new", "cur")}
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+    return dirs
+
+
+def message_name(period, username):
+    return f"{period.kind}-{period.key}.{username}.eml"
+
+
+def is_queued(outbox_dir, name):
+    # Waiting in new/ or already handed over and moved to cur/
+    return any(os.path.exists(os.path.join(outbox_dir, sub, name)) for sub in ("new", "cur"))
+
+
+def write_message(outbox_dir, name, message):
+    # Written to tmp/ and renamed into new/, so a drain never picks up half a message
+    dirs = outbox_dirs(outbox_dir)
+    temp_path = os.path.join(dirs["tmp"], f"{name}.{os.getpid()}")
+    with open(temp_path, "wb") as f:
+        f.write(message.as_bytes(policy=policy.SMTP))
+        f.flush()
+        os.fsync(f.fileno())
+    path = os.path.join(dirs["new"], name)
+    os.replace(temp_path, path)
+    return path
+
+
+def queue_report(store, username, period, outbox_dir, data=None, charts=True):
+    # Builds one report and puts it in the outbox; returns (report, path), or
+    # (None, None) if the user doesn't share with parents
+    report = build_report(store, username, period, data)
+    if report is None:
+        return None, None
+    message = build_message(report, render_charts(report) if charts else [])
+    return report, write_message(outbox_dir, message_name(period, username), message)
+
+
+# Batch job. Each worker process opens its own storage handles once.
+_worker = {}
+
+
+def _init_worker(data_dir, mode, outbox_dir, period, charts):
+    _worker.update(
+        stores={
+            False: storage.get_storage(data_dir, mode=mode),
+            True: storage.get_storage(data_dir, cli_layout=True, mode=mode)
+        },
+        outbox_dir=outbox_dir, period=period, charts=charts
+    )
+    for store in _worker["stores"].values():
+        # Each user is visited once, so keeping their date index would only hold memory
+        store.date_indexes.max_size = 0
+    if charts:
+        # Loaded once per worker rather than on the first report
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.figure  # noqa: F401
+
+
+def _report_task(task):
+    cli_layout, username = task
+    try:
+        report, _ = queue_report(
+            _worker["stores"][cli_layout], username, _worker["period"], _worker["outbox_dir"],
+            charts=_worker["charts"]
+        )
+    except Exception as e:
+        return username, "failed", f"{type(e).__name__}: {e}"
+    return username, "queued" if report is not None else "not_sharing", None
+
+
+def report_users(data_dir, mode=None):
+    # (cli_layout, username) for the web users and the CLI's user
+    users = []
+    for cli_layout in (False, True):
+        store = storage.get_storage(data_dir, cli_layout=cli_layout, mode=mode)
+        users.extend((cli_layout, username) for username in store.list_users())
+        if store.indexed:
+            # The CLI shares the same database
+            break
+    return users
+
+
+def clean_temp_files(outbox_dir):
+    tmp_dir = outbox_dirs(outbox_dir)["tmp"]
+    cutoff = time.time() - STALE_TEMP_SECONDS
+    for name in os.listdir(tmp_dir):
+        path = os.path.join(tmp_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def run_job(data_dir, period, outbox_dir=None, workers=None, mode=None, charts=True,
+            max_minutes=None, chunksize=16, progress=None):
+    """Queues `period`'s report for every sharing user not already in the outbox.
+
+    Returns a Counter of outcomes: queued, not_sharing, already_queued,
+    failed and, if the time limit was hit, remaining.
+    """
+    outbox_dir = outbox_dir or os.path.join(data_dir, "outbox")
+    outbox_dirs(outbox_dir)
+    clean_temp_files(outbox_dir)
+
+    counts = collections.Counter()
+    tasks = []
+    for cli_layout, username in report_users(data_dir, mode):
+        if is_queued(outbox_dir, message_name(period, username)):
+            counts["already_queued"] += 1
+        else:
+            tasks.append((cli_layout, username))
+
+    deadline = time.monotonic() + max_minutes * 60 if max_minutes else None
+    done = 0
+    pool = multiprocessing.Pool(
+        workers or os.cpu_count(), initializer=_init_worker,
+        initargs=(data_dir, mode, outbox_dir, period, charts)
+    )
+    try:
+        for username, outcome, error in pool.imap_unordered(_report_task, tasks, chunksize):
+            counts[outcome] += 1
+            done += 1
+            if error and progress:
+                progress(f"{username}: {error}")
+            if progress and done % 1000 == 0:
+                progress(f"{done}/{len(tasks)} users")
+            if deadline is not None and time.monotonic() > deadline:
+                break
+    finally:
+        # Messages are renamed into place whole, so stopping mid-way is safe
+        pool.terminate()
+        pool.join()
+
+    if done < len(tasks):
+        counts["remaining"] = len(tasks) - done
+    return counts
+
+
+def drain(outbox_dir, host="localhost", port=1025, limit=None):
+    # Hands every message in new/ to an SMTP server, moving each to cur/ once
+    # accepted. Stops at the first failure, leaving the rest for next time.
+    dirs = outbox_dirs(outbox_dir)
+    names = sorted(os.listdir(dirs["new"]))[:limit]
+    sent = 0
+    with smtplib.SMTP(host, port) as smtp:
+        for name in names:
+            path = os.path.join(dirs["new"], name)
+            with open(path, "rb") as f:
+                message = BytesParser(policy=policy.default).parse(f)
+            smtp.send_message(message)
+            os.replace(path, os.path.join(dirs["cur"], name))
+            sent += 1
+    return sent
+
+
+if __name__ == "__main__":
+    default_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    parser = argparse.ArgumentParser(description="Parent spending reports")
+    parser.add_argument("command", choices=["weekly", "monthly", "drain"])
+    parser.add_argument("--data-dir", default=default_data_dir)
+    parser.add_argument("--outbox", help="Outbox directory (default DATA_DIR/outbox)")
+    parser.add_argument("--date", help="Report on the last full week/month before this day, YYYY-MM-DD (default today)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default one per CPU)")
+    parser.add_argument("--backend", choices=sorted(storage.STORAGE_BACKENDS), help="Defaults to UPI_STORAGE")
+    parser.add_argument("--no-charts", action="store_true", help="Send the text report without chart images")
+    parser.add_argument("--max-minutes", type=float, help="Stop after this long; run again to continue")
+    parser.add_argument("--host", default="localhost", help="SMTP server for drain")
+    parser.add_argument("--port", type=int, default=1025, help="SMTP port for drain")
+    args = parser.parse_args()
+
+    outbox_dir = args.outbox or os.path.join(args.data_dir, "outbox")
+    if args.command == "drain":
+        print(f"Sent {drain(outbox_dir, args.host, args.port)} message(s)")
+        sys.exit(0)
+
+    day = datetime.datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else None
+    period = report_period(args.command, day)
+    start = time.perf_counter()
+    counts = run_job(
+        args.data_dir, period, outbox_dir, args.workers, args.backend,
+        charts=not args.no_charts, max_minutes=args.max_minutes, progress=print
+    )
+    elapsed = time.perf_counter() - start
+    print(f"{period.kind} reports for {period.label} in {elapsed:.1f}s: "
+          + ", ".join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in sorted(counts.items())))
+    if counts["failed"] or counts["remaining"]:
+        sys.exit(1)
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+import concurrent.futures
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hashes computed at once; werkzeug's scrypt/pbkdf2 release the GIL, so
+# threads run them in parallel while capping how many cores logins can take
+HASH_WORKERS = int(os.environ.get("UPI_HASH_WORKERS", 2))
+# Requests allowed to wait for a free worker before new ones are turned away
+HASH_QUEUE = int(os.environ.get("UPI_HASH_QUEUE", 16))
+# Longest a request waits for its hash (queueing included)
+HASH_TIMEOUT = float(os.environ.get("UPI_HASH_TIMEOUT", 5))
+# "thread" or "process"; processes also keep hashing off this worker's GIL
+HASH_POOL = os.environ.get("UPI_HASH_POOL", "thread")
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash took too long."""
+
+
+def _timed_hash(func, *args):
+    # Runs in the pool; returns the result and the seconds spent hashing
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    """Runs password hashes on a small bounded pool.
+
+    At most `workers` hashes run at once and at most `queue` more wait for
+    a worker. Past that, submit() raises HasherBusy straight away instead
+    of queueing, so a burst of logins can't tie up every request thread
+    while dashboards wait behind them.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, queue=HASH_QUEUE, timeout=HASH_TIMEOUT, pool=HASH_POOL):
+        self.workers = max(1, workers)
+        self.queue = max(0, queue)
+        self.timeout = timeout
+        self.pool = pool
+        self.slots = threading.BoundedSemaphore(self.workers + self.queue)
+        self.lock = threading.Lock()
+        self.executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    def _get_executor(self):
+        # Created on first use, so importing the app starts no workers
+        with self.lock:
+            if self.executor is None:
+                if self.pool == "process":
+                    self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+                else:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(
+                        self.workers, thread_name_prefix="password-hasher"
+                    )
+            return self.executor
+
+    def submit(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise HasherBusy("Too many password checks in progress")
+
+        start = time.perf_counter()
+        with self.lock:
+            self.in_flight += 1
+        try:
+            future = self._get_executor().submit(_timed_hash, func, *args)
+        except BaseException:
+            self._finish()
+            raise
+        # The slot is given back when the hash finishes, even if this request
+        # stopped waiting for it, so a stuck pool keeps shedding load
+        future.add_done_callback(lambda _: self._finish())
+
+        try:
+            result, hash_seconds = future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            with self.lock:
+                self.timeouts += 1
+            raise HasherBusy("Password check timed out")
+
+        with self.lock:
+            self.completed += 1
+            self.hash_seconds += hash_seconds
+            self.wait_seconds += time.perf_counter() - start - hash_seconds
+        return result
+
+    def _finish(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def generate(self, password):
+        return self.submit(generate_password_hash, password)
+
+    def check(self, password_hash, password):
+        return self.submit(check_password_hash, password_hash, password)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue": self.queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "wait_seconds": self.wait_seconds,
+                "hash_seconds": self.hash_seconds
+            }
@@ -0,0 +1,186 @@
+import os
+import re
+import sys
+import array
+import base64
+import bisect
+import threading
+from functools import lru_cache
+
+from user_cache import HistoryIndex
+
+# Users whose search index is kept in memory per storage instance (LRU)
+SEARCH_INDEX_SIZE = int(os.environ.get("UPI_SEARCH_INDEX_SIZE", 16))
+# Most rows returned by one search; the count and total cover every match
+SEARCH_LIMIT = int(os.environ.get("UPI_SEARCH_LIMIT", 100))
+
+# Words are runs of letters and digits, the same rule the categorizer uses
+WORD = re.compile(r"[^\W_]+")
+# Sorts after every word, so [term, term + PREFIX_END) is every word starting with term
+PREFIX_END = "\U0010ffff"
+
+
+@lru_cache(maxsize=65536)
+def tokenize(text):
+    # Distinct lower-cased words of a description, in order. Descriptions
+    # repeat a lot ("Uber ride", "Swiggy order"), hence the cache.
+    if not text:
+        return ()
+    return tuple(dict.fromkeys(WORD.findall(text.lower())))
+
+
+def postings_for(start, transactions):
+    # {word: [positions]} for transactions stored from position `start` on
+    postings = {}
+    for position, t in enumerate(transactions, start):
+        for word in tokenize(t.get("description")):
+            postings.setdefault(word, []).append(position)
+    return postings
+
+
+class SearchIndex(HistoryIndex):
+    """Inverted index of one user's transaction descriptions.
+
+    Maps every word to the positions of the transactions containing it, in
+    the order they are stored, as packed uint32 arrays. Positions only ever
+    grow, so adding transactions appends to a few arrays and the arrays stay
+    sorted. match() treats each query term as a prefix (all words starting
+    with it, found by binary search over the sorted vocabulary) and returns
+    the positions matching every term.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.words = []
+        self.count = 0
+        self.last_id = None
+        # Rows already written to the index file or its log
+        self.persisted = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        index = cls()
+        index.extend(transactions)
+        return index
+
+    def extend(self, transactions):
+        # Returns the postings added, for the index log
+        if not transactions:
+            return {}
+        postings = postings_for(self.count, transactions)
+        self.add(postings, self.count + len(transactions), transactions[-1]["id"])
+        return postings
+
+    def add(self, postings, count, last_id):
+        with self.lock:
+            for word, positions in postings.items():
+                if word not in self.postings:
+                    self.postings[word] = array.array("I")
+                    bisect.insort(self.words, word)
+                self.postings[word].extend(positions)
+            self.count = count
+            self.last_id = last_id
+
+    def _prefixed(self, term):
+        start = bisect.bisect_left(self.words, term)
+        end = bisect.bisect_left(self.words, term + PREFIX_END, start)
+        return self.words[start:end]
+
+    def match(self, query):
+        """Sorted positions of the transactions matching every term of `query`."""
+        import numpy as np
+
+        result = np.empty(0, dtype=np.uint32)
+        with self.lock:
+            for i, term in enumerate(tokenize(query)):
+                # Copied, since an array can't grow while NumPy views it
+                found = [np.array(self.postings[word], dtype=np.uint32) for word in self._prefixed(term)]
+                if not found:
+                    return np.empty(0, dtype=np.uint32)
+                positions = found[0] if len(found) == 1 else np.unique(np.concatenate(found))
+                result = positions if i == 0 else np.intersect1d(result, positions, assume_unique=True)
+                if not len(result):
+                    break
+        return result
+
+    def to_json(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "last_id": self.last_id,
+                "byteorder": sys.byteorder,
+                "postings": {
+                    word: base64.b64encode(positions.tobytes()).decode("ascii")
+                    for word, positions in self.postings.items()
+                }
+            }
+
+    @classmethod
+    def from_json(cls, document):
+        index = cls()
+        for word, encoded in document["postings"].items():
+            positions = array.array("I", base64.b64decode(encoded))
+            if document.get("byteorder", sys.byteorder) != sys.byteorder:
+                positions.byteswap()
+            index.postings[word] = positions
+        index.words = sorted(index.postings)
+        index.count = index.persisted = document["count"]
+        index.last_id = document["last_id"]
+        return index
+
+    def apply_records(self, records):
+        # Log records carry the postings of rows appended after the file was
+        # written; one that doesn't continue the index (left by a history
+        # that was since replaced) ends the replay
+        for record in records:
+            if record.get("start") != self.count:
+                break
+            self.add(record["postings"], record["count"], record["last_id"])
+        self.persisted = self.count
+        return self
+
+
+def filter_matches(positions, columns, transactions, filters, limit=SEARCH_LIMIT):
+    """Applies the category, app, date and amount filters to matched
+    positions using the user's TransactionColumns. Returns the newest
+    `limit` rows plus the count and total of every match."""
+    import numpy as np
+
+    keep = np.ones(len(positions), dtype=bool)
+    for field, codes, values in (("category", columns.category_codes, columns.category),
+                                 ("upi_app", columns.app_codes, columns.upi_app)):
+        if filters.get(field):
+            code = codes.get(filters[field])
+            if code is None:
+                keep[:] = False
+            else:
+                keep &= values[positions] == code
+    local = columns.timestamps[positions]
+    if filters.get("date_from") is not None:
+        keep &= local >= filters["date_from"]
+    if filters.get("date_to") is not None:
+        keep &= local < filters["date_to"]
+    amounts = columns.amounts[positions]
+    if filters.get("min_amount") is not None:
+        keep &= amounts >= filters["min_amount"]
+    if filters.get("max_amount") is not None:
+        keep &= amounts <= filters["max_amount"]
+
+    positions, local = positions[keep], local[keep]
+    if len(positions) > limit:
+        # Only rows at least as new as the limit-th newest need sorting
+        newest = local >= np.partition(local, len(local) - limit)[len(local) - limit]
+        chosen, chosen_local = positions[newest], local[newest]
+    else:
+        chosen, chosen_local = positions, local
+    # Newest first in date_index.sort_key() order, the order pages use
+    newest_first = sorted(
+        zip(chosen_local.tolist(), chosen.tolist()),
+        key=lambda pair: (pair[0], str(transactions[pair[1]].get("id"))), reverse=True
+    )[:limit]
+    return {
+        "rows": [transactions[i] for _, i in newest_first],
+        "count": int(len(positions)),
+        "total": float(amounts[keep].sum())
+    }
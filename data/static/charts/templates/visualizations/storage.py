@@ -0,0 +1,1515 @@
+import os
+import sys
+import json
+import argparse
+import glob
+import sqlite3
+import threading
+import time
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locking on Windows; single-process use is still safe
+    fcntl = None
+
+import timestamps
+from date_index import DATE_INDEX_SIZE, DateIndex, sort_key
+from search import SEARCH_INDEX_SIZE, SEARCH_LIMIT, PREFIX_END, SearchIndex, filter_matches, postings_for, tokenize
+from transaction import Transaction, RECORD_FIELDS, to_json, from_dicts
+from user_cache import HistoryIndexCache, UserDataCache
+
+# Storage configuration
+# "json" rewrites the whole file on every change, "log" appends changes to a
+# JSONL log next to the snapshot and folds them back in once it grows,
+# "sqlite" keeps every user in one indexed database
+STORAGE_MODE = os.environ.get("UPI_STORAGE", "json")
+LOG_COMPACT_BYTES = int(os.environ.get("UPI_LOG_COMPACT_BYTES", 256 * 1024))
+SQLITE_FILE = os.environ.get("UPI_SQLITE_FILE", "upi_tracker.db")
+# With the json and log backends, move closed months out of the JSON file
+# into per-month columnar partitions (see archive.py). "0" folds them back.
+ARCHIVE_CLOSED_MONTHS = os.environ.get("UPI_ARCHIVE", "1") != "0"
+
+# Username the CLI's single-user data is stored under. It shares the
+# namespace of web accounts (the SQLite tables, outbox and alert files), so
+# the web app refuses to register or log in under it.
+CLI_USERNAME = "local"
+
+PROFILE_FIELDS = ["name", "account_balance", "monthly_budget", "parent_email", "share_with_parents"]
+
+
+def default_profile():
+    return {
+        "name": "",
+        "account_balance": 0,
+        "monthly_budget": 0,
+        "parent_email": "",
+        "share_with_parents": False
+    }
+
+
+def empty_document():
+    return {
+        "profile": default_profile(),
+        "transactions": []
+    }
+
+
+def read_json(path, default=None):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return default
+
+
+def write_json(path, data):
+    # Write to a temp file and rename so readers never see a partial file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=to_json)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def append_records(path, records):
+    # One write and one fsync however many records there are
+    with open(path, 'a') as f:
+        f.write("".join(json.dumps(record, default=to_json) + "\n" for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def file_stamp(path):
+    # Changes whenever the file is rewritten (new inode) or appended to
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def latest_mtime(*paths):
+    # Epoch seconds of the newest of the files that exist, or None
+    stamps = [file_stamp(path) for path in paths]
+    return max((stamp[1] / 1e9 for stamp in stamps if stamp), default=None)
+
+
+def read_log(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn write at the tail of the log, nothing after it was committed
+                break
+    return records
+
+
+def read_last_record(path):
+    # The last record of a log, read from the end of the file. None if the
+    # log is missing or empty, or ends in a torn write.
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        tail = b""
+        while end > 0 and tail.count(b"\n") < 2:
+            start = max(0, end - 4096)
+            f.seek(start)
+            tail = f.read(end - start) + tail
+            end = start
+    if not tail.endswith(b"\n"):
+        return None
+    lines = tail.split(b"\n")
+    try:
+        return json.loads(lines[-2])
+    except (ValueError, IndexError):
+        return None
+
+
+def apply_records(document, records):
+    # Replaying is idempotent: transactions already in the snapshot are skipped
+    # and profile records carry absolute values, so an interrupted compaction
+    # can safely replay the same log again
+    seen = {t.get("id") for t in document["transactions"]}
+    for record in records:
+        if record["type"] == "transaction":
+            transaction = Transaction.from_dict(record["data"])
+            if transaction.get("id") not in seen:
+                document["transactions"].append(transaction)
+                seen.add(transaction.get("id"))
+            if "account_balance" in record:
+                document["profile"]["account_balance"] = record["account_balance"]
+        elif record["type"] == "profile":
+            document["profile"].update(record["data"])
+    return document
+
+
+# Running totals kept next to each user's data
+SUMMARY_BUCKETS = ["by_category", "by_upi_app", "by_month", "by_day"]
+
+
+def empty_summary():
+    summary = {"count": 0, "total": 0}
+    for bucket in SUMMARY_BUCKETS:
+        summary[bucket] = {}
+    return summary
+
+
+def summary_keys(transaction):
+    day = timestamps.day_key(transaction["ts"], transaction["tz"])
+    return {
+        "by_category": transaction["category"],
+        "by_upi_app": transaction["upi_app"],
+        "by_month": day[:7],
+        "by_day": day
+    }
+
+
+def add_to_summary(summary, transaction):
+    amount = transaction["amount"]
+    summary["count"] += 1
+    summary["total"] += amount
+    for bucket, key in summary_keys(transaction).items():
+        summary[bucket][key] = summary[bucket].get(key, 0) + amount
+    return summary
+
+
+def summarize(transactions):
+    summary = empty_summary()
+    for t in transactions:
+        add_to_summary(summary, t)
+    return summary
+
+
+# Day and month rollups are split at the latest month with spending: that
+# month is the open period, everything before it is closed
+ROLLUP_BUCKETS = ["by_month", "by_day"]
+
+
+def split_summary(summary):
+    # Returns (open part, closed part). The open part keeps the all-time
+    # totals plus the open month's rollups, the closed part the rest.
+    open_month = max(summary["by_month"], default="")
+    open_part = {key: value for key, value in summary.items() if key not in ROLLUP_BUCKETS}
+    open_part["open_month"] = open_month
+    closed_part = {}
+    for bucket in ROLLUP_BUCKETS:
+        open_part[bucket] = {k: v for k, v in summary[bucket].items() if k[:7] >= open_month}
+        closed_part[bucket] = {k: v for k, v in summary[bucket].items() if k[:7] < open_month}
+    return open_part, closed_part
+
+
+def merge_summary(open_part, closed_part):
+    summary = {key: value for key, value in open_part.items() if key != "open_month"}
+    for bucket in ROLLUP_BUCKETS:
+        summary[bucket] = dict(closed_part.get(bucket, {}), **open_part.get(bucket, {}))
+    return summary
+
+
+def summary_drift(stored, expected, tolerance=0.005):
+    # Lists every total that differs between the stored and recomputed summaries
+    if stored is None:
+        return ["missing"]
+    drift = []
+    if stored["count"] != expected["count"]:
+        drift.append("count")
+    if abs(stored["total"] - expected["total"]) > tolerance:
+        drift.append("total")
+    for bucket in SUMMARY_BUCKETS:
+        stored_bucket = stored.get(bucket, {})
+        expected_bucket = expected[bucket]
+        for key in set(stored_bucket) | set(expected_bucket):
+            if abs(stored_bucket.get(key, 0) - expected_bucket.get(key, 0)) > tolerance:
+                drift.append(f"{bucket}:{key}")
+    return drift
+
+
+def matches_filters(transaction, filters):
+    # date_from is inclusive and date_to exclusive, both local seconds
+    # (timestamps.day_start), so a day means the calendar day where the
+    # transaction was made
+    if filters.get("category") and transaction.get("category") != filters["category"]:
+        return False
+    if filters.get("upi_app") and transaction.get("upi_app") != filters["upi_app"]:
+        return False
+    if filters.get("date_from") is not None or filters.get("date_to") is not None:
+        local = transaction["ts"] + transaction["tz"] * 60
+        if filters.get("date_from") is not None and local < filters["date_from"]:
+            return False
+        if filters.get("date_to") is not None and local >= filters["date_to"]:
+            return False
+    if filters.get("min_amount") is not None and transaction["amount"] < filters["min_amount"]:
+        return False
+    if filters.get("max_amount") is not None and transaction["amount"] > filters["max_amount"]:
+        return False
+    return True
+
+
+class Storage:
+    """Base class for user data backends.
+
+    A user's data is a document of the form {"profile": {...}, "transactions": [...]}.
+    """
+
+    # Whether transaction queries are answered without loading the whole document
+    indexed = False
+    # Whether date-range reads skip the months outside the range when not
+    # given a loaded document
+    ranged = False
+
+    def __init__(self, data_dir, cli_layout=False):
+        self.data_dir = data_dir
+        # The CLI keeps its profile and transactions in two separate files
+        self.cli_layout = cli_layout
+        self._held_locks = threading.local()
+        # Date-ordered view of each user's transactions, for the backends
+        # that answer queries from the loaded document
+        self.date_indexes = HistoryIndexCache(DateIndex.from_transactions, DATE_INDEX_SIZE)
+        # Word index and array columns for search(), per user
+        self.search_indexes = HistoryIndexCache(SearchIndex.from_transactions, SEARCH_INDEX_SIZE)
+        self.search_columns = None
+
+    @contextlib.contextmanager
+    def lock(self, username):
+        # Per-user advisory lock shared by every process using this data
+        # directory. Re-entrant within a thread, so write methods can take it
+        # even when the caller already holds it.
+        held = getattr(self._held_locks, "users", None)
+        if held is None:
+            held = self._held_locks.users = set()
+        if username in held:
+            yield
+            return
+
+        lock_dir = os.path.join(self.data_dir, "locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f"{username}.lock"), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            held.add(username)
+            try:
+                yield
+            finally:
+                held.discard(username)
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def exists(self, username):
+        raise NotImplementedError
+
+    def list_users(self):
+        raise NotImplementedError
+
+    def version(self, username):
+        # A cheap stamp that changes whenever the user's document changes
+        raise NotImplementedError
+
+    def last_modified(self, username):
+        # Epoch seconds of the user's last write, or None if not known
+        return None
+
+    def load(self, username):
+        raise NotImplementedError
+
+    def load_profile(self, username):
+        return self.load(username)["profile"]
+
+    def has_archive(self, username):
+        # Whether some of the user's rows live outside the main document
+        return False
+
+    def save(self, username, data):
+        raise NotImplementedError
+
+    def add_transaction(self, username, data, transaction):
+        # data already contains the new transaction and the updated balance
+        self.add_transactions(username, data, [transaction])
+
+    def add_transactions(self, username, data, transactions):
+        self.save(username, data)
+
+    def insert_transactions(self, username, transactions):
+        # Appends new transactions and deducts them from the balance against
+        # the latest stored data, all under the user's lock
+        with self.lock(username):
+            data = self.load(username)
+            for t in transactions:
+                data["profile"]["account_balance"] -= t["amount"]
+                data["transactions"].append(t)
+            self.add_transactions(username, data, transactions)
+
+    def update_profile(self, username, data):
+        self.save(username, data)
+
+    def read_summary(self, username):
+        raise NotImplementedError
+
+    def write_summary(self, username, summary):
+        raise NotImplementedError
+
+    def compute_summary(self, username, data=None):
+        # Recomputes the totals from the raw transactions
+        if data is None:
+            data = self.load(username)
+        return summarize(data["transactions"])
+
+    def update_summary(self, username, data, transactions):
+        # O(1) in the size of the history: only the buckets of the new transactions change
+        with self.lock(username):
+            summary = self.read_summary(username)
+            if summary is None:
+                self.rebuild_summary(username, data)
+                return
+            for t in transactions:
+                add_to_summary(summary, t)
+            self.write_summary(username, summary)
+
+    def spending_summary(self, username, data=None):
+        # Totals by category, UPI app, month and day plus count and sum,
+        # served from the stored running totals
+        summary = self.read_summary(username)
+        if summary is None:
+            summary = self.rebuild_summary(username, data)
+        return summary
+
+    def month_totals(self, month, usernames=None):
+        # (username, spent in `month`, monthly budget, balance) for every user,
+        # or just `usernames`; spending comes from the running totals
+        rows = []
+        for username in usernames if usernames is not None else self.list_users():
+            spent = self.spending_summary(username)["by_month"].get(month, 0)
+            profile = self.load_profile(username)
+            rows.append((username, spent, profile["monthly_budget"] or 0, profile["account_balance"] or 0))
+        return rows
+
+    def rebuild_summary(self, username, data=None):
+        with self.lock(username):
+            summary = self.compute_summary(username, data)
+            self.write_summary(username, summary)
+        return summary
+
+    def verify_summary(self, username):
+        return summary_drift(self.read_summary(username), self.compute_summary(username))
+
+    def iter_transactions(self, username, filters=None, data=None):
+        # Transactions in insertion order, for streaming exports
+        filters = filters or {}
+        if data is None:
+            data = self.load(username)
+        for t in data["transactions"]:
+            if matches_filters(t, filters):
+                yield t
+
+    def date_index(self, username, data=None):
+        if data is None:
+            data = self.load(username)
+        return self.date_indexes.get(username, data["transactions"])
+
+    def page_transactions(self, username, filters=None, cursor=None, limit=50, data=None):
+        # Newest first in sort_key() order. Returns the page and the cursor
+        # for the next one (None on the last page). Read from the date
+        # index, so only the rows up to the page's last one are looked at.
+        filters = filters or {}
+        match = (lambda t: matches_filters(t, filters)) if filters else None
+        page = self.date_index(username, data).newest(
+            limit + 1, cursor, filters.get("date_from"), filters.get("date_to"), match
+        )
+        return self._split_page(page, limit)
+
+    def transactions_between(self, username, date_from=None, date_to=None, data=None):
+        # Oldest first; the bounds are local seconds as in matches_filters
+        filters = {"date_from": date_from, "date_to": date_to}
+        return self.date_index(username, data).between(
+            date_from, date_to, lambda t: matches_filters(t, filters)
+        )
+
+    def search_index(self, username, data=None):
+        if data is None:
+            data = self.load(username)
+        return self.search_indexes.get(username, data["transactions"])
+
+    def search(self, username, query, filters=None, limit=SEARCH_LIMIT, data=None):
+        # Transactions whose description has a word starting with each term
+        # of `query` and that pass the filters. Returns the newest `limit`
+        # rows and the count and total of all of them.
+        from columnar import TransactionColumns
+        if data is None:
+            data = self.load(username)
+        if self.search_columns is None:
+            self.search_columns = HistoryIndexCache(
+                lambda transactions: TransactionColumns.from_transactions(transactions, [], []),
+                self.search_indexes.max_size
+            )
+        positions = self.search_index(username, data).match(query)
+        columns = self.search_columns.get(username, data["transactions"])
+        return filter_matches(positions, columns, data["transactions"], filters or {}, limit)
+
+    def _split_page(self, page, limit):
+        if len(page) <= limit:
+            return page, None
+        page = page[:limit]
+        return page, sort_key(page[-1])
+
+
+class JSONStorage(Storage):
+    """Whole-document JSON files, rewritten on every change.
+
+    Closed months are moved out of the file into the user's archive, one
+    columnar partition per month, so the file that is rewritten only holds
+    the open month. load() puts the archived rows back in their places.
+    """
+
+    ranged = True
+
+    def __init__(self, data_dir, cli_layout=False):
+        super().__init__(data_dir, cli_layout)
+        self.archives = {}
+        # Parsed files of users with an archive, for reads that skip the archive
+        self.recent_docs = UserDataCache(DATE_INDEX_SIZE)
+
+    def get_user_file(self, username):
+        if self.cli_layout:
+            return os.path.join(self.data_dir, "transactions.json")
+        return os.path.join(self.data_dir, f"{username}_data.json")
+
+    def get_profile_file(self):
+        return os.path.join(self.data_dir, "user_info.json")
+
+    def get_summary_file(self, username):
+        if self.cli_layout:
+            return os.path.join(self.data_dir, "summary.json")
+        return os.path.join(self.data_dir, f"{username}_summary.json")
+
+    def get_rollup_file(self, username):
+        # Day and month totals of closed months, written once when a month closes
+        if self.cli_layout:
+            return os.path.join(self.data_dir, "summary_closed.json")
+        return os.path.join(self.data_dir, f"{username}_summary_closed.json")
+
+    def get_archive_dir(self, username):
+        if self.cli_layout:
+            return os.path.join(self.data_dir, "transactions_archive")
+        return os.path.join(self.data_dir, f"{username}_archive")
+
+    def get_search_file(self, username):
+        if self.cli_layout:
+            return os.path.join(self.data_dir, "search_index.json")
+        return os.path.join(self.data_dir, f"{username}_search.json")
+
+    def get_search_log(self, username):
+        base, _ = os.path.splitext(self.get_search_file(username))
+        return f"{base}.log"
+
+    def exists(self, username):
+        return os.path.exists(self.get_user_file(username))
+
+    def list_users(self):
+        if self.cli_layout:
+            return [CLI_USERNAME] if self.exists(CLI_USERNAME) else []
+        suffix = "_data.json"
+        return sorted(
+            os.path.basename(path)[:-len(suffix)]
+            for path in glob.glob(os.path.join(self.data_dir, f"*{suffix}"))
+        )
+
+    def version(self, username):
+        if self.cli_layout:
+            return (file_stamp(self.get_user_file(username)), file_stamp(self.get_profile_file()))
+        return file_stamp(self.get_user_file(username))
+
+    def last_modified(self, username):
+        if self.cli_layout:
+            return latest_mtime(self.get_user_file(username), self.get_profile_file())
+        return latest_mtime(self.get_user_file(username))
+
+    def read_snapshot(self, username):
+        if self.cli_layout:
+            return {
+                "profile": read_json(self.get_profile_file(), default_profile()),
+                "transactions": from_dicts(read_json(self.get_user_file(username), []))
+            }
+        data = read_json(self.get_user_file(username)) or empty_document()
+        data["transactions"] = from_dicts(data["transactions"])
+        return data
+
+    def read_recent(self, username):
+        # The document without the archived months
+        return self.read_snapshot(username)
+
+    def write_document(self, username, data):
+        if self.cli_layout:
+            write_json(self.get_profile_file(), data["profile"])
+            write_json(self.get_user_file(username), data["transactions"])
+        else:
+            write_json(self.get_user_file(username), data)
+
+    def has_archive(self, username):
+        # Whether any month has been archived, checked without loading NumPy
+        directory = self.get_archive_dir(username)
+        return os.path.isdir(directory) and any(name.endswith(".part") for name in os.listdir(directory))
+
+    def archive(self, username):
+        # Imported on first use, users without an archive never load NumPy
+        from archive import Archive
+        directory = self.get_archive_dir(username)
+        if directory not in self.archives:
+            self.archives[directory] = Archive(directory)
+        return self.archives[directory]
+
+    def write_snapshot(self, username, data):
+        # Partitions are written before the JSON file and stale ones removed
+        # after it, so an interrupted write never loses rows (see Archive.merge)
+        with self.lock(username):
+            if not ARCHIVE_CLOSED_MONTHS:
+                self.write_document(username, data)
+                if os.path.isdir(self.get_archive_dir(username)):
+                    self.archive(username).clear()
+                return
+            open_month = timestamps.this_month()
+            if not os.path.isdir(self.get_archive_dir(username)):
+                # Nothing archived and nothing to archive: plain write, no NumPy
+                start = timestamps.day_start(f"{open_month}-01")
+                if all(t["ts"] + t["tz"] * 60 >= start for t in data["transactions"]):
+                    self.write_document(username, data)
+                    return
+            import archive
+            closed, recent = archive.split(data["transactions"], open_month)
+            self.archive(username).write(closed, open_month)
+            self.write_document(username, dict(data, transactions=recent))
+            self.archive(username).keep(closed)
+
+    def archive_due(self, username, transactions=()):
+        # Whether a write has to go through write_snapshot to move rows
+        # between the file and the archive: a month has closed since the
+        # archive was written, rows for a closed month arrived, or archiving
+        # was switched off and the archive must be folded back.
+        # Only small JSON files are read, so inserts never load NumPy.
+        if not ARCHIVE_CLOSED_MONTHS:
+            return os.path.isdir(self.get_archive_dir(username))
+        this_month = timestamps.this_month()
+        open_month = self.archived_month(username)
+        if open_month is None:
+            # Never archived: due once the user has rows of a closed month,
+            # which the stored rollups tell without reading the rows
+            first_month = self.first_month(username)
+            if first_month is not None and first_month < this_month:
+                return True
+            open_month = this_month
+        elif open_month != this_month:
+            return True
+        return any(timestamps.month_key(t["ts"], t["tz"]) < open_month for t in transactions)
+
+    def archived_month(self, username):
+        # The open month recorded in the archive's manifest (see
+        # Archive.open_month), or None if the user was never archived
+        manifest = read_json(os.path.join(self.get_archive_dir(username), "manifest.json"))
+        return manifest.get("open_month") if manifest else None
+
+    def first_month(self, username):
+        # Earliest month with transactions according to the summary files
+        open_part = read_json(self.get_summary_file(username))
+        if not open_part or not open_part.get("open_month"):
+            return None
+        closed_months = read_json(self.get_rollup_file(username), {}).get("by_month")
+        return min(closed_months) if closed_months else open_part["open_month"]
+
+    def load(self, username):
+        if not self.has_archive(username):
+            return self.read_recent(username)
+        # Held so the archive and the file come from the same write
+        with self.lock(username):
+            data = self.read_recent(username)
+            data["transactions"] = self.archive(username).merge(data["transactions"])
+            return data
+
+    def cached_recent(self, username):
+        # read_recent(), parsed once per stored version. The version is read
+        # first, so a concurrent write can only make the entry look older.
+        version = self.version(username)
+        data = self.recent_docs.get(username, version)
+        if data is None:
+            data = self.read_recent(username)
+            self.recent_docs.put(username, version, data)
+        return data
+
+    def load_profile(self, username):
+        return self.cached_recent(username)["profile"]
+
+    def page_transactions(self, username, filters=None, cursor=None, limit=50, data=None):
+        if data is not None or not self.has_archive(username):
+            return super().page_transactions(username, filters, cursor, limit, data)
+        # Closed months only hold earlier local times than the file, so the
+        # file's rows come first and archived months are read, newest first,
+        # only until the page is full
+        filters = filters or {}
+        date_from, date_to = filters.get("date_from"), filters.get("date_to")
+        match = (lambda t: matches_filters(t, filters)) if filters else None
+        with self.lock(username):
+            recent = self.cached_recent(username)["transactions"]
+            index = self.date_indexes.get((username, "recent"), recent)
+            archive = self.archive(username)
+            start = timestamps.day_start(f"{self.archived_month(username) or timestamps.this_month()}-01")
+            if archive.positions(len(recent)) is None or (index.times and index.times[0] < start):
+                # Left by an interrupted write
+                return super().page_transactions(username, filters, cursor, limit, self.load(username))
+            page = index.newest(limit + 1, cursor, date_from, date_to, match)
+            # Rows newer than the cursor are skipped before they are built
+            upper = date_to
+            if cursor is not None and (upper is None or upper > cursor[0]):
+                upper = cursor[0] + 1
+            for partition in reversed(archive.partitions(archive.months_between(date_from, upper))):
+                if len(page) > limit:
+                    break
+                rows = partition.transactions(partition.select(date_from, upper))
+                page.extend(DateIndex.from_transactions(rows).newest(
+                    limit + 1 - len(page), cursor, date_from, date_to, match
+                ))
+        return self._split_page(page, limit)
+
+    def read_range(self, username, date_from=None, date_to=None):
+        # (position, transaction) pairs in stored order for the archived
+        # months overlapping [date_from, date_to) plus every row still in
+        # the file, or None if the archive's positions don't add up
+        with self.lock(username):
+            recent = self.cached_recent(username)["transactions"]
+            archive = self.archive(username)
+            positions = archive.positions(len(recent))
+            if positions is None:
+                return None
+            pairs = list(zip(positions.tolist(), recent))
+            for partition in archive.partitions(archive.months_between(date_from, date_to)):
+                selected = partition.select(date_from, date_to)
+                pairs.extend(zip(partition.seq[selected].tolist(), partition.transactions(selected)))
+        pairs.sort(key=lambda pair: pair[0])
+        return pairs
+
+    def iter_transactions(self, username, filters=None, data=None):
+        filters = filters or {}
+        pairs = None
+        if data is None and self.has_archive(username) and (
+            filters.get("date_from") is not None or filters.get("date_to") is not None
+        ):
+            pairs = self.read_range(username, filters.get("date_from"), filters.get("date_to"))
+        if pairs is None:
+            yield from super().iter_transactions(username, filters, data)
+            return
+        for _, t in pairs:
+            if matches_filters(t, filters):
+                yield t
+
+    def transactions_between(self, username, date_from=None, date_to=None, data=None):
+        pairs = None
+        if data is None and self.has_archive(username):
+            pairs = self.read_range(username, date_from, date_to)
+        if pairs is None:
+            return super().transactions_between(username, date_from, date_to, data)
+        filters = {"date_from": date_from, "date_to": date_to}
+        return sorted((t for _, t in pairs if matches_filters(t, filters)), key=sort_key)
+
+    def save(self, username, data):
+        with self.lock(username):
+            self.write_snapshot(username, data)
+            self.write_summary(username, summarize(data["transactions"]))
+
+    def add_transactions(self, username, data, transactions):
+        with self.lock(username):
+            if not ARCHIVE_CLOSED_MONTHS or self.archive_due(username, transactions):
+                self.write_snapshot(username, data)
+            else:
+                # Only the open month's file is rewritten
+                recent = self.read_snapshot(username)
+                self.write_document(username, {
+                    "profile": data["profile"],
+                    "transactions": recent["transactions"] + list(transactions)
+                })
+            self.update_summary(username, data, transactions)
+            self.update_search_index(username, transactions, len(data["transactions"]))
+
+    def insert_transactions(self, username, transactions):
+        # Only the open month's file is read and rewritten; the archived
+        # months are loaded only when rows have to move into the archive
+        with self.lock(username):
+            if self.archive_due(username, transactions):
+                super().insert_transactions(username, transactions)
+                return
+            recent = self.read_recent(username)
+            for t in transactions:
+                recent["profile"]["account_balance"] -= t["amount"]
+                recent["transactions"].append(t)
+            self.write_document(username, recent)
+            # Kept so the profile reads that follow (e.g. the alert check)
+            # don't parse the file again; the lock keeps the version ours
+            self.recent_docs.put(username, self.version(username), recent)
+            self.update_summary(username, None, transactions)
+            self.update_search_index(username, transactions)
+
+    def stored_count(self, username):
+        # Number of transactions according to the summary file
+        open_part = read_json(self.get_summary_file(username))
+        return open_part["count"] if open_part else len(self.load(username)["transactions"])
+
+    def read_search_index(self, username):
+        document = read_json(self.get_search_file(username))
+        if document is None:
+            return None
+        return SearchIndex.from_json(document).apply_records(read_log(self.get_search_log(username)))
+
+    def write_search_index(self, username, index):
+        with self.lock(username):
+            write_json(self.get_search_file(username), index.to_json())
+            index.persisted = index.count
+            log_file = self.get_search_log(username)
+            if os.path.exists(log_file):
+                os.remove(log_file)
+
+    def search_index(self, username, data=None):
+        # Read from the index file on first use. Rows it doesn't cover are
+        # indexed in memory, and once they reach an eighth of the file (or
+        # there was no usable file) it is rewritten, which also empties the log.
+        if data is None:
+            data = self.load(username)
+        index = self.search_indexes.get(
+            username, data["transactions"], lambda: self.read_search_index(username)
+        )
+        if index.count and index.count - index.persisted >= max(1, index.persisted // 8):
+            self.write_search_index(username, index)
+        return index
+
+    def update_search_index(self, username, transactions, count=None):
+        # Once a user has an index file, inserts append the new rows'
+        # postings to its log instead of rewriting it. The log is folded
+        # into the file when it reaches LOG_COMPACT_BYTES. count is the
+        # number of rows after the insert, taken from the (already updated)
+        # summary if not given; a wrong one only makes the index be rebuilt.
+        if not transactions or not os.path.exists(self.get_search_file(username)):
+            return
+        if count is None:
+            count = self.stored_count(username)
+        start = count - len(transactions)
+        log_file = self.get_search_log(username)
+        with self.lock(username):
+            append_records(log_file, [{
+                "start": start,
+                "count": count,
+                "last_id": transactions[-1]["id"],
+                "postings": postings_for(start, transactions)
+            }])
+            if os.path.getsize(log_file) >= LOG_COMPACT_BYTES:
+                history = self.load(username)["transactions"]
+                index = self.read_search_index(username)
+                if index is not None and index.follows(history):
+                    index.extend(history[index.count:])
+                    self.write_search_index(username, index)
+
+    def read_summary(self, username):
+        open_part = read_json(self.get_summary_file(username))
+        if open_part is None or "open_month" not in open_part:
+            # Missing, or written before rollups were split
+            return open_part
+        return merge_summary(open_part, read_json(self.get_rollup_file(username), {}))
+
+    def write_summary(self, username, summary):
+        open_part, closed_part = split_summary(summary)
+        # Closed months don't change on normal inserts, so this is usually skipped
+        rollup_file = self.get_rollup_file(username)
+        if read_json(rollup_file, {}) != closed_part:
+            write_json(rollup_file, closed_part)
+        write_json(self.get_summary_file(username), open_part)
+
+    def update_summary(self, username, data, transactions):
+        # Only the open month's rollups are rewritten on insert. The closed
+        # file is touched once when a new month opens, or for backdated rows.
+        with self.lock(username):
+            open_part = read_json(self.get_summary_file(username))
+            open_month = open_part.get("open_month") if open_part else None
+            if open_month is None or any(
+                timestamps.month_key(t["ts"], t["tz"]) < open_month for t in transactions
+            ):
+                super().update_summary(username, data, transactions)
+                return
+            for t in transactions:
+                add_to_summary(open_part, t)
+            if max(open_part["by_month"]) > open_month:
+                # A new month has started: freeze the one that just closed
+                self.write_summary(username, merge_summary(
+                    open_part, read_json(self.get_rollup_file(username), {})
+                ))
+            else:
+                write_json(self.get_summary_file(username), open_part)
+
+    def update_profile(self, username, data):
+        if self.cli_layout:
+            with self.lock(username):
+                write_json(self.get_profile_file(), data["profile"])
+        else:
+            # The profile lives in the file; the archived months are untouched
+            with self.lock(username):
+                recent = self.read_recent(username)
+                recent["profile"] = data["profile"]
+                self.write_document(username, recent)
+                self.recent_docs.put(username, self.version(username), recent)
+
+
+class LogStorage(JSONStorage):
+    """JSON snapshot plus an append-only JSONL log of changes since the snapshot."""
+
+    def __init__(self, data_dir, cli_layout=False, compact_bytes=None):
+        super().__init__(data_dir, cli_layout)
+        self.compact_bytes = LOG_COMPACT_BYTES if compact_bytes is None else compact_bytes
+        # The snapshot's profile, kept until the next compaction
+        self.snapshot_profiles = UserDataCache(DATE_INDEX_SIZE)
+
+    def get_log_file(self, username):
+        base, _ = os.path.splitext(self.get_user_file(username))
+        return f"{base}.log"
+
+    def exists(self, username):
+        return super().exists(username) or os.path.exists(self.get_log_file(username))
+
+    def version(self, username):
+        return (super().version(username), file_stamp(self.get_log_file(username)))
+
+    def last_modified(self, username):
+        times = [super().last_modified(username), latest_mtime(self.get_log_file(username))]
+        return max((t for t in times if t is not None), default=None)
+
+    def read_recent(self, username):
+        data = self.read_snapshot(username)
+        return apply_records(data, read_log(self.get_log_file(username)))
+
+    def save(self, username, data):
+        # A full save is a compaction: the snapshot now holds everything in the log
+        with self.lock(username):
+            self.write_snapshot(username, data)
+            self.write_summary(username, summarize(data["transactions"]))
+            log_file = self.get_log_file(username)
+            if os.path.exists(log_file):
+                os.remove(log_file)
+
+    def compact(self, username):
+        # Held across load and save so no append lands in between and is lost
+        with self.lock(username):
+            self.save(username, self.load(username))
+
+    def maybe_compact(self, username):
+        log_file = self.get_log_file(username)
+        if os.path.exists(log_file) and os.path.getsize(log_file) >= self.compact_bytes:
+            self.compact(username)
+
+    def add_transactions(self, username, data, transactions):
+        self.append_transactions(username, transactions, data["profile"]["account_balance"], data)
+
+    def insert_transactions(self, username, transactions):
+        # Appends without reading the snapshot: the balance before the insert
+        # is the one the log's last record left. Right after a compaction
+        # there is no log yet and the profile is read once.
+        with self.lock(username):
+            balance = self.log_balance(username)
+            if balance is None:
+                balance = self.load_profile(username)["account_balance"]
+            for t in transactions:
+                balance -= t["amount"]
+            self.append_transactions(username, transactions, balance)
+
+    def load_profile(self, username):
+        # The snapshot's profile, parsed once per snapshot, with the log's
+        # profile records and latest balance on top, so appending to the
+        # log never makes the next profile read parse the history again
+        with self.lock(username):
+            stamp = super().version(username)
+            snapshot = self.snapshot_profiles.get(username, stamp)
+            if snapshot is None:
+                snapshot = {"profile": self.read_snapshot(username)["profile"], "transactions": []}
+                self.snapshot_profiles.put(username, stamp, snapshot)
+            profile = snapshot["profile"]
+            for record in read_log(self.get_log_file(username)):
+                if record["type"] == "profile":
+                    profile.update(record["data"])
+                elif "account_balance" in record:
+                    profile["account_balance"] = record["account_balance"]
+            return profile
+
+    def log_balance(self, username):
+        record = read_last_record(self.get_log_file(username))
+        if record is None:
+            return None
+        if record["type"] == "profile":
+            return record["data"].get("account_balance")
+        return record.get("account_balance")
+
+    def append_transactions(self, username, transactions, balance, data=None):
+        # balance is the one after the last of `transactions`. Each record
+        # carries the balance right after its transaction, so a torn tail
+        # still leaves a consistent balance.
+        balances = []
+        for t in reversed(transactions):
+            balances.append(balance)
+            balance += t["amount"]
+        balances.reverse()
+
+        with self.lock(username):
+            append_records(self.get_log_file(username), [
+                {"type": "transaction", "data": t, "account_balance": b}
+                for t, b in zip(transactions, balances)
+            ])
+            self.update_summary(username, data, transactions)
+            self.update_search_index(username, transactions, len(data["transactions"]) if data else None)
+            if self.archive_due(username, transactions):
+                # A month has closed or rows for a closed one arrived:
+                # compacting moves them to the archive
+                self.compact(username)
+            else:
+                self.maybe_compact(username)
+
+    def update_profile(self, username, data):
+        with self.lock(username):
+            append_records(self.get_log_file(username), [{"type": "profile", "data": data["profile"]}])
+            self.maybe_compact(username)
+
+
+# ts is epoch seconds and tz the UTC offset in minutes (see timestamps.py).
+# id has no declared type so the CLI's integer ids and the web app's uuid
+# strings both round-trip unchanged.
+TRANSACTIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        id,
+        ts INTEGER NOT NULL,
+        tz INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        description TEXT,
+        upi_app TEXT,
+        category TEXT
+    );
+"""
+
+
+class SQLiteStorage(Storage):
+    """All users in one SQLite database with per-user indexes."""
+
+    indexed = True
+
+    def __init__(self, data_dir, cli_layout=False, db_file=None):
+        super().__init__(data_dir, cli_layout)
+        self.db_path = os.path.join(data_dir, db_file or SQLITE_FILE)
+        self._local = threading.local()
+        self.create_schema()
+
+    def connect(self):
+        # One connection per thread, sqlite3 connections can't be shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create_schema(self):
+        conn = self.connect()
+        if "date" in self._columns(conn, "transactions"):
+            self._migrate_timestamps(conn)
+        new_search_terms = not self._columns(conn, "search_terms")
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    username TEXT PRIMARY KEY,
+                    name TEXT,
+                    account_balance REAL,
+                    monthly_budget REAL,
+                    parent_email TEXT,
+                    share_with_parents INTEGER,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    modified REAL
+                );
+            """ + TRANSACTIONS_TABLE.format(table="transactions") + """
+                -- amount is included so the GROUP BY queries are answered from the index alone
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_ts ON transactions (username, ts, tz, amount);
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions (username, category, amount);
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_upi_app ON transactions (username, upi_app, amount);
+                -- Keyset pagination walks this index newest first, in local
+                -- time then id as text like date_index.sort_key()
+                DROP INDEX IF EXISTS idx_transactions_user_ts_id;
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_local
+                    ON transactions (username, ts + tz * 60, CAST(id AS TEXT));
+                -- Running totals per user, kind is one of total/category/upi_app/month/day
+                CREATE TABLE IF NOT EXISTS summaries (
+                    username TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    amount REAL NOT NULL,
+                    PRIMARY KEY (username, kind, key)
+                ) WITHOUT ROWID;
+                -- Inverted index of descriptions, one row per word per transaction
+                CREATE TABLE IF NOT EXISTS search_terms (
+                    username TEXT NOT NULL,
+                    token TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (username, token, seq)
+                ) WITHOUT ROWID;
+            """)
+
+            # Databases created before search: index what is already there
+            if new_search_terms:
+                self._index_search_terms(conn, "1", ())
+
+            # Databases created before profiles had a version column
+            if "version" not in self._columns(conn, "profiles"):
+                conn.execute("ALTER TABLE profiles ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            if "modified" not in self._columns(conn, "profiles"):
+                conn.execute("ALTER TABLE profiles ADD COLUMN modified REAL")
+
+    def _columns(self, conn, table):
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+    def _migrate_timestamps(self, conn):
+        # Databases written before times were stored as ts/tz keep a date
+        # string column; the table is rebuilt once, parsing each date with
+        # timestamps.parse. The write lock makes concurrent starts wait and
+        # then find the work done.
+        conn.create_function("parse_ts", 1, lambda date: timestamps.parse(date)[0])
+        conn.create_function("parse_tz", 1, lambda date: timestamps.parse(date)[1])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if "date" in self._columns(conn, "transactions"):
+                conn.execute(TRANSACTIONS_TABLE.format(table="transactions_ts"))
+                conn.execute(
+                    "INSERT INTO transactions_ts (seq, username, id, ts, tz, amount, description, upi_app, category) "
+                    "SELECT seq, username, id, parse_ts(date), parse_tz(date), amount, description, upi_app, category "
+                    "FROM transactions ORDER BY seq"
+                )
+                conn.execute("DROP TABLE transactions")
+                conn.execute("ALTER TABLE transactions_ts RENAME TO transactions")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def exists(self, username):
+        row = self.connect().execute(
+            "SELECT 1 FROM profiles WHERE username = ?", (username,)
+        ).fetchone()
+        return row is not None
+
+    def version(self, username):
+        row = self.connect().execute(
+            "SELECT version FROM profiles WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def last_modified(self, username):
+        row = self.connect().execute(
+            "SELECT modified FROM profiles WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def list_users(self):
+        rows = self.connect().execute("SELECT username FROM profiles ORDER BY username")
+        return [row[0] for row in rows]
+
+    def load_profile(self, username):
+        row = self.connect().execute(
+            "SELECT name, account_balance, monthly_budget, parent_email, share_with_parents "
+            "FROM profiles WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return default_profile()
+        profile = dict(zip(PROFILE_FIELDS, row))
+        profile["share_with_parents"] = bool(profile["share_with_parents"])
+        return profile
+
+    def load(self, username):
+        rows = self.connect().execute(
+            "SELECT id, ts, tz, amount, description, upi_app, category "
+            "FROM transactions WHERE username = ? ORDER BY seq", (username,)
+        )
+        return {
+            "profile": self.load_profile(username),
+            "transactions": [Transaction.from_record(*row) for row in rows]
+        }
+
+    def _write_profile(self, conn, username, profile):
+        # Every write goes through here, so it also bumps the user's version
+        # and records when it happened
+        conn.execute(
+            "INSERT INTO profiles "
+            "(username, name, account_balance, monthly_budget, parent_email, share_with_parents, version, modified) "
+            "VALUES (?, ?, ?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT (username) DO UPDATE SET "
+            "name = excluded.name, account_balance = excluded.account_balance, "
+            "monthly_budget = excluded.monthly_budget, parent_email = excluded.parent_email, "
+            "share_with_parents = excluded.share_with_parents, version = version + 1, "
+            "modified = excluded.modified",
+            (username, profile["name"], profile["account_balance"], profile["monthly_budget"],
+             profile["parent_email"], int(bool(profile["share_with_parents"])), time.time())
+        )
+
+    def _insert_transactions(self, conn, username, transactions):
+        # seq only grows, so the new rows are the ones after the current last
+        # one; the caller's write transaction keeps other writers out
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+        conn.executemany(
+            "INSERT INTO transactions (username, id, ts, tz, amount, description, upi_app, category) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(username, t.get("id"), t["ts"], t["tz"], t["amount"], t.get("description", ""),
+              t.get("upi_app", ""), t.get("category", "")) for t in transactions]
+        )
+        self._index_search_terms(conn, "username = ? AND seq > ?", (username, row[0] if row else 0))
+
+    def _index_search_terms(self, conn, where, params):
+        rows = conn.execute(f"SELECT username, seq, description FROM transactions WHERE {where}", params)
+        conn.executemany(
+            "INSERT OR IGNORE INTO search_terms (username, token, seq) VALUES (?, ?, ?)",
+            ((username, word, seq) for username, seq, description in rows for word in tokenize(description))
+        )
+
+    def save(self, username, data):
+        conn = self.connect()
+        with conn:
+            self._write_profile(conn, username, data["profile"])
+            conn.execute("DELETE FROM transactions WHERE username = ?", (username,))
+            conn.execute("DELETE FROM search_terms WHERE username = ?", (username,))
+            self._insert_transactions(conn, username, data["transactions"])
+            self._write_summary(conn, username, summarize(data["transactions"]))
+
+    def add_transactions(self, username, data, transactions):
+        conn = self.connect()
+        with conn:
+            self._write_profile(conn, username, data["profile"])
+            self._insert_transactions(conn, username, transactions)
+            self._add_to_summary(conn, username, transactions)
+
+    def insert_transactions(self, username, transactions):
+        # Only the profile is read, never the existing transactions
+        with self.lock(username):
+            profile = self.load_profile(username)
+            profile["account_balance"] -= sum(t["amount"] for t in transactions)
+            conn = self.connect()
+            with conn:
+                self._write_profile(conn, username, profile)
+                self._insert_transactions(conn, username, transactions)
+                self._add_to_summary(conn, username, transactions)
+
+    def _add_to_summary(self, conn, username, transactions):
+        # Totals for the batch are added up first, so each bucket is one upsert
+        deltas = {}
+        for t in transactions:
+            keys = [("total", "")] + [(bucket[len("by_"):], key) for bucket, key in summary_keys(t).items()]
+            for kind_key in keys:
+                delta = deltas.setdefault(kind_key, [0, 0])
+                delta[0] += 1
+                delta[1] += t["amount"]
+        conn.executemany(
+            "INSERT INTO summaries (username, kind, key, count, amount) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (username, kind, key) DO UPDATE SET "
+            "count = count + excluded.count, amount = amount + excluded.amount",
+            [(username, kind, key, count, amount) for (kind, key), (count, amount) in deltas.items()]
+        )
+
+    def _write_summary(self, conn, username, summary):
+        conn.execute("DELETE FROM summaries WHERE username = ?", (username,))
+        rows = [(username, "total", "", summary["count"], summary["total"])]
+        for bucket in SUMMARY_BUCKETS:
+            kind = bucket[len("by_"):]
+            # Per-bucket counts aren't part of the summary document
+            rows.extend((username, kind, key, 0, amount) for key, amount in summary[bucket].items())
+        conn.executemany(
+            "INSERT INTO summaries (username, kind, key, count, amount) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def read_summary(self, username):
+        rows = self.connect().execute(
+            "SELECT kind, key, count, amount FROM summaries WHERE username = ?", (username,)
+        ).fetchall()
+        summary = empty_summary()
+        found = False
+        for kind, key, count, amount in rows:
+            if kind == "total":
+                summary["count"] = count
+                summary["total"] = amount
+                found = True
+            else:
+                summary[f"by_{kind}"][key] = amount
+        return summary if found else None
+
+    def write_summary(self, username, summary):
+        conn = self.connect()
+        with conn:
+            self._write_summary(conn, username, summary)
+
+    def month_totals(self, month, usernames=None):
+        # One indexed join over profiles and the month's running totals
+        query = (
+            "SELECT p.username, COALESCE(s.amount, 0), COALESCE(p.monthly_budget, 0), "
+            "COALESCE(p.account_balance, 0) FROM profiles p "
+            "LEFT JOIN summaries s ON s.username = p.username AND s.kind = 'month' AND s.key = ?"
+        )
+        if usernames is None:
+            return self.connect().execute(query + " ORDER BY p.username", (month,)).fetchall()
+        rows = []
+        for username in usernames:
+            rows.extend(self.connect().execute(query + " WHERE p.username = ?", (month, username)))
+        return rows
+
+    def update_profile(self, username, data):
+        conn = self.connect()
+        with conn:
+            self._write_profile(conn, username, data["profile"])
+
+    def _filter_clauses(self, username, filters):
+        clauses = ["username = ?"]
+        params = [username]
+        for field in ("category", "upi_app"):
+            if filters.get(field):
+                clauses.append(f"{field} = ?")
+                params.append(filters[field])
+        # The date filters are local seconds; the bounds on ts alone, widened
+        # by the largest UTC offset, let the (username, ts) index narrow the scan
+        if filters.get("date_from") is not None:
+            clauses.append("ts >= ? AND ts + tz * 60 >= ?")
+            params.extend([filters["date_from"] - timestamps.MAX_OFFSET * 60, filters["date_from"]])
+        if filters.get("date_to") is not None:
+            clauses.append("ts < ? AND ts + tz * 60 < ?")
+            params.extend([filters["date_to"] + timestamps.MAX_OFFSET * 60, filters["date_to"]])
+        if filters.get("min_amount") is not None:
+            clauses.append("amount >= ?")
+            params.append(filters["min_amount"])
+        if filters.get("max_amount") is not None:
+            clauses.append("amount <= ?")
+            params.append(filters["max_amount"])
+        return clauses, params
+
+    def iter_transactions(self, username, filters=None, data=None):
+        # Rows are fetched from the cursor in batches, never all at once.
+        # A separate connection keeps the read open while the caller streams.
+        clauses, params = self._filter_clauses(username, filters or {})
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cursor = conn.execute(
+                "SELECT id, ts, tz, amount, description, upi_app, category FROM transactions "
+                f"WHERE {' AND '.join(clauses)} ORDER BY seq",
+                params
+            )
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(RECORD_FIELDS, row))
+        finally:
+            conn.close()
+
+    def page_transactions(self, username, filters=None, cursor=None, limit=50, data=None):
+        # Only one page of rows is read, however long the history is
+        clauses, params = self._filter_clauses(username, filters or {})
+        if cursor is not None:
+            # Spelled out rather than as a row value so SQLite seeks the index
+            clauses.append("ts + tz * 60 <= ? AND (ts + tz * 60 < ? OR CAST(id AS TEXT) < ?)")
+            params.extend([cursor[0], cursor[0], str(cursor[1])])
+        params.append(limit + 1)
+
+        rows = self.connect().execute(
+            "SELECT id, ts, tz, amount, description, upi_app, category FROM transactions "
+            f"WHERE {' AND '.join(clauses)} ORDER BY ts + tz * 60 DESC, CAST(id AS TEXT) DESC LIMIT ?",
+            params
+        )
+        page = [Transaction.from_record(*row) for row in rows]
+        return self._split_page(page, limit)
+
+    def transactions_between(self, username, date_from=None, date_to=None, data=None):
+        clauses, params = self._filter_clauses(username, {"date_from": date_from, "date_to": date_to})
+        rows = self.connect().execute(
+            "SELECT id, ts, tz, amount, description, upi_app, category FROM transactions "
+            f"WHERE {' AND '.join(clauses)} ORDER BY ts + tz * 60, CAST(id AS TEXT)",
+            params
+        )
+        return [Transaction.from_record(*row) for row in rows]
+
+    def search(self, username, query, filters=None, limit=SEARCH_LIMIT, data=None):
+        # Each term is a range scan of the user's words in search_terms; the
+        # transactions in all of them are then looked up and filtered
+        words = tokenize(query)
+        if not words:
+            return {"rows": [], "count": 0, "total": 0.0}
+        clauses, params = self._filter_clauses(username, filters or {})
+        # Unary + keeps SQLite off the (username, ...) indexes, so the scan
+        # starts from the matched seqs rather than every row of the user
+        clauses[0] = "+username = ?"
+        for word in words:
+            clauses.append(
+                "seq IN (SELECT seq FROM search_terms WHERE username = ? AND token >= ? AND token < ?)"
+            )
+            params.extend([username, word, word + PREFIX_END])
+        where = " AND ".join(clauses)
+
+        conn = self.connect()
+        count, total = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM transactions WHERE {where}", params
+        ).fetchone()
+        rows = conn.execute(
+            "SELECT id, ts, tz, amount, description, upi_app, category FROM transactions "
+            f"WHERE {where} ORDER BY ts + tz * 60 DESC, CAST(id AS TEXT) DESC LIMIT ?",
+            params + [limit]
+        )
+        return {"rows": [Transaction.from_record(*row) for row in rows], "count": count, "total": total}
+
+    def compute_summary(self, username, data=None):
+        # Recomputed with indexed GROUP BY queries rather than loading every row
+        conn = self.connect()
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM transactions WHERE username = ?",
+            (username,)
+        ).fetchone()
+        by_category = conn.execute(
+            "SELECT category, SUM(amount) FROM transactions WHERE username = ? GROUP BY category",
+            (username,)
+        ).fetchall()
+        by_upi_app = conn.execute(
+            "SELECT upi_app, SUM(amount) FROM transactions WHERE username = ? GROUP BY upi_app",
+            (username,)
+        ).fetchall()
+        by_month = conn.execute(
+            "SELECT strftime('%Y-%m', ts + tz * 60, 'unixepoch') AS month, SUM(amount) FROM transactions "
+            "WHERE username = ? GROUP BY month",
+            (username,)
+        ).fetchall()
+        by_day = conn.execute(
+            "SELECT date(ts + tz * 60, 'unixepoch') AS day, SUM(amount) FROM transactions "
+            "WHERE username = ? GROUP BY day",
+            (username,)
+        ).fetchall()
+        return {
+            "count": count,
+            "total": total,
+            "by_category": dict(by_category),
+            "by_upi_app": dict(by_upi_app),
+            "by_month": dict(by_month),
+            "by_day": dict(by_day)
+        }
+
+
+STORAGE_BACKENDS = {
+    "json": JSONStorage,
+    "log": LogStorage,
+    "sqlite": SQLiteStorage
+}
+
+
+def get_storage(data_dir, cli_layout=False, mode=None):
+    mode = mode or STORAGE_MODE
+    if mode not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage mode: {mode}")
+    return STORAGE_BACKENDS[mode](data_dir, cli_layout=cli_layout)
+
+
+def migrate_json_to_sqlite(data_dir, db_file=None):
+    # One-shot import of the web app's per-user files and the CLI's files,
+    # and of the web accounts, which the app reads from the same database.
+    # Reading through LogStorage picks up any pending log records as well.
+    # Returns the migrated usernames and the number of accounts added.
+    import user_registry
+    target = SQLiteStorage(data_dir, db_file=db_file)
+    migrated = []
+
+    web_source = LogStorage(data_dir)
+    suffix = "_data.json"
+    for path in sorted(glob.glob(os.path.join(data_dir, f"*{suffix}"))):
+        username = os.path.basename(path)[:-len(suffix)]
+        target.save(username, web_source.load(username))
+        migrated.append(username)
+
+    cli_source = LogStorage(data_dir, cli_layout=True)
+    if cli_source.exists(CLI_USERNAME):
+        target.save(CLI_USERNAME, cli_source.load(CLI_USERNAME))
+        migrated.append(CLI_USERNAME)
+
+    return migrated, user_registry.migrate_to_sqlite(data_dir, db_file)
+
+
+def compact_all(data_dir):
+    # Rewrites every JSON user (web and CLI) from its snapshot plus log.
+    # This also moves closed months to the archive, or folds the archive
+    # back in with UPI_ARCHIVE=0.
+    compacted = []
+    for cli_layout in (False, True):
+        store = LogStorage(data_dir, cli_layout=cli_layout)
+        for username in store.list_users():
+            store.compact(username)
+            compacted.append(username)
+    return compacted
+
+
+def migrate_timestamps(data_dir, db_file=None):
+    # Rewrites the JSON files (folding in any log) so every transaction is
+    # stored as ts/tz instead of a date string. Loading already accepts both,
+    # this just saves parsing the dates again on every load. A SQLite
+    # database is converted as soon as it is opened.
+    migrated = compact_all(data_dir)
+    if os.path.exists(os.path.join(data_dir, db_file or SQLITE_FILE)):
+        SQLiteStorage(data_dir, db_file=db_file)
+    return migrated
+
+
+def check_summaries(data_dir, rebuild=False):
+    # Recompute every user's running totals from the raw transactions and
+    # report (or fix) any that have drifted
+    results = {}
+    for cli_layout in (False, True):
+        store = get_storage(data_dir, cli_layout=cli_layout)
+        for username in store.list_users():
+            drift = store.verify_summary(username)
+            if drift and rebuild:
+                store.rebuild_summary(username)
+            results[username] = drift
+        if isinstance(store, SQLiteStorage):
+            # The CLI shares the same database
+            break
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UPI Tracker storage maintenance")
+    parser.add_argument("command", choices=[
+        "migrate", "migrate-users", "migrate-timestamps", "archive-months", "verify-summaries", "rebuild-summaries"
+    ])
+    parser.add_argument("data_dir", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        users, accounts = migrate_json_to_sqlite(args.data_dir)
+        print(f"Migrated {len(users)} user(s) and {accounts} account(s) into "
+              f"{os.path.join(args.data_dir, SQLITE_FILE)}")
+    elif args.command == "migrate-users":
+        import user_registry
+        added = user_registry.migrate_users_json(args.data_dir)
+        print(f"Added {added} account(s) from users.json to the user registry")
+    elif args.command == "migrate-timestamps":
+        users = migrate_timestamps(args.data_dir)
+        print(f"Rewrote {len(users)} user(s) with epoch timestamps")
+    elif args.command == "archive-months":
+        users = compact_all(args.data_dir)
+        print(f"Archived closed months for {len(users)} user(s)")
+    else:
+        results = check_summaries(args.data_dir, rebuild=args.command == "rebuild-summaries")
+        drifted = {username: drift for username, drift in results.items() if drift}
+        for username, drift in drifted.items():
+            print(f"{username}: {len(drift)} total(s) out of date ({', '.join(drift[:5])})")
+        print(f"Checked {len(results)} user(s), {len(drifted)} with drift"
+              + (", rebuilt" if drifted and args.command == "rebuild-summaries" else ""))
+        if drifted and args.command == "verify-summaries":
+            sys.exit(1)
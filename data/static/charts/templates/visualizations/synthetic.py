@@ -0,0 +1,212 @@
+"""Deterministic synthetic users and transactions for benchmarks.
+
+The same seed, end date and sizes always produce the same data. Category,
+UPI app, amount and time-of-day distributions roughly follow a student's
+UPI spending: lots of small food and travel payments, fewer large shopping
+and education ones, mostly in the daytime and a little more at weekends.
+
+    python synthetic.py data --users 10 --transactions 100000
+    python synthetic.py data --users 1 --transactions 10000000 --backend sqlite
+    python synthetic.py data --cli --transactions 50000
+"""
+import os
+import math
+import uuid
+import random
+import argparse
+import datetime
+
+import storage
+import timestamps
+import user_registry
+from storage import CLI_USERNAME
+from transaction import Transaction
+
+# Share of transactions per category, and lognormal (median ₹, sigma) amounts
+CATEGORY_WEIGHTS = {
+    "Food": 0.30, "Transportation": 0.16, "Shopping": 0.14, "Entertainment": 0.10,
+    "Education": 0.07, "Utilities": 0.10, "Health": 0.05, "Other": 0.08
+}
+CATEGORY_AMOUNTS = {
+    "Food": (120, 0.6), "Transportation": (70, 0.7), "Shopping": (650, 0.8), "Entertainment": (300, 0.6),
+    "Education": (500, 0.8), "Utilities": (400, 0.5), "Health": (350, 0.7), "Other": (200, 0.9)
+}
+APP_WEIGHTS = {
+    "PhonePe": 0.36, "Google Pay": 0.34, "Paytm": 0.14, "Amazon Pay": 0.06,
+    "BHIM": 0.04, "WhatsApp Pay": 0.03, "Other": 0.03
+}
+DESCRIPTIONS = {
+    "Food": ["Campus canteen", "Swiggy order", "Zomato order", "Chai and snacks", "Grocery store", "Juice shop"],
+    "Transportation": ["Auto fare", "Bus pass", "Metro card recharge", "Uber ride", "Ola ride", "Petrol"],
+    "Shopping": ["Amazon order", "Flipkart order", "Clothes", "Stationery", "Myntra order"],
+    "Entertainment": ["Movie tickets", "Spotify subscription", "Netflix subscription", "Gaming top-up", "Concert"],
+    "Education": ["Textbook", "Course fee", "Printing and xerox", "Exam fee", "Online course"],
+    "Utilities": ["Mobile recharge", "Electricity bill", "WiFi bill", "Hostel laundry"],
+    "Health": ["Pharmacy", "Doctor visit", "Gym membership", "Lab test"],
+    "Other": ["Paid to friend", "Gift", "Donation", "Miscellaneous"]
+}
+# Relative activity by hour of day; nights are quiet
+HOUR_WEIGHTS = [
+    0.1, 0.05, 0.02, 0.02, 0.02, 0.05, 0.2, 0.5, 0.9, 1.0, 1.0, 1.1,
+    1.6, 1.5, 1.0, 0.9, 1.0, 1.2, 1.4, 1.5, 1.6, 1.3, 0.8, 0.3
+]
+WEEKEND_FACTOR = 1.3
+
+
+def _cumulative(weights):
+    total = 0
+    cumulative = []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+CATEGORIES = list(CATEGORY_WEIGHTS)
+CATEGORY_CUMULATIVE = _cumulative(CATEGORY_WEIGHTS.values())
+UPI_APPS = list(APP_WEIGHTS)
+APP_CUMULATIVE = _cumulative(APP_WEIGHTS.values())
+HOUR_CUMULATIVE = _cumulative(HOUR_WEIGHTS)
+HOURS = list(range(24))
+
+
+def generate_transactions(count, seed=0, end=None, days=365, cli=False):
+    """Yields `count` transactions in date order over the `days` days up to
+    and including `end`.
+
+    Rows are shared out between days by activity (weekends get more) and
+    placed within each day by hour of day, so histories of any size cover
+    the same period. Only one day's times are held at once.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.datetime.combine(datetime.date.today(), datetime.time())
+    first_day = datetime.datetime.combine(end.date(), datetime.time()) - datetime.timedelta(days=days - 1)
+    tz = timestamps.DEFAULT_TZ
+
+    day_weights = [
+        WEEKEND_FACTOR if (first_day + datetime.timedelta(days=day)).weekday() >= 5 else 1.0
+        for day in range(days)
+    ]
+    total_weight = sum(day_weights)
+
+    i = 0
+    allocated = 0
+    running_weight = 0.0
+    for day, weight in enumerate(day_weights):
+        # Cumulative rounding, so the days add up to exactly `count`
+        running_weight += weight
+        day_count = round(count * running_weight / total_weight) - allocated
+        allocated += day_count
+        if not day_count:
+            continue
+
+        day_start = timestamps.parse(first_day + datetime.timedelta(days=day), tz)[0]
+        hours = rng.choices(HOURS, cum_weights=HOUR_CUMULATIVE, k=day_count)
+        offsets = sorted(hour * 3600 + rng.randrange(3600) for hour in hours)
+        for offset in offsets:
+            i += 1
+            yield _transaction(rng, i, day_start + offset, tz, cli)
+
+
+def _transaction(rng, number, ts, tz, cli):
+    category = rng.choices(CATEGORIES, cum_weights=CATEGORY_CUMULATIVE)[0]
+    median, sigma = CATEGORY_AMOUNTS[category]
+    amount = round(max(1.0, rng.lognormvariate(math.log(median), sigma)), 2)
+
+    return Transaction(
+        id=number if cli else str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        ts=ts,
+        tz=tz,
+        amount=amount,
+        description=rng.choice(DESCRIPTIONS[category]),
+        upi_app=rng.choices(UPI_APPS, cum_weights=APP_CUMULATIVE)[0],
+        category=category
+    )
+
+
+def synthetic_profile(name, balance=1000000.0):
+    profile = storage.default_profile()
+    profile.update({
+        "name": name,
+        "account_balance": balance,
+        "monthly_budget": 15000,
+        "parent_email": f"parent.{name}@example.com",
+        "share_with_parents": True
+    })
+    return profile
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def populate_user(store, username, count, seed=0, end=None, days=365, cli=False, chunk_rows=50000):
+    rows = generate_transactions(count, seed, end, days, cli)
+    store.save(username, {"profile": synthetic_profile(username), "transactions": []})
+    if store.indexed:
+        # Indexed backends take the rows in chunks without reading them back
+        for chunk in _chunks(rows, chunk_rows):
+            store.insert_transactions(username, chunk)
+    else:
+        transactions = list(rows)
+        profile = synthetic_profile(username)
+        profile["account_balance"] -= sum(t.amount for t in transactions)
+        store.save(username, {"profile": profile, "transactions": transactions})
+
+
+def populate(data_dir, users=10, transactions=1000, seed=0, end=None, days=365,
+             mode=None, password="password", cli_transactions=0):
+    """Creates `users` web users (user0001, ...) with `transactions` each, all
+    sharing `password`, plus the CLI's data if `cli_transactions` is set.
+    Returns the usernames."""
+    from werkzeug.security import generate_password_hash
+
+    os.makedirs(data_dir, exist_ok=True)
+    store = storage.get_storage(data_dir, mode=mode)
+    usernames = [f"user{i + 1:04d}" for i in range(users)]
+    for i, username in enumerate(usernames):
+        populate_user(store, username, transactions, seed + i, end, days)
+
+    # One hash shared by every user keeps setup fast
+    password_hash = generate_password_hash(password)
+    created_at = (end or datetime.datetime.now()).isoformat()
+    accounts = user_registry.get_user_registry(data_dir, mode)
+    for username in usernames:
+        accounts.create(username, {"password_hash": password_hash, "created_at": created_at})
+
+    if cli_transactions:
+        cli_store = storage.get_storage(data_dir, cli_layout=True, mode=mode)
+        populate_user(cli_store, CLI_USERNAME, cli_transactions, seed + users, end, days, cli=True)
+
+    return usernames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic UPI Tracker data")
+    parser.add_argument("data_dir", help="Data directory to fill (existing users are overwritten)")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=1000, help="Transactions per user")
+    parser.add_argument("--cli", action="store_true", help="Generate the CLI's data instead of web users")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", help="Last day of the history, YYYY-MM-DD (default today)")
+    parser.add_argument("--days", type=int, default=365, help="Days of history")
+    parser.add_argument("--backend", choices=sorted(storage.STORAGE_BACKENDS), help="Defaults to UPI_STORAGE")
+    args = parser.parse_args()
+
+    end = datetime.datetime.strptime(args.end, "%Y-%m-%d") if args.end else None
+    if args.cli:
+        store = storage.get_storage(args.data_dir, cli_layout=True, mode=args.backend)
+        os.makedirs(args.data_dir, exist_ok=True)
+        populate_user(store, CLI_USERNAME, args.transactions, args.seed, end, args.days, cli=True)
+        print(f"Generated {args.transactions} CLI transactions in {args.data_dir}")
+    else:
+        usernames = populate(args.data_dir, args.users, args.transactions, args.seed, end, args.days, args.backend)
+        print(f"Generated {len(usernames)} users x {args.transactions} transactions in {args.data_dir} "
+              f"(password: password)")
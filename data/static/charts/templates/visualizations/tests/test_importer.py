@@ -0,0 +1,60 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import importer
+import storage
+import timestamps
+
+
+class ImportDatesTest(unittest.TestCase):
+    # One bad date or a mix of date and date-time layouts must not cost the
+    # other rows their dates
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.store = storage.get_storage(self.data_dir, mode="json")
+
+    def write_csv(self, lines):
+        path = os.path.join(self.data_dir, "statement.csv")
+        with open(path, 'w') as f:
+            f.write("Date,Amount,Description\n" + "".join(line + "\n" for line in lines))
+        return path
+
+    def import_csv(self, lines, **options):
+        stats = importer.import_statement(self.store, "alice", self.write_csv(lines), ["Food", "Other"], **options)
+        dates = sorted(
+            datetime.datetime.fromtimestamp(timestamps.local_seconds(t["ts"], t["tz"]), datetime.timezone.utc)
+            .replace(tzinfo=None) for t in self.store.load("alice")["transactions"]
+        )
+        return stats, dates
+
+    def test_bad_row_is_reported_and_the_rest_imported(self):
+        stats, dates = self.import_csv([
+            "05/03/2025,100,Tea",
+            "06/03/2025 14:30,200,Lunch",
+            "not a date,50,Junk",
+            "07/03/2025,300,Books"
+        ])
+        self.assertEqual(stats["imported"], 3)
+        self.assertEqual(stats["skipped"], 1)
+        self.assertEqual(stats["unreadable_dates"], [4])
+        self.assertEqual(dates, [
+            datetime.datetime(2025, 3, 5), datetime.datetime(2025, 3, 6, 14, 30), datetime.datetime(2025, 3, 7)
+        ])
+        self.assertIn("4", importer.unreadable_dates_message(stats))
+
+    def test_layouts_outside_the_sample(self):
+        lines = ["05/03/2025,10,Tea"] * (importer.DATE_SAMPLE_ROWS + 50)
+        lines += ["2025-03-08,20,Books", "8 Mar 2025 18:45,30,Dinner", "??,40,Junk", ",50,No date"]
+        stats, dates = self.import_csv(lines, chunk_rows=100)
+        self.assertEqual(stats["imported"], len(lines) - 2)
+        self.assertEqual(stats["unreadable_dates"], [len(lines)])
+        self.assertEqual(dates[-2:], [datetime.datetime(2025, 3, 8), datetime.datetime(2025, 3, 8, 18, 45)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import datetime
+import tempfile
+import unittest
+from unittest import mock
+
+import storage
+import timestamps
+import user_registry
+from transaction import Transaction
+
+
+class MigrateToSQLiteTest(unittest.TestCase):
+    # Accounts and data made with the JSON backend must still log in after
+    # `python storage.py migrate` and a switch to UPI_STORAGE=sqlite
+
+    def setUp(self):
+        import app
+
+        self.app = app
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+        created_at = datetime.datetime.now().isoformat()
+        # alice registered after users.json was moved into data/users/
+        user_registry.ShardedUserRegistry(self.data_dir).create("alice", {
+            "password_hash": app.hasher.generate("alice-password"), "created_at": created_at
+        })
+        # bob is still in a users.json the app never got to migrate
+        with open(os.path.join(self.data_dir, user_registry.LEGACY_USERS_FILE), 'w') as f:
+            json.dump({"bob": {"password_hash": app.hasher.generate("bob-password"),
+                               "created_at": created_at}}, f)
+
+        ts, tz = timestamps.now()
+        json_storage = storage.get_storage(self.data_dir, mode="json")
+        document = storage.empty_document()
+        document["transactions"].append(Transaction(
+            id="t1", ts=ts, tz=tz, amount=25, description="Chai", upi_app="Paytm", category="Food"
+        ))
+        json_storage.save("alice", document)
+
+    def login(self, username, password):
+        client = self.app.app.test_client()
+        response = client.post('/login', data={"username": username, "password": password})
+        with client.session_transaction() as session:
+            return response, session.get('username')
+
+    def test_accounts_log_in_after_migrate(self):
+        users, accounts = storage.migrate_json_to_sqlite(self.data_dir)
+        self.assertEqual(users, ["alice"])
+        self.assertEqual(accounts, 2)
+
+        registry = user_registry.get_user_registry(self.data_dir, mode="sqlite")
+        store = storage.get_storage(self.data_dir, mode="sqlite")
+        for patcher in (mock.patch.object(self.app, "user_accounts", registry),
+                        mock.patch.object(self.app, "user_storage", store)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        for username in ("alice", "bob"):
+            response, logged_in = self.login(username, f"{username}-password")
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.location.endswith('/dashboard'))
+            self.assertEqual(logged_in, username)
+
+        response, logged_in = self.login("alice", "wrong-password")
+        self.assertTrue(response.location.endswith('/login'))
+        self.assertIsNone(logged_in)
+        self.assertEqual(len(store.load("alice")["transactions"]), 1)
+
+    def test_migrate_runs_again(self):
+        storage.migrate_json_to_sqlite(self.data_dir)
+        _, accounts = storage.migrate_json_to_sqlite(self.data_dir)
+        self.assertEqual(accounts, 0)
+        registry = user_registry.SQLiteUserRegistry(self.data_dir)
+        self.assertEqual(registry.usernames(), ["alice", "bob"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import storage
+import timestamps
+from columnar import TransactionColumns
+from transaction import Transaction
+
+
+def make_transactions(count, apps):
+    ts, tz = timestamps.now()
+    return [
+        Transaction(id=f"t{i}", ts=ts - i, tz=tz, amount=i + 1, description=f"Uber ride {i}",
+                    upi_app=apps[i % len(apps)], category="Transportation")
+        for i in range(count)
+    ]
+
+
+class ManyLabelsTest(unittest.TestCase):
+    # More UPI app labels than a uint8 code can hold
+
+    apps = [f"App {i}" for i in range(300)]
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def test_codes_widen_past_255(self):
+        columns = TransactionColumns.from_transactions(make_transactions(600, self.apps[:200]), [], [])
+        columns.extend(make_transactions(600, self.apps)[200:300])
+        self.assertEqual(len(columns.upi_apps), 300)
+        self.assertEqual(columns.upi_apps[columns.upi_app[columns.count - 1]], "App 299")
+        self.assertEqual(columns.totals_by_app()["App 299"], 300)
+
+    def test_search_filters_on_high_codes(self):
+        store = storage.get_storage(self.data_dir, mode="json")
+        transactions = make_transactions(600, self.apps)
+        store.save("alice", {"profile": storage.default_profile(), "transactions": transactions})
+
+        for app in ("App 0", "App 256", "App 299"):
+            result = store.search("alice", "uber", {"upi_app": app})
+            expected = [t for t in transactions if t["upi_app"] == app]
+            self.assertEqual(result["count"], len(expected))
+            self.assertEqual({t["id"] for t in result["rows"]}, {t["id"] for t in expected})
+
+
+class AddTransactionAppTest(unittest.TestCase):
+
+    def test_unknown_upi_app_is_rejected(self):
+        import app
+
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        store = storage.get_storage(data_dir, mode="json")
+        for patcher in (mock.patch.object(app, "user_storage", store),
+                        mock.patch.object(app.group_committer, "storage", store)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['username'] = "upi-app-check"
+        response = client.post('/add_transaction', data={
+            "amount": "10", "description": "Uber ride", "upi_app": "App 256", "category": "Transportation"
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/add_transaction'))
+        self.assertFalse(store.exists("upi-app-check"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Transaction times, stored as epoch seconds plus a UTC offset.
+
+`ts` is the instant (seconds since 1970-01-01 UTC) and `tz` the offset in
+minutes the transaction was entered in, e.g. 330 for IST. Calendar keys
+(days, months, date filters) use the wall-clock time there, ts + tz * 60,
+which this module calls local seconds. Every path that reads or writes a
+date goes through parse() and the formatters below, so nothing has to guess
+a date format.
+"""
+
+import os
+import time
+import datetime
+from functools import lru_cache
+
+SECONDS_PER_DAY = 86400
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+# UTC offsets run from -12:00 to +14:00
+MAX_OFFSET = 14 * 60
+
+
+def _local_offset():
+    # This machine's current UTC offset in minutes
+    return -(time.altzone if time.daylight and time.localtime().tm_isdst > 0 else time.timezone) // 60
+
+
+# Offset given to dates that don't carry one (the web form, CLI input,
+# imported statements and files written before timestamps were stored)
+DEFAULT_TZ = int(os.environ.get("UPI_TZ_OFFSET", _local_offset()))
+
+
+def parse(value, tz=None):
+    """Returns (ts, tz) for an ISO 8601 date string or a datetime.
+
+    Accepts the layouts the tracker has written: "2025-03-13T10:22:01.123456",
+    "2025-03-13 10:22:01", a bare "2025-03-13", and any of them with a UTC
+    offset. Naive values are taken to be in `tz` (DEFAULT_TZ if not given).
+    Fractions of a second are dropped.
+    """
+    moment = value if isinstance(value, datetime.datetime) else datetime.datetime.fromisoformat(value)
+    offset = moment.utcoffset()
+    if offset is not None:
+        tz = int(offset.total_seconds()) // 60
+    elif tz is None:
+        tz = DEFAULT_TZ
+    local = ((moment.toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+             + moment.hour * 3600 + moment.minute * 60 + moment.second)
+    return local - tz * 60, tz
+
+
+def now(tz=None):
+    tz = DEFAULT_TZ if tz is None else tz
+    return int(time.time()), tz
+
+
+def local_seconds(ts, tz):
+    return ts + tz * 60
+
+
+def this_month(tz=None):
+    return month_key(*now(tz))
+
+
+@lru_cache(maxsize=8192)
+def _day_string(day):
+    # "YYYY-MM-DD" for a day number (days since 1970-01-01); a few thousand
+    # distinct days cover any user's history, so this is a dict lookup
+    return datetime.date.fromordinal(EPOCH_ORDINAL + day).isoformat()
+
+
+# "HH:MM" for every minute of the day and "SS" for every second, so
+# formatting a time is two list lookups
+_MINUTES = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)]
+_SECONDS = [f"{second:02d}" for second in range(60)]
+
+
+@lru_cache(maxsize=64)
+def _offset_string(tz):
+    sign = "-" if tz < 0 else "+"
+    return f"{sign}{abs(tz) // 60:02d}:{abs(tz) % 60:02d}"
+
+
+def day_key(ts, tz):
+    return _day_string((ts + tz * 60) // SECONDS_PER_DAY)
+
+
+def month_key(ts, tz):
+    return _day_string((ts + tz * 60) // SECONDS_PER_DAY)[:7]
+
+
+def to_iso(ts, tz, offset=True, sep="T"):
+    # "2025-03-13T10:22:01+05:30", or without the offset for display
+    day, seconds = divmod(ts + tz * 60, SECONDS_PER_DAY)
+    text = f"{_day_string(day)}{sep}{_MINUTES[seconds // 60]}:{_SECONDS[seconds % 60]}"
+    return text + _offset_string(tz) if offset else text
+
+
+def to_datetime(ts, tz):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone(datetime.timedelta(minutes=tz)))
+
+
+def day_start(day):
+    # Local seconds at midnight of a date or "YYYY-MM-DD" string
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    return (day.toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
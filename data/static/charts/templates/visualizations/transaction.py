@@ -0,0 +1,185 @@
+import sys
+
+import timestamps
+
+# Fields of the dict view, used by exports and templates
+TRANSACTION_FIELDS = ["id", "date", "amount", "description", "upi_app", "category"]
+# Fields as stored: the time is epoch seconds plus the UTC offset in minutes
+RECORD_FIELDS = ["id", "ts", "tz", "amount", "description", "upi_app", "category"]
+KNOWN_FIELDS = frozenset(TRANSACTION_FIELDS + RECORD_FIELDS)
+
+# One int object per UTC offset, shared by every transaction
+_offsets = {}
+
+
+def pack_id(value):
+    # Canonical uuid4 strings are kept as their 16 raw bytes; integer CLI ids
+    # and anything else are kept as they are
+    if isinstance(value, str) and len(value) == 36 and value[8] == value[13] == value[18] == value[23] == "-":
+        try:
+            packed = bytes.fromhex(value.replace("-", ""))
+        except ValueError:
+            return value
+        if unpack_id(packed) == value:
+            return packed
+    return value
+
+
+def unpack_id(value):
+    if type(value) is bytes:
+        h = value.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    return value
+
+
+class Transaction:
+    """One transaction, stored compactly.
+
+    Behaves like an {"id", "date", "amount", "description", "upi_app",
+    "category"} dict: t["amount"], t.get("id") and dict(t) all work, and
+    attributes (t.amount) work too. The time is held as `ts` and `tz` (see
+    timestamps.py); `date` is the ISO 8601 string for them, and assigning
+    one parses it. Category and UPI app names are interned so every
+    transaction shares one copy of each, and uuid ids are held as 16 bytes.
+    """
+
+    __slots__ = ("_id", "ts", "tz", "amount", "description", "upi_app", "category")
+
+    def __init__(self, id, date=None, amount=0, description="", upi_app="", category="", ts=None, tz=None):
+        self._id = pack_id(id)
+        if ts is None:
+            ts, tz = timestamps.parse(date, tz)
+        elif tz is None:
+            tz = timestamps.DEFAULT_TZ
+        self.ts = ts
+        self.tz = _offsets.setdefault(tz, tz)
+        self.amount = amount
+        self.description = description
+        self.upi_app = sys.intern(upi_app) if type(upi_app) is str else upi_app
+        self.category = sys.intern(category) if type(category) is str else category
+
+    @property
+    def id(self):
+        return unpack_id(self._id)
+
+    @id.setter
+    def id(self, value):
+        self._id = pack_id(value)
+
+    @property
+    def date(self):
+        return timestamps.to_iso(self.ts, self.tz)
+
+    @date.setter
+    def date(self, value):
+        self.ts, self.tz = timestamps.parse(value)
+
+    @property
+    def day(self):
+        # "YYYY-MM-DD" where the transaction was made
+        return timestamps.day_key(self.ts, self.tz)
+
+    @classmethod
+    def from_dict(cls, data):
+        # Stored records carry ts/tz; dicts from older files and sample data
+        # carry a date string instead
+        if type(data) is cls:
+            return data
+        return cls(
+            data.get("id"), data.get("date"), data["amount"],
+            data.get("description", ""), data.get("upi_app", ""), data.get("category", ""),
+            data.get("ts"), data.get("tz")
+        )
+
+    @classmethod
+    def from_record(cls, id, ts, tz, amount, description="", upi_app="", category=""):
+        # Positional RECORD_FIELDS, e.g. a database row
+        return cls(id, None, amount, description, upi_app, category, ts, tz)
+
+    def to_record(self):
+        return {
+            "id": self.id,
+            "ts": self.ts,
+            "tz": self.tz,
+            "amount": self.amount,
+            "description": self.description,
+            "upi_app": self.upi_app,
+            "category": self.category
+        }
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "date": self.date,
+            "amount": self.amount,
+            "description": self.description,
+            "upi_app": self.upi_app,
+            "category": self.category
+        }
+
+    # Read access in the same way as the dicts it replaces
+
+    def __getitem__(self, key):
+        if key not in KNOWN_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in KNOWN_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        if key not in KNOWN_FIELDS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in KNOWN_FIELDS
+
+    def keys(self):
+        return list(TRANSACTION_FIELDS)
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in TRANSACTION_FIELDS]
+
+    def __iter__(self):
+        return iter(TRANSACTION_FIELDS)
+
+    def __len__(self):
+        return len(TRANSACTION_FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, Transaction):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Transaction({self.to_dict()!r})"
+
+
+def to_json(value):
+    # `default` hook for json.dump / json.dumps when writing storage files
+    if isinstance(value, Transaction):
+        return value.to_record()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def record_to_dict(record):
+    # Dict view of a stored record, e.g. a row streamed from the database
+    return {
+        "id": record["id"],
+        "date": timestamps.to_iso(record["ts"], record["tz"]),
+        "amount": record["amount"],
+        "description": record["description"],
+        "upi_app": record["upi_app"],
+        "category": record["category"]
+    }
+
+
+def from_dicts(transactions):
+    return [Transaction.from_dict(t) for t in transactions]
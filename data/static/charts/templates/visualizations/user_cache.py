@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+
+
+def copy_document(data):
+    # Routes mutate the profile and append to the transaction list, so each
+    # caller gets its own containers. The transaction dicts are shared.
+    return {
+        "profile": dict(data["profile"]),
+        "transactions": list(data["transactions"])
+    }
+
+
+class UserDataCache:
+    """In-process LRU cache of parsed user documents.
+
+    Each entry remembers the storage version it was loaded at and is only
+    served while the stored data still has that version.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username, version):
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(username)
+            self.hits += 1
+            return copy_document(entry[1])
+
+    def put(self, username, version, data):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[username] = (version, copy_document(data))
+            self.entries.move_to_end(username)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username):
+        with self.lock:
+            self.entries.pop(username, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0
+            }
+
+
+class HistoryIndex:
+    """Base for per-user structures built from a transaction history (the
+    date index, search index and array columns) and kept current as
+    transactions are appended. Subclasses keep `count` and `last_id` up to
+    date in extend()."""
+
+    count = 0
+    last_id = None
+
+    def follows(self, transactions):
+        # True when `transactions` is the indexed history with zero or more
+        # transactions added at the end
+        if len(transactions) < self.count:
+            return False
+        return self.count == 0 or transactions[self.count - 1]["id"] == self.last_id
+
+    def extend(self, transactions):
+        raise NotImplementedError
+
+
+class HistoryIndexCache:
+    """Keeps one HistoryIndex per user (LRU), extended in place as
+    transactions are added and rebuilt with `build(transactions)` if the
+    history changes otherwise."""
+
+    def __init__(self, build, max_size=256):
+        self.build = build
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, username, transactions, load=None):
+        # `load`, if given, returns a stored index to try before rebuilding
+        with self.lock:
+            index = self.entries.get(username)
+            if index is None or not index.follows(transactions):
+                index = load() if load is not None else None
+                if index is None or not index.follows(transactions):
+                    index = self.build(transactions)
+            index.extend(transactions[index.count:])
+            if self.max_size > 0:
+                self.entries[username] = index
+                self.entries.move_to_end(username)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+            return index
+
+    def invalidate(self, username):
+        with self.lock:
+            self.entries.pop(username, None)
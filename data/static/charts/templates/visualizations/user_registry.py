@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+
+import storage
+
+# The web app's account records ({"password_hash", "created_at"}) by username.
+# Lookups read one record and registration adds one, whatever the number of
+# users; the old single users.json is migrated on first use.
+LEGACY_USERS_FILE = "users.json"
+
+
+class UserRegistry:
+    def get(self, username):
+        # The user's record, or None
+        raise NotImplementedError
+
+    def exists(self, username):
+        return self.get(username) is not None
+
+    def create(self, username, record):
+        # Adds the user unless the name is taken; returns whether it was added.
+        # Safe when several processes register the same name at once.
+        raise NotImplementedError
+
+    def usernames(self):
+        raise NotImplementedError
+
+
+class ShardedUserRegistry(UserRegistry):
+    """One small JSON file per user under data/users/<shard>/.
+
+    Files are named by a hash of the username, so any username is a safe
+    file name, and spread over 256 shard directories.
+    """
+
+    def __init__(self, data_dir):
+        self.root = os.path.join(data_dir, "users")
+
+    def get_user_file(self, username):
+        digest = hashlib.sha1(username.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.json")
+
+    def get(self, username):
+        try:
+            with open(self.get_user_file(username), 'r') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        if record.get("username") != username:
+            return None
+        return record
+
+    def create(self, username, record):
+        path = self.get_user_file(username)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(dict(record, username=username), f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        # link() fails if the name exists, so exactly one registration wins
+        # and readers never see a partly written record
+        try:
+            os.link(temp_path, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(temp_path)
+
+    def usernames(self):
+        if not os.path.isdir(self.root):
+            return []
+        names = []
+        for shard in sorted(os.listdir(self.root)):
+            shard_dir = os.path.join(self.root, shard)
+            for name in os.listdir(shard_dir):
+                if name.endswith(".json"):
+                    with open(os.path.join(shard_dir, name), 'r') as f:
+                        names.append(json.load(f)["username"])
+        return sorted(names)
+
+
+class SQLiteUserRegistry(UserRegistry):
+    """A users table in the SQLite backend's database."""
+
+    def __init__(self, data_dir, db_file=None):
+        self.db_path = os.path.join(data_dir, db_file or storage.SQLITE_FILE)
+        self._local = threading.local()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "username TEXT PRIMARY KEY, password_hash TEXT NOT NULL, created_at TEXT)"
+            )
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, username):
+        row = self.connect().execute(
+            "SELECT password_hash, created_at FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"password_hash": row[0], "created_at": row[1]}
+
+    def create(self, username, record):
+        try:
+            with self.connect() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                    (username, record["password_hash"], record.get("created_at"))
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def usernames(self):
+        return [row[0] for row in self.connect().execute("SELECT username FROM users ORDER BY username")]
+
+
+def get_user_registry(data_dir, mode=None):
+    mode = mode or storage.STORAGE_MODE
+    if mode == "sqlite":
+        return SQLiteUserRegistry(data_dir)
+    return ShardedUserRegistry(data_dir)
+
+
+def migrate_users_json(data_dir, registry=None):
+    # Copies every account from users.json into the registry, then renames
+    # the file so it is only read once. Accounts already in the registry are
+    # left alone, so an interrupted migration can simply run again.
+    # Returns the number of accounts added.
+    path = os.path.join(data_dir, LEGACY_USERS_FILE)
+    users = storage.read_json(path)
+    if users is None:
+        return 0
+    registry = registry or get_user_registry(data_dir)
+    added = 0
+    for username, record in users.items():
+        added += registry.create(username, record)
+    try:
+        os.replace(path, path + ".migrated")
+    except FileNotFoundError:
+        # Another worker finished the same migration first
+        pass
+    return added
+
+
+def copy_accounts(source, target):
+    # Adds every account in `source` that `target` doesn't have yet. Returns
+    # the number of accounts added, so running it again is harmless.
+    added = 0
+    for username in source.usernames():
+        record = source.get(username)
+        if record is not None:
+            added += target.create(username, record)
+    return added
+
+
+def migrate_to_sqlite(data_dir, db_file=None):
+    # Moves the web app's accounts into the SQLite database along with their
+    # data: users.json if it was never migrated, then every account in the
+    # JSON registry. Returns the number of accounts added.
+    registry = SQLiteUserRegistry(data_dir, db_file)
+    added = migrate_users_json(data_dir, registry)
+    return added + copy_accounts(ShardedUserRegistry(data_dir), registry)